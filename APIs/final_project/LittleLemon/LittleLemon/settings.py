@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "LittleLemonAPI.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -81,6 +84,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file rather than SQLite's shared in-memory database, which
+        # fails concurrent writers at once instead of waiting for the lock:
+        # the tests of concurrent writes need the same locking as the server
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -129,17 +136,18 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 5,
     "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
+        "LittleLemonAPI.renderers.FastJSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
         "rest_framework_xml.renderers.XMLRenderer"
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.TokenAuthentication",
+        "LittleLemonAPI.tokens.AccessTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "LittleLemonAPI.throttling.AnonRateThrottle",
+        "LittleLemonAPI.throttling.UserRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon":"5/minute", # can be also 'second','hour',or 'day'
@@ -157,3 +165,36 @@ DJOSER = {
         "user": "LittleLemonAPI.serializers.UserSerializer" # For custom serializer
     }
 }
+
+# Serve the read endpoints with the async views of LittleLemonAPI/asyncviews.py.
+# Turn it on (LITTLELEMON_ASYNC_READ_VIEWS=1) when serving LittleLemon/asgi.py:
+# under WSGI the sync views are faster.
+ASYNC_READ_VIEWS = os.environ.get("LITTLELEMON_ASYNC_READ_VIEWS") == "1"
+
+# Directory where each process writes its request metrics, so that /metrics
+# reports all the worker processes (see LittleLemonAPI/metrics.py). Without
+# it, /metrics only reports the process that answers.
+METRICS_DIR = os.environ.get("LITTLELEMON_METRICS_DIR")
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>". Without it, /metrics
+# is only served under DEBUG.
+METRICS_TOKEN = os.environ.get("LITTLELEMON_METRICS_TOKEN")
+
+# Where the rate limits keep their counters: "sqlite:///<path>", "redis://..."
+# or "locmem://" (see LittleLemonAPI/throttling.py). The SQLite file is shared
+# by the worker processes of this host; the counters only last a few minutes.
+THROTTLE_STORE = os.environ.get(
+    "LITTLELEMON_THROTTLE_STORE", f"sqlite:///{Path(tempfile.gettempdir()) / 'littlelemon-throttle.sqlite3'}"
+)
+
+# Where the order updates of LittleLemonAPI/events.py are published:
+# "locmem://" (this process only) or "redis://..." (every process).
+EVENTS_BROKER = os.environ.get("LITTLELEMON_EVENTS_BROKER", "locmem://")
+# Seconds an event stream stays open, and between its keepalive comments
+EVENTS_MAX_DURATION = 300
+EVENTS_HEARTBEAT = 15
+
+# Lifetimes of the access and refresh tokens of LittleLemonAPI/tokens.py, in
+# seconds. Access tokens can't be checked against the database: role changes
+# reach them when they're refreshed.
+ACCESS_TOKEN_LIFETIME = 60 * 5
+REFRESH_TOKEN_LIFETIME = 60 * 60 * 24 * 14
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from LittleLemonAPI.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -23,4 +24,5 @@ urlpatterns = [
     path("api/", include("djoser.urls.authtoken")),
     path("", include("djoser.urls.authtoken")), # Because the project specifies it this way, though I think it should be under api/ as in the previous line
     path("api/", include("LittleLemonAPI.urls")),
+    path("metrics", metrics_view),
 ]
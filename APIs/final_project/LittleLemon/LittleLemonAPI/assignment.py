@@ -0,0 +1,107 @@
+"""
+Assigns the open orders nobody delivers yet (no delivery crew, status
+False) to the delivery crew.
+
+Each order goes to the active crew member with the fewest open orders,
+counting the ones assigned before (a heap of (open orders, crew id)), so
+the load stays balanced. The orders are assigned oldest first, in batches
+of ASSIGN_BATCH_SIZE, each in its own transaction:
+
+- One query locks the batch. Where the database can, orders locked by a
+  concurrent run are skipped instead of waited for.
+- One UPDATE with a CASE, with a WHEN per crew member, assigns the
+  whole batch, only to orders still unassigned.
+- The crew rollups of reports.py are updated and the changes published
+  to events.py, as the signals do for orders saved one at a time.
+
+It runs from `manage.py assign_orders` (once, or every --interval seconds)
+and from POST api/orders/assign.
+"""
+import heapq
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Case, Count, Q, Value, When
+from . import events, groups, models, reports, roles
+
+ASSIGN_BATCH_SIZE = 500
+
+
+def open_orders():
+    return models.Order.objects.filter(delivery_crew__isnull=True, status=False)
+
+
+def crew_loads():
+    """[(open orders, crew id)] of the active delivery crew, as a heap."""
+    crew_id = groups.registry.get_id(roles.DELIVERY_CREW)
+    if crew_id is None:
+        return []
+    loads = list(
+        User.objects.filter(groups=crew_id, is_active=True)
+        .annotate(load=Count("delivery_crew", filter=Q(delivery_crew__status=False)))
+        .values_list("load", "id")
+    )
+    heapq.heapify(loads)
+    return loads
+
+
+def assign_batch(loads, batch_size):
+    """Assigns one batch of orders. Returns {order id: crew id}."""
+    with transaction.atomic():
+        orders = open_orders().order_by("date", "id").only("id", "user_id", "date", "total", "status")
+        if connection.features.has_select_for_update_skip_locked:
+            orders = orders.select_for_update(skip_locked=True)
+        else:
+            orders = orders.select_for_update()
+        orders = list(orders[:batch_size])
+        if not orders:
+            return {}
+
+        assignments = {}
+        for order in orders:
+            load, crew_id = heapq.heappop(loads)
+            assignments[order.pk] = crew_id
+            heapq.heappush(loads, (load + 1, crew_id))
+
+        orders_by_crew = defaultdict(list)
+        for order_id, crew_id in assignments.items():
+            orders_by_crew[crew_id].append(order_id)
+        updated = open_orders().filter(pk__in=assignments).update(delivery_crew=Case(
+            *[When(pk__in=order_ids, then=Value(crew_id)) for crew_id, order_ids in orders_by_crew.items()]
+        ))
+        if updated < len(assignments):
+            # Without row locks (SQLite), another run got there first
+            assigned = set(
+                models.Order.objects.filter(pk__in=assignments)
+                .values_list("id", "delivery_crew_id")
+            ) & set(assignments.items())
+            assignments = dict(assigned)
+            orders = [order for order in orders if order.pk in assignments]
+
+        rollup = reports.Rollup()
+        for order in orders:
+            order.delivery_crew_id = assignments[order.pk]
+            rollup.add_delivery(order, order.delivery_crew_id, order.status)
+        rollup.save()
+        events.publish_orders(orders)
+    return assignments
+
+
+def assign_orders(batch_size=None, limit=None):
+    """
+    Assigns up to `limit` open orders (all of them by default). Returns
+    the number of orders assigned.
+    """
+    batch_size = batch_size or ASSIGN_BATCH_SIZE
+    loads = crew_loads()
+    if not loads:
+        return 0
+
+    assigned = 0
+    while limit is None or assigned < limit:
+        size = batch_size if limit is None else min(batch_size, limit - assigned)
+        assignments = assign_batch(loads, size)
+        if not assignments:
+            break
+        assigned += len(assignments)
+    return assigned
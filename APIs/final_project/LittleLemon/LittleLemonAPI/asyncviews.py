@@ -0,0 +1,126 @@
+"""
+Async read path for the API under ASGI.
+
+DRF's views are synchronous: under an ASGI server every request would hold
+a thread for as long as its queries take. The read views have async
+variants instead (AsyncCategoryView, ...: AsyncViewMixin on top of the
+sync view). GET and HEAD run the view's `aget` on the event loop with
+Django's async ORM (acount, aget, async for). The other methods run the
+sync view's handlers in a thread.
+
+urls.py serves the async variants with the ASYNC_READ_VIEWS setting, for
+ASGI servers. Under WSGI (runserver, the test client) the sync views are
+faster: Django would have to start an event loop for each request.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+from . import roles
+
+
+def _in_thread(handler):
+    async def run_in_thread(self, request, *args, **kwargs):
+        return await sync_to_async(handler)(self, request, *args, **kwargs)
+    return run_in_thread
+
+
+class AsyncViewMixin:
+    """
+    Turns a view with an `aget` coroutine into an async view. Every
+    handler is a coroutine: GET awaits aget, the sync handlers of the view
+    (post, put, options, ...) are run in a thread. So Django's as_view()
+    sees an async view, and checks that no handler was left sync.
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method in cls.http_method_names:
+            handler = getattr(cls, method, None)
+            if handler is not None and not iscoroutinefunction(handler):
+                setattr(cls, method, _in_thread(handler))
+
+    async def get(self, request, *args, **kwargs):
+        return await self.aget(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Memoized on the user for the querysets and serializer classes
+        # that depend on the roles, which run on the event loop
+        roles.get_roles(request.user)
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        APIView.dispatch, awaiting the handler. DRF's initial() (content
+        negotiation, authentication, permissions, throttles) is synchronous:
+        it runs in a thread, with the user's roles.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncReadMixin:
+    """
+    For the views with an async variant: `aget` and the helpers it awaits.
+    The sync view never calls them.
+    """
+    async def afilter_queryset(self, queryset):
+        """
+        filter_queryset for the async views. Filtering only builds the
+        query; views with filters that query the database override this.
+        """
+        return self.filter_queryset(queryset)
+
+
+class AsyncListMixin(AsyncReadMixin):
+    """aget for ListAPIViews. The paginator needs an apaginate_queryset."""
+    async def aget(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer([row async for row in queryset], many=True)
+        return Response(serializer.data)
+
+
+class AsyncRetrieveMixin(AsyncReadMixin):
+    """aget for RetrieveAPIViews."""
+    async def aget(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        # The same errors as DRF's get_object_or_404
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except queryset.model.DoesNotExist:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+
+        # Object permissions only compare the request with the object
+        self.check_object_permissions(self.request, obj)
+        return obj
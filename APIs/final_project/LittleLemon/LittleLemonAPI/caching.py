@@ -0,0 +1,156 @@
+"""
+Response caching for read-mostly endpoints.
+
+Cached responses and ETags are keyed by a content version stored in the
+database (models.ContentVersion). Writes bump the version from signals.py,
+which makes every cached variant unreachable and every ETag stale at once;
+the old entries simply expire. The version lives in the database rather
+than in the cache so that every worker process sees the same one.
+"""
+import hashlib
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+from . import models
+
+MENU = "menu"
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def get_version(name):
+    """Returns (version, last update) of the named content."""
+    try:
+        return models.ContentVersion.objects.values_list("version", "updated").get(name=name)
+    except models.ContentVersion.DoesNotExist:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                models.ContentVersion.objects.create(name=name, version=1, updated=now)
+        except IntegrityError:
+            # Created by a concurrent request
+            return get_version(name)
+        return 1, now
+
+
+async def aget_version(name):
+    try:
+        return await models.ContentVersion.objects.values_list("version", "updated").aget(name=name)
+    except models.ContentVersion.DoesNotExist:
+        # Only happens once: creating the row needs a transaction
+        return await sync_to_async(get_version)(name)
+
+
+def bump_version(name):
+    now = timezone.now()
+    updated = models.ContentVersion.objects.filter(name=name).update(
+        version=F("version") + 1, updated=now
+    )
+    if not updated:
+        get_version(name)
+
+
+class VersionedCacheMixin:
+    """
+    Caches the data of successful GET responses under the current version
+    of `cache_version_name`. The key includes the URL kwargs, the
+    `cache_query_params` of the request and the parameters of the view's
+    filter backends (ordering, search), normalized so that their order and
+    the other parameters don't create new variants.
+
+    The same version gives the responses a strong ETag and a Last-Modified
+    header, so conditional requests are answered with a 304 before the
+    queryset or the serializer run.
+    """
+    cache_version_name = MENU
+    cache_query_params = ()
+
+    def get_cache_query_params(self):
+        params = set(self.cache_query_params)
+        for backend in getattr(self, "filter_backends", ()):
+            for attribute in ("ordering_param", "search_param"):
+                if getattr(backend, attribute, None):
+                    params.add(getattr(backend, attribute))
+        return params
+
+    def get_variant(self, request):
+        params = sorted(
+            (param, request.query_params.get(param).strip())
+            for param in self.get_cache_query_params()
+            if request.query_params.get(param, "").strip()
+        )
+        # Paginated responses contain absolute links
+        variant = urlencode([("host", request.get_host())] + sorted(self.kwargs.items()) + params)
+        return hashlib.md5(variant.encode()).hexdigest()
+
+    def get_cache_key(self, request, version):
+        return f"littlelemon:{self.__class__.__name__}:{version}:{self.get_variant(request)}"
+
+    def get_etag(self, request, version):
+        # Each representation (JSON, XML, browsable API) needs its own tag,
+        # and the browsable API page also shows who is logged in
+        representation = f"{self.get_variant(request)}:{request.accepted_media_type}"
+        if request.accepted_renderer.format == "api":
+            representation += f":{request.user.pk}"
+        digest = hashlib.md5(representation.encode()).hexdigest()
+        return f'"{self.cache_version_name}-{version}-{digest}"'
+
+    def get_validators(self, request, version, updated):
+        """Returns (ETag, Last-Modified, 304 response or None)."""
+        etag = self.get_etag(request, version)
+        last_modified = int(updated.timestamp())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            self.add_validators(not_modified, etag, last_modified)
+        return etag, last_modified, not_modified
+
+    def get(self, request, *args, **kwargs):
+        version, updated = get_version(self.cache_version_name)
+        etag, last_modified, not_modified = self.get_validators(request, version, updated)
+        if not_modified is not None:
+            return not_modified
+
+        key = self.get_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+        else:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, CACHE_TIMEOUT)
+
+        if response.status_code == status.HTTP_200_OK:
+            self.add_validators(response, etag, last_modified)
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        """get for the async views of asyncviews.py."""
+        version, updated = await aget_version(self.cache_version_name)
+        etag, last_modified, not_modified = self.get_validators(request, version, updated)
+        if not_modified is not None:
+            return not_modified
+
+        key = self.get_cache_key(request, version)
+        data = await cache.aget(key)
+        if data is not None:
+            response = Response(data, status=status.HTTP_200_OK)
+        else:
+            response = await super().aget(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                await cache.aset(key, response.data, CACHE_TIMEOUT)
+
+        if response.status_code == status.HTTP_200_OK:
+            self.add_validators(response, etag, last_modified)
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ["Accept"])
+        return response
@@ -0,0 +1,204 @@
+"""
+Writes of the cart, each in one statement.
+
+The database computes the price from MenuItem.price, so it's the price of
+the menu item when the row is written, not when it was read. The unique
+(menuitem, user) constraint settles concurrent adds of the same item: one
+of them inserts the row, the others insert nothing (ON CONFLICT DO
+NOTHING) and raise AlreadyInCart, instead of an IntegrityError. RETURNING
+reads back the row and the menu item the response renders, so the
+serializer doesn't query again. Prices that don't fit Cart.price are
+neither inserted nor updated, and raise PriceOutOfRange.
+
+Databases without INSERT/UPDATE ... RETURNING (MySQL, MariaDB) run the
+same writes with the ORM, in a transaction and a few more queries.
+
+When a manager changes the price of a menu item, signals.py records a
+PriceChange in the same transaction, and reprice_carts updates the carts
+later, off the request (`manage.py reprice_carts`, once or every
+--interval seconds). Each pass reads up to REPRICE_BATCH_SIZE changes and
+runs one UPDATE per menu item, at its current price: many changes of the
+same item cost one UPDATE.
+"""
+from decimal import Decimal
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from . import models
+
+
+REPRICE_BATCH_SIZE = 500
+
+
+class AlreadyInCart(Exception):
+    pass
+
+
+class PriceOutOfRange(Exception):
+    pass
+
+
+def _price_limit():
+    field = models.Cart._meta.get_field("price")
+    return 10 ** (field.max_digits - field.decimal_places)
+
+
+# Cart.price holds the prices below it
+PRICE_LIMIT = _price_limit()
+
+
+def _returns_rows():
+    return connection.vendor in ("postgresql", "sqlite") and connection.features.can_return_columns_from_insert
+
+
+def _names():
+    quote = connection.ops.quote_name
+    cart = models.Cart._meta
+    menuitem = models.MenuItem._meta
+    return {
+        "cart": quote(cart.db_table),
+        "cart_id": quote(cart.pk.column),
+        "user": quote(cart.get_field("user").column),
+        "menuitem": quote(cart.get_field("menuitem").column),
+        "quantity": quote(cart.get_field("quantity").column),
+        "price": quote(cart.get_field("price").column),
+        "item": quote(menuitem.db_table),
+        "item_id": quote(menuitem.pk.column),
+        "title": quote(menuitem.get_field("title").column),
+        "item_price": quote(menuitem.get_field("price").column),
+    }
+
+
+# The row and its menu item, for _cart_item
+RETURNING = (
+    "RETURNING {cart_id}, {user}, {menuitem}, {quantity}, {price}, "
+    "(SELECT {title} FROM {item} WHERE {item}.{item_id} = {cart}.{menuitem}), "
+    "(SELECT {item_price} FROM {item} WHERE {item}.{item_id} = {cart}.{menuitem})"
+)
+
+INSERT_SQL = (
+    "INSERT INTO {cart} ({user}, {menuitem}, {quantity}, {price}) "
+    "SELECT %s, {item_id}, %s, {item_price} * %s FROM {item} WHERE {item_id} = %s AND {item_price} * %s < %s "
+    "ON CONFLICT ({menuitem}, {user}) DO NOTHING "
+) + RETURNING
+
+UPDATE_SQL = (
+    "UPDATE {cart} SET {quantity} = %s, "
+    "{price} = %s * (SELECT {item_price} FROM {item} WHERE {item}.{item_id} = {cart}.{menuitem}) "
+    "WHERE {cart_id} = %s "
+    "AND %s * (SELECT {item_price} FROM {item} WHERE {item}.{item_id} = {cart}.{menuitem}) < %s "
+) + RETURNING
+
+
+def _decimal(model, value):
+    # SQLite returns the result of a decimal expression as a float: rounded
+    # as Django's converter rounds the column
+    field = model._meta.get_field("price")
+    return field.to_python(value).quantize(Decimal(1).scaleb(-field.decimal_places))
+
+
+def _cart_item(row):
+    pk, user_id, menuitem_id, quantity, price, title, unit_price = row
+    cart_item = models.Cart.from_db(
+        connection.alias,
+        ["id", "user_id", "menuitem_id", "quantity", "price"],
+        [pk, user_id, menuitem_id, quantity, _decimal(models.Cart, price)],
+    )
+    cart_item.menuitem = models.MenuItem.from_db(
+        connection.alias, ["id", "title", "price"], [menuitem_id, title, _decimal(models.MenuItem, unit_price)]
+    )
+    return cart_item
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**_names()), params)
+        return cursor.fetchone()
+
+
+def _unit_price():
+    return Subquery(models.MenuItem.objects.filter(pk=OuterRef("menuitem_id")).values("price")[:1])
+
+
+def add_item(user, menuitem_id, quantity):
+    """
+    Adds the menu item to the user's cart. Returns the new Cart row, or
+    None if the menu item doesn't exist. Raises AlreadyInCart if it's in
+    the cart already, PriceOutOfRange if the quantity costs too much.
+    """
+    if not _returns_rows():
+        menuitem = models.MenuItem.objects.filter(pk=menuitem_id).first()
+        if menuitem is None:
+            return None
+        if quantity * menuitem.price >= PRICE_LIMIT:
+            raise PriceOutOfRange
+        try:
+            with transaction.atomic():
+                return models.Cart.objects.create(
+                    user=user, menuitem=menuitem, quantity=quantity, price=quantity * menuitem.price
+                )
+        except IntegrityError:
+            raise AlreadyInCart
+
+    row = _execute(INSERT_SQL, [user.pk, quantity, quantity, menuitem_id, quantity, PRICE_LIMIT])
+    if row is not None:
+        return _cart_item(row)
+    # Nothing inserted: the menu item doesn't exist, costs too much, or is
+    # in the cart
+    price = models.MenuItem.objects.filter(pk=menuitem_id).values_list("price", flat=True).first()
+    if price is None:
+        return None
+    if quantity * price >= PRICE_LIMIT:
+        raise PriceOutOfRange
+    raise AlreadyInCart
+
+
+def set_quantity(cart_item, quantity):
+    """
+    Sets the quantity of the cart row and its price at the current price of
+    the menu item. Returns the updated row, or None if it was deleted.
+    Raises PriceOutOfRange if the quantity costs too much.
+    """
+    if not _returns_rows():
+        with transaction.atomic():
+            cart_queryset = models.Cart.objects.select_for_update().filter(pk=cart_item.pk)
+            price = cart_queryset.values_list("menuitem__price", flat=True).first()
+            if price is None:
+                return None
+            if quantity * price >= PRICE_LIMIT:
+                raise PriceOutOfRange
+            cart_queryset.update(quantity=quantity, price=_unit_price() * quantity)
+            return models.Cart.objects.select_related("menuitem").get(pk=cart_item.pk)
+
+    row = _execute(UPDATE_SQL, [quantity, quantity, cart_item.pk, quantity, PRICE_LIMIT])
+    if row is not None:
+        return _cart_item(row)
+    # Nothing updated: the row was deleted, or the quantity costs too much
+    if models.Cart.objects.filter(pk=cart_item.pk).exists():
+        raise PriceOutOfRange
+    return None
+
+
+def reprice_batch(batch_size):
+    """
+    Reprices the carts of one batch of price changes. Returns the number
+    of changes processed.
+    """
+    with transaction.atomic():
+        changes = list(models.PriceChange.objects.order_by("id").values_list("id", "menuitem_id")[:batch_size])
+        if not changes:
+            return 0
+        prices = models.MenuItem.objects.filter(pk__in={menuitem_id for _, menuitem_id in changes}).values_list("id", "price")
+        for menuitem_id, price in prices:
+            models.Cart.objects.filter(menuitem_id=menuitem_id).update(price=F("quantity") * price)
+        # Only the changes read: the ones made since get the next pass
+        models.PriceChange.objects.filter(pk__in=[pk for pk, _ in changes]).delete()
+    return len(changes)
+
+
+def reprice_carts(batch_size=None):
+    """Reprices the carts of every pending price change. Returns how many there were."""
+    batch_size = batch_size or REPRICE_BATCH_SIZE
+    repriced = 0
+    while processed := reprice_batch(batch_size):
+        repriced += processed
+    return repriced
@@ -0,0 +1,65 @@
+import datetime
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from . import models, reports
+
+
+def place_order(user):
+    """
+    Turns the user's cart into an order.
+
+    Everything runs inside one transaction with the cart rows locked, so a
+    crash halfway never leaves an order without its items or a cart that was
+    already ordered. The number of queries doesn't depend on the size of the
+    cart: one locked cart fetch, one aggregate for the total, one insert
+    for the order, one bulk insert for its items, one delete for the cart
+    and the writes of the daily rollups (reports.Rollup).
+
+    The items are charged at the current price of their menu items, read
+    with the cart. Cart.price may still be the old price of an item whose
+    carts carts.reprice_carts hasn't repriced yet.
+
+    Returns the created order, or None if the cart is empty.
+    """
+    with transaction.atomic():
+        cart_queryset = models.Cart.objects.filter(user=user)
+        cart_objects = list(
+            cart_queryset
+            .select_related("menuitem")
+            .select_for_update(of=("self",))
+        )
+        if not cart_objects:
+            return None
+
+        # Rows added to the cart after the lock was taken aren't part of
+        # this order, so the delete sticks to these ids.
+        locked_cart = cart_queryset.filter(pk__in=[obj.pk for obj in cart_objects])
+        total = locked_cart.aggregate(
+            total=Sum(F("quantity") * F("menuitem__price"), output_field=DecimalField(max_digits=6, decimal_places=2))
+        )["total"]
+
+        order = models.Order.objects.create(
+            user=user,
+            delivery_crew=None,
+            status=False,
+            total=total,
+            date=datetime.date.today(),
+        )
+
+        order_items = models.OrderItem.objects.bulk_create([
+            models.OrderItem(
+                order=order,
+                menuitem=cart_object.menuitem,
+                quantity=cart_object.quantity,
+                price=cart_object.quantity * cart_object.menuitem.price,
+            )
+            for cart_object in cart_objects
+        ])
+
+        locked_cart.delete()
+
+        rollup = reports.Rollup()
+        rollup.add_order(order, order_items)
+        rollup.save()
+
+    return order
@@ -0,0 +1,281 @@
+"""
+Order updates pushed to the clients, instead of polling api/orders/<pk>.
+
+GET api/orders/events is a Server-Sent Events stream: an "order" event
+with {"id", "status", "delivery_crew"} each time an order the user can see
+changes status or delivery crew member. The visibility is the same as
+views.SingleOrderView's:
+
+- Managers and admins get the events of every order.
+- Delivery crew get the events of the orders assigned to them.
+- Customers get the events of their own orders.
+
+Each of these audiences is a channel of a broker, so a subscriber only
+receives its own events. Updates are published once their transaction
+commits, from signals.py and assignment.py.
+
+The broker is picked with the EVENTS_BROKER setting:
+
+- "locmem://": in this process. The default: with several worker
+  processes, a client only gets the events of the changes its worker
+  made.
+- "redis://host:port/db": Redis pub/sub, shared by every process. Needs
+  the redis package.
+
+A stream lasts EVENTS_MAX_DURATION seconds at most (less with ?timeout=)
+and sends a comment every EVENTS_HEARTBEAT seconds to keep the connection
+open. EventSource clients reconnect after RETRY_MS. It's meant for the
+ASGI application, where a stream doesn't hold a thread while it waits;
+under WSGI it works, holding one.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from . import roles
+
+MANAGERS_CHANNEL = "littlelemon:orders:managers"
+RETRY_MS = 1000
+
+
+def customer_channel(user_id):
+    return f"littlelemon:orders:user:{user_id}"
+
+
+def crew_channel(user_id):
+    return f"littlelemon:orders:crew:{user_id}"
+
+
+def channel_for(user):
+    """The channel of the orders the user can see, as SingleOrderView.get_queryset."""
+    if roles.is_admin_or_manager(user):
+        return MANAGERS_CHANNEL
+    if roles.is_delivery_crew(user):
+        return crew_channel(user.pk)
+    return customer_channel(user.pk)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Only negotiates the stream: it encodes its own events."""
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+
+class _Subscription:
+    """Messages of the channel, for a subscriber in a thread."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.SimpleQueue()
+
+    def deliver(self, message):
+        self.queue.put(message)
+
+    def get(self, timeout):
+        """The next message, or None after `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class _AsyncSubscription:
+    """Messages of the channel, for a subscriber on an event loop."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, message):
+        # Published from any thread
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+        except RuntimeError:
+            # The loop is closed: the stream ended without closing this
+            self.broker.unsubscribe(self)
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        self.broker.unsubscribe(self)
+
+
+class LocMemBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def subscribe(self, channel):
+        return self._add(_Subscription(self, channel))
+
+    async def asubscribe(self, channel):
+        return self._add(_AsyncSubscription(self, channel))
+
+    def _add(self, subscription):
+        with self.lock:
+            self.subscriptions.setdefault(subscription.channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+
+class RedisBroker:
+    """Redis pub/sub: the messages reach the subscribers of every process."""
+
+    def __init__(self, url):
+        import redis
+        import redis.asyncio
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.async_client_class = redis.asyncio.Redis
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel):
+        return _RedisSubscription(self.client.pubsub(ignore_subscribe_messages=True), channel)
+
+    async def asubscribe(self, channel):
+        # The async client belongs to the event loop of the subscriber
+        pubsub = self.async_client_class.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        return _AsyncRedisSubscription(pubsub)
+
+
+class _RedisSubscription:
+    def __init__(self, pubsub, channel):
+        self.pubsub = pubsub
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is not None:
+                return message["data"].decode()
+        return None
+
+    def close(self):
+        self.pubsub.close()
+
+
+class _AsyncRedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def aget(self, timeout):
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await self.pubsub.get_message(timeout=remaining)
+            if message is not None:
+                return message["data"].decode()
+        return None
+
+    async def aclose(self):
+        await self.pubsub.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    url = settings.EVENTS_BROKER
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            return RedisBroker(url)
+        except ImportError:
+            raise ImproperlyConfigured(f"EVENTS_BROKER {url} needs the redis package")
+    if url == "locmem://":
+        return LocMemBroker()
+    raise ImproperlyConfigured(f"Unknown EVENTS_BROKER {url}")
+
+
+def publish_orders(orders):
+    """
+    Publishes the current status and delivery crew member of the orders,
+    once the transaction commits.
+    """
+    messages = [
+        (order.user_id, order.delivery_crew_id, json.dumps(
+            {"id": order.pk, "status": bool(order.status), "delivery_crew": order.delivery_crew_id}
+        ))
+        for order in orders
+    ]
+
+    def publish():
+        broker = get_broker()
+        for user_id, delivery_crew_id, message in messages:
+            broker.publish(MANAGERS_CHANNEL, message)
+            broker.publish(customer_channel(user_id), message)
+            if delivery_crew_id:
+                broker.publish(crew_channel(delivery_crew_id), message)
+
+    transaction.on_commit(publish)
+
+
+def _event(message):
+    return f"event: order\ndata: {message}\n\n".encode()
+
+
+def _timeouts(timeout):
+    """How long to wait for each message: heartbeats until the end of the stream."""
+    deadline = time.monotonic() + min(timeout, settings.EVENTS_MAX_DURATION)
+    while (remaining := deadline - time.monotonic()) > 0:
+        yield min(remaining, settings.EVENTS_HEARTBEAT)
+
+
+def stream(channel, timeout):
+    subscription = get_broker().subscribe(channel)
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        for wait in _timeouts(timeout):
+            message = subscription.get(wait)
+            yield b": keepalive\n\n" if message is None else _event(message)
+    finally:
+        subscription.close()
+
+
+async def astream(channel, timeout):
+    subscription = await get_broker().asubscribe(channel)
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        for wait in _timeouts(timeout):
+            message = await subscription.aget(wait)
+            yield b": keepalive\n\n" if message is None else _event(message)
+    finally:
+        await subscription.aclose()
+
+
+def stream_response(content):
+    response = StreamingHttpResponse(content, content_type="text/event-stream; charset=utf-8")
+    response["Cache-Control"] = "no-cache"
+    # Sent as they come through proxies like nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,111 @@
+"""
+Order exports for managers (views.OrderExportView).
+
+The orders are read in chunks of EXPORT_CHUNK_SIZE with
+QuerySet.iterator(chunk_size=...), which uses a server-side cursor where
+the database has them and prefetches the related rows of each chunk, and
+every chunk is encoded and sent before the next one is read. Memory stays
+the same whatever the size of the export.
+
+- CSV: one line per order item, with the columns of CSV_HEADER. Orders
+  without items get one line with empty item columns.
+- NDJSON: one order per line, as the orders list renders it for managers.
+"""
+import csv
+import io
+import itertools
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from . import renderers
+
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_HEADER = [
+    "order_id", "date", "status", "total",
+    "user_id", "user_username", "delivery_crew_id", "delivery_crew_username",
+    "menuitem_id", "menuitem_title", "quantity", "price",
+]
+
+
+class CSVRenderer(BaseRenderer):
+    """Only negotiates the export format: the export encodes its own chunks."""
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Only negotiates the export format: the export encodes its own chunks."""
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+
+def csv_rows(order):
+    crew = order.delivery_crew
+    columns = [
+        order.pk, order.date.isoformat(), int(order.status), order.total,
+        order.user_id, order.user.username, order.delivery_crew_id, crew.username if crew else "",
+    ]
+    items = order.order_items.all()
+    if not items:
+        yield columns + [""] * 4
+    for item in items:
+        yield columns + [item.menuitem_id, item.menuitem.title, item.quantity, item.price]
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def encode_orders_csv(orders):
+    return encode_csv(row for order in orders for row in csv_rows(order))
+
+
+def ndjson_encoder(serializer_class, context):
+    renderer = renderers.FastJSONRenderer()
+
+    def encode(orders):
+        data = serializer_class(orders, many=True, context=context).data
+        return b"".join(renderer.render(order) + b"\n" for order in data)
+    return encode
+
+
+def chunks(queryset, encode, header=b""):
+    if header:
+        yield header
+    orders = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while batch := list(itertools.islice(orders, EXPORT_CHUNK_SIZE)):
+        yield encode(batch)
+
+
+async def achunks(iterator):
+    """
+    Django reads a sync iterator whole before sending it under ASGI: pull
+    its chunks one at a time from the thread the request's queries run in.
+    """
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
+
+
+def export_response(request, queryset, serializer_class, context):
+    """A StreamingHttpResponse with the orders in the negotiated format."""
+    renderer = request.accepted_renderer
+    if renderer.format == CSVRenderer.format:
+        content = chunks(queryset, encode_orders_csv, header=encode_csv([CSV_HEADER]))
+    else:
+        content = chunks(queryset, ndjson_encoder(serializer_class, context))
+    if isinstance(request._request, ASGIRequest):
+        content = achunks(content)
+
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type += f"; charset={renderer.charset}"
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="orders.{renderer.format}"'
+    return response
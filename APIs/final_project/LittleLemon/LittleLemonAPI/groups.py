@@ -0,0 +1,77 @@
+"""
+The group rows (ids and names), held by the process.
+
+There are a handful of groups and they hardly change, so the views and the
+permission checks look them up here rather than query auth_group on every
+request: /groups/<slug>/ finds its group by slug, and the roles of a user
+are read from the group ids of its memberships (the indexed
+auth_user_groups.group_id), without joining auth_group for the names.
+
+The rows are loaded on the first lookup, not in AppConfig.ready, where the
+database may not exist yet (migrate) or not be the one that's served
+(tests). signals.py reloads them when a group is saved or deleted in this
+process; the other processes see the change when an id or name they don't
+know turns up, or after REFRESH_INTERVAL seconds.
+"""
+import time
+from collections import namedtuple
+from django.contrib.auth.models import Group
+from django.db import DEFAULT_DB_ALIAS
+from . import roles
+
+REFRESH_INTERVAL = 60
+
+_Rows = namedtuple("_Rows", ["by_id", "by_name", "loaded_at"])
+
+
+class GroupRegistry:
+    def __init__(self):
+        # Replaced whole, so readers in other threads see the old rows or
+        # the new ones, never a mix
+        self._rows = None
+
+    def _set(self, rows):
+        self._rows = _Rows(dict(rows), {name: pk for pk, name in rows}, time.monotonic())
+        return self._rows
+
+    def load(self):
+        return self._set(list(Group.objects.values_list("id", "name")))
+
+    def clear(self):
+        self._rows = None
+
+    def _current(self):
+        rows = self._rows
+        if rows is None or time.monotonic() - rows.loaded_at > REFRESH_INTERVAL:
+            return None
+        return rows
+
+    def get(self, name):
+        """The group with this name, or None."""
+        rows = self._current() or self.load()
+        if name not in rows.by_name:
+            # Maybe created by another process since loading
+            rows = self.load()
+        pk = rows.by_name.get(name)
+        if pk is None:
+            return None
+        return Group.from_db(DEFAULT_DB_ALIAS, ["id", "name"], [pk, name])
+
+    def by_slug(self, slug):
+        """The group of a /groups/<slug>/ URL, or None."""
+        name = roles.GROUP_SLUGS.get(slug)
+        return self.get(name) if name else None
+
+    def get_id(self, name):
+        group = self.get(name)
+        return None if group is None else group.pk
+
+    def names(self, ids):
+        """A frozenset with the names of the groups with these ids."""
+        rows = self._current() or self.load()
+        if not rows.by_id.keys() >= set(ids):
+            rows = self.load()
+        return frozenset(rows.by_id[pk] for pk in ids if pk in rows.by_id)
+
+
+registry = GroupRegistry()
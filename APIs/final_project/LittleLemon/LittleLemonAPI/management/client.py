@@ -0,0 +1,10 @@
+from django.conf import settings
+from rest_framework.test import APIClient
+
+
+def api_client():
+    """An APIClient for the in-process requests of the management commands."""
+    # The test runner only allows "testserver"; with DEBUG and no
+    # ALLOWED_HOSTS, Django only allows localhost
+    host = "testserver" if "testserver" in settings.ALLOWED_HOSTS else "localhost"
+    return APIClient(SERVER_NAME=host)
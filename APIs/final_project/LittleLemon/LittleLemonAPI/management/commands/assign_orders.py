@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from LittleLemonAPI import assignment
+
+
+class Command(BaseCommand):
+    help = (
+        "Assigns the open orders without a delivery crew member to the "
+        "delivery crew, balancing their open orders. Runs once, or every "
+        "--interval seconds until it's stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=assignment.ASSIGN_BATCH_SIZE)
+        parser.add_argument("--limit", type=int, help="Assign at most LIMIT orders per run")
+        parser.add_argument("--interval", type=float, help="Seconds between runs")
+
+    def handle(self, *args, **options):
+        while True:
+            assigned = assignment.assign_orders(options["batch_size"], options["limit"])
+            self.stdout.write(f"Assigned {assigned} orders.")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,61 @@
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from LittleLemonAPI import models, reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily rollups of the reports from the orders, for the "
+        "days between --from and --to (every day with orders by default). "
+        "The days are split in ranges of --days-per-task, aggregated by "
+        "--workers processes, and the rollups are replaced in one transaction. "
+        "--workers 0 aggregates in this process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat)
+        parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat)
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--days-per-task", type=int, default=31)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        dates = models.Order.objects.aggregate(first=Min("date"), last=Max("date"))
+        date_from = options["date_from"] or dates["first"]
+        date_to = options["date_to"] or dates["last"]
+        if date_from is None or date_to is None:
+            self.stdout.write("There are no orders.")
+            return
+        if date_from > date_to:
+            raise CommandError("--from must be before --to")
+
+        step = datetime.timedelta(days=options["days_per_task"])
+        ranges = []
+        start = date_from
+        while start <= date_to:
+            end = min(start + step - datetime.timedelta(days=1), date_to)
+            ranges.append((start, end))
+            start = end + datetime.timedelta(days=1)
+
+        if options["workers"] > 0:
+            # The workers open their own connections: forked ones mustn't
+            # share this one
+            connections.close_all()
+            with ProcessPoolExecutor(options["workers"], initializer=django.setup) as pool:
+                results = list(pool.map(reports.aggregate, *zip(*ranges)))
+        else:
+            results = [reports.aggregate(start, end) for start, end in ranges]
+
+        rows = {model: [row for result in results for row in result[model]] for model in reports.TABLES}
+        with transaction.atomic():
+            reports.replace(date_from, date_to, rows, batch_size=options["batch_size"])
+
+        self.stdout.write(
+            f"Rebuilt the reports from {date_from} to {date_to} in {len(ranges)} tasks: "
+            + ", ".join(f"{len(model_rows)} {model.__name__} rows" for model, model_rows in rows.items())
+        )
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+from LittleLemonAPI import models
+
+PREFIX = "bench-asgi"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test of the read endpoints through the ASGI application (async "
+        "views) and the WSGI handler (sync views), each in a worker process of "
+        "its own. The WSGI worker serves --threads requests at a time, like a "
+        "threaded WSGI server. --db-latency adds a delay to every query, like "
+        "the round trip to a database server; each latency is a separate run. "
+        "The rows it creates are deleted at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument(
+            "--db-latency", type=float, nargs="+", default=[0, 5, 20], help="Milliseconds added to each query"
+        )
+        parser.add_argument("--orders", type=int, default=100)
+        parser.add_argument("--worker", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.run_worker(options)
+
+        self.create_fixtures(options["orders"])
+        try:
+            for db_latency in options["db_latency"]:
+                self.stdout.write(f"Database latency {db_latency} ms:")
+                wsgi, results = self.start_worker("wsgi", db_latency, options)
+                self.report(f"WSGI ({options['threads']} threads)", wsgi, results)
+                asgi, results = self.start_worker("asgi", db_latency, options)
+                self.report(f"ASGI ({options['concurrency']} concurrent)", asgi, results)
+                self.stdout.write(f"{'ASGI/WSGI throughput':>24}: {asgi / wsgi:.2f}x")
+        finally:
+            self.delete_fixtures()
+
+    def start_worker(self, mode, db_latency, options):
+        command = [
+            sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_asgi", "--worker", mode,
+            "--requests", str(options["requests"]),
+            "--concurrency", str(options["concurrency"]),
+            "--threads", str(options["threads"]),
+            "--db-latency", str(db_latency),
+        ]
+        env = dict(os.environ, LITTLELEMON_ASYNC_READ_VIEWS="1" if mode == "asgi" else "0")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        return result["throughput"], result["results"]
+
+    def run_worker(self, options):
+        customer = User.objects.get(username=f"{PREFIX}-customer")
+        token = Token.objects.get(user=customer)
+        order_ids = list(models.Order.objects.filter(user=customer).order_by("id").values_list("id", flat=True)[:10])
+        paths = list(itertools.islice(itertools.cycle(self.paths(order_ids)), options["requests"]))
+        headers = {"authorization": f"Token {token.key}", "accept": "application/json"}
+
+        # The rate limits would turn most of the requests into 429s
+        with mock.patch.object(APIView, "throttle_classes", []), self.db_latency(options["db_latency"][0]):
+            if options["worker"] == "asgi":
+                throughput, results = asyncio.run(self.run_asgi(paths, headers, options["concurrency"]))
+            else:
+                throughput, results = self.run_wsgi(paths, headers, options["threads"])
+        self.stdout.write(json.dumps({"throughput": throughput, "results": results}))
+
+    def create_fixtures(self, orders):
+        self.delete_fixtures()
+        customer = User.objects.create_user(username=f"{PREFIX}-customer")
+        category = models.Category.objects.create(slug=PREFIX, title=PREFIX)
+        menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"{PREFIX} dish {i}", price=Decimal("5.00"), featured=False, category=category)
+            for i in range(20)
+        ])
+        models.Cart.objects.bulk_create([
+            models.Cart(user=customer, menuitem=menu_item, quantity=1, price=menu_item.price)
+            for menu_item in menu_items[:5]
+        ])
+        orders = models.Order.objects.bulk_create([
+            models.Order(user=customer, total=Decimal("15.00"), date=f"2024-01-{i % 28 + 1:02}")
+            for i in range(orders)
+        ])
+        models.OrderItem.objects.bulk_create([
+            models.OrderItem(order=order, menuitem=menu_item, quantity=1, price=menu_item.price)
+            for order in orders
+            for menu_item in menu_items[:3]
+        ])
+        Token.objects.create(user=customer)
+
+    def delete_fixtures(self):
+        User.objects.filter(username__startswith=PREFIX).delete()
+        models.MenuItem.objects.filter(category__slug=PREFIX).delete()
+        models.Category.objects.filter(slug=PREFIX).delete()
+
+    def paths(self, order_ids):
+        for i, order_id in enumerate(order_ids):
+            yield f"/api/orders/?page={i + 1}"
+            yield f"/api/orders/{order_id}"
+            yield "/api/cart/menu-items/"
+            yield f"/api/menu-items/?category={PREFIX}&page={i % 4 + 1}"
+            yield "/api/category/"
+
+    def db_latency(self, milliseconds):
+        """Delays every query of the connections opened from now on."""
+        def delay(execute, sql, params, many, context):
+            time.sleep(milliseconds / 1000)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            # Called again each time the thread reconnects
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        class DbLatency:
+            def __enter__(self):
+                if milliseconds:
+                    connection_created.connect(add_delay)
+
+            def __exit__(self, *exc_info):
+                connection_created.disconnect(add_delay)
+
+        return DbLatency()
+
+    def run_wsgi(self, paths, headers, threads):
+        handler = WSGIHandler()
+
+        def call(path):
+            path, _, query = path.partition("?")
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.url_scheme": "http",
+                **{f"HTTP_{name.upper()}": value for name, value in headers.items()},
+            }
+            statuses = []
+            start = time.perf_counter()
+            response = handler(environ, lambda status, response_headers: statuses.append(status))
+            b"".join(response)
+            response.close()
+            return int(statuses[0].split()[0]), time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(call, paths))
+        return len(paths) / (time.perf_counter() - start), results
+
+    async def run_asgi(self, paths, headers, concurrency):
+        application = get_asgi_application()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(path):
+            path, _, query = path.partition("?")
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(b"host", b"localhost")] + [
+                    (name.encode(), value.encode()) for name, value in headers.items()
+                ],
+                "server": ("localhost", 80),
+                "client": ("127.0.0.1", 0),
+            }
+            received = []
+
+            async def receive():
+                if not received:
+                    received.append(True)
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # The client never disconnects
+                await asyncio.Future()
+
+            statuses = []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            async with semaphore:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                return statuses[0], time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[call(path) for path in paths])
+        return len(paths) / (time.perf_counter() - start), results
+
+    def report(self, name, throughput, results):
+        errors = [status for status, _ in results if status != 200]
+        timings = sorted(elapsed * 1000 for _, elapsed in results)
+        self.stdout.write(
+            f"{name:>24}: {throughput:7.1f} req/s  "
+            f"mean {statistics.mean(timings):7.2f} ms  "
+            f"p50 {timings[len(timings) // 2]:7.2f} ms  "
+            f"p95 {timings[int(len(timings) * 0.95)]:7.2f} ms  "
+            f"errors {len(errors)}"
+        )
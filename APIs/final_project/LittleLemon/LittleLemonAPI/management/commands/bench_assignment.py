@@ -0,0 +1,77 @@
+import datetime
+import heapq
+import time
+from decimal import Decimal
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from LittleLemonAPI import assignment, models, roles
+
+
+class Command(BaseCommand):
+    help = (
+        "Assigns --orders open orders to --crew new delivery crew members, "
+        "one save per order as the PATCHes of a manager do and with "
+        "assignment.assign_orders, and reports the time and queries of each. "
+        "Everything runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--crew", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=assignment.ASSIGN_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Only the orders and crew of the benchmark
+            assignment.open_orders().update(status=True)
+            User.objects.filter(groups__name=roles.DELIVERY_CREW).update(is_active=False)
+
+            group, _ = Group.objects.get_or_create(name=roles.DELIVERY_CREW)
+            crew = User.objects.bulk_create([
+                User(username=f"bench-assignment-crew-{i}") for i in range(options["crew"])
+            ])
+            group.user_set.add(*crew)
+            customer = User.objects.create(username="bench-assignment-customer")
+            today = datetime.date.today()
+            models.Order.objects.bulk_create([
+                models.Order(user=customer, status=False, total=Decimal("10.00"), date=today - datetime.timedelta(days=i % 30))
+                for i in range(options["orders"])
+            ], batch_size=1000)
+
+            for name, assign in (("one save per order", self.assign_one_by_one), ("assign_orders", None)):
+                with transaction.atomic():
+                    queries = []
+                    with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                        start = time.perf_counter()
+                        if assign:
+                            assign()
+                        else:
+                            assignment.assign_orders(options["batch_size"])
+                        elapsed = time.perf_counter() - start
+                    self.report(name, elapsed, len(queries), crew, options["orders"])
+                    transaction.set_rollback(True)
+
+            transaction.set_rollback(True)
+
+    def assign_one_by_one(self):
+        loads = assignment.crew_loads()
+        for order in assignment.open_orders().order_by("date", "id"):
+            load, crew_id = heapq.heappop(loads)
+            order.delivery_crew_id = crew_id
+            order.save(update_fields=["delivery_crew"])
+            heapq.heappush(loads, (load + 1, crew_id))
+
+    def report(self, name, elapsed, queries, crew, orders):
+        loads = list(
+            User.objects.filter(pk__in=[user.pk for user in crew])
+            .annotate(load=Count("delivery_crew", filter=Q(delivery_crew__status=False)))
+            .values_list("load", flat=True)
+        )
+        if sum(loads) != orders or max(loads) - min(loads) > 1:
+            raise CommandError(f"{name} didn't assign every order evenly: {sorted(loads)}")
+        self.stdout.write(
+            f"{name:>20}: {orders} orders to {len(crew)} crew members in {elapsed * 1000:8.1f} ms, "
+            f"{queries} queries, {min(loads)}-{max(loads)} orders each"
+        )
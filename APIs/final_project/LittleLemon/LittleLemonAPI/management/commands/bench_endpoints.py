@@ -0,0 +1,239 @@
+import json
+import math
+import statistics
+import time
+from collections import Counter
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from LittleLemonAPI import models, roles, tokens, urls
+from LittleLemonAPI.management.client import api_client
+
+BEARER_CUSTOMER = f"{roles.CUSTOMER} (bearer)"
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every route of LittleLemonAPI/urls.py in-process, as the role "
+        "that uses it, and reports latency percentiles, queries per request and "
+        "bytes per response as JSON. Runs against the data in the database "
+        "(see seed_data); writes are rolled back after each request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--cold-cache", action="store_true", help="Clear the cache before every request")
+        parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+        parser.add_argument("--compare", help="A previous report: print the p50 and p95 change of each scenario")
+        parser.add_argument("--label", default="")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = self.run(options)
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if options["compare"]:
+            self.compare(options["compare"], report)
+
+    def run(self, options):
+        self.users = self.find_users()
+        self.client = api_client()
+        scenarios = list(self.scenarios())
+        missing = {str(pattern.pattern) for pattern in urls.urlpatterns} - {route for route, *_ in scenarios}
+        if missing:
+            raise CommandError(f"No scenario for the routes {sorted(missing)}")
+
+        results = []
+        # The rate limits would turn most of the requests into 429s
+        with mock.patch.object(APIView, "throttle_classes", []):
+            for route, role, method, path, data in scenarios:
+                for _ in range(options["warmup"]):
+                    self.request(role, method, path, data, options["cold_cache"])
+                samples = [
+                    self.request(role, method, path, data, options["cold_cache"])
+                    for _ in range(options["iterations"])
+                ]
+                results.append(self.summarize(route, role, method, path, samples))
+
+        return {
+            "label": options["label"],
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "cold_cache": options["cold_cache"],
+            "rows": {
+                model.__name__: model.objects.count()
+                for model in [User, models.Category, models.MenuItem, models.Cart, models.Order, models.OrderItem]
+            },
+            "scenarios": results,
+        }
+
+    def find_users(self):
+        customers = User.objects.filter(groups=None, is_staff=False)
+        customer = customers.filter(order__isnull=False, cart__isnull=False).first()
+        crew = User.objects.filter(groups__name=roles.DELIVERY_CREW, delivery_crew__isnull=False).first()
+        manager = User.objects.filter(groups__name=roles.MANAGER).first()
+        if not (customer and crew and manager and models.Category.objects.exists()):
+            raise CommandError(
+                "Needs a customer with orders and a cart, a delivery crew member with orders, "
+                "a manager and a category: run seed_data first"
+            )
+        # Rolled back with everything else
+        admin = User.objects.create_user(username="bench-admin", password="bench-admin", is_staff=True)
+        users = {roles.CUSTOMER: customer, roles.DELIVERY_CREW: crew, roles.MANAGER: manager, roles.ADMIN: admin}
+        self.credentials = {
+            role: f"Token {Token.objects.get_or_create(user=user)[0].key}" for role, user in users.items()
+        }
+        # The same customer, authenticated with a stateless access token
+        self.credentials[BEARER_CUSTOMER] = f"Bearer {tokens.access_token(customer)}"
+        self.refresh_token = tokens.issue(customer)["refresh"]
+        return users
+
+    def scenarios(self):
+        """Yields (route, role, method, path, data)."""
+        customer, crew = self.users[roles.CUSTOMER], self.users[roles.DELIVERY_CREW]
+        category = models.Category.objects.first()
+        menu_item = models.MenuItem.objects.filter(category=category).first()
+        cart_item = models.Cart.objects.filter(user=customer).first()
+        new_menu_item = models.MenuItem.objects.exclude(cart__user=customer).first()
+        # Group changes revoke the access tokens of the user, outside the
+        # transaction: not the customer whose token the scenarios use
+        new_crew = User.objects.filter(groups=None, is_staff=False).exclude(pk=customer.pk).first()
+        new_crew_members = User.objects.filter(groups=None, is_staff=False).exclude(pk__in=[customer.pk, new_crew.pk])[:20]
+        order = models.Order.objects.filter(user=customer).first()
+        crew_order = models.Order.objects.filter(delivery_crew=crew).first()
+        search_term = menu_item.title.split()[0].lower()[:4]
+        # Halfway through the lists, where OFFSET pagination costs the most
+        menu_page = models.MenuItem.objects.count() // api_settings.PAGE_SIZE // 2 + 1
+        order_page = models.Order.objects.count() // api_settings.PAGE_SIZE // 2 + 1
+
+        yield "category/", roles.CUSTOMER, "get", "/api/category/", None
+        yield "category/", roles.ADMIN, "post", "/api/category/", {"slug": "bench", "title": "Bench"}
+        yield "category/<int:pk>", roles.CUSTOMER, "get", f"/api/category/{category.pk}", None
+        yield "category/<int:pk>", roles.ADMIN, "patch", f"/api/category/{category.pk}", {"title": category.title}
+
+        yield "menu-items/", roles.CUSTOMER, "get", "/api/menu-items/", None
+        yield "menu-items/", roles.CUSTOMER, "get", f"/api/menu-items/?page={menu_page}", None
+        yield "menu-items/", roles.CUSTOMER, "get", f"/api/menu-items/?category={category.title}&ordering=-price", None
+        yield "menu-items/", roles.CUSTOMER, "get", "/api/menu-items/?featured=True&pagination=keyset", None
+        yield "menu-items/", roles.CUSTOMER, "get", f"/api/menu-items/?search={search_term}", None
+        yield "menu-items/", roles.MANAGER, "post", "/api/menu-items/", {
+            "title": "Bench dish", "price": "9.50", "featured": False, "category_id": category.pk,
+        }
+        yield "menu-items/<int:pk>", roles.CUSTOMER, "get", f"/api/menu-items/{menu_item.pk}", None
+        yield "menu-items/<int:pk>", roles.MANAGER, "patch", f"/api/menu-items/{menu_item.pk}", {"featured": True}
+
+        yield "groups/<str:group_name>/users/", roles.MANAGER, "get", "/api/groups/delivery-crew/users/", None
+        yield "groups/<str:group_name>/users/", roles.MANAGER, "post", "/api/groups/delivery-crew/users/", {
+            "username": new_crew.username,
+        }
+        yield "groups/<str:group_name>/users/", roles.MANAGER, "get", "/api/groups/delivery-crew/users/?pagination=keyset&search=a", None
+        yield "groups/<str:group_name>/users/bulk", roles.MANAGER, "post", "/api/groups/delivery-crew/users/bulk", {
+            "add": [{"id": user.pk} for user in new_crew_members], "remove": [{"username": new_crew.username}],
+        }
+        yield "groups/<str:group_name>/users/<int:pk>", roles.MANAGER, "get", f"/api/groups/delivery-crew/users/{crew.pk}", None
+        yield "groups/<str:group_name>/users/<int:pk>", roles.MANAGER, "delete", f"/api/groups/delivery-crew/users/{crew.pk}", None
+
+        yield "cart/menu-items/", roles.CUSTOMER, "get", "/api/cart/menu-items/", None
+        yield "cart/menu-items/", roles.CUSTOMER, "post", "/api/cart/menu-items/", {
+            "menuitem_id": new_menu_item.pk, "quantity": 2,
+        }
+        yield "cart/menu-items/", roles.CUSTOMER, "delete", "/api/cart/menu-items/", None
+        yield "cart/menu-items/bulk", roles.CUSTOMER, "post", "/api/cart/menu-items/bulk", [
+            {"menuitem_id": cart_item.menuitem_id, "quantity": 3},
+            {"menuitem_id": new_menu_item.pk, "quantity": 1},
+        ]
+        yield "cart/menu-items/<int:pk>", roles.CUSTOMER, "get", f"/api/cart/menu-items/{cart_item.pk}", None
+        yield "cart/menu-items/<int:pk>", roles.CUSTOMER, "patch", f"/api/cart/menu-items/{cart_item.pk}", {"quantity": 4}
+
+        yield "orders/", roles.CUSTOMER, "get", "/api/orders/", None
+        yield "orders/", BEARER_CUSTOMER, "get", "/api/orders/", None
+        yield "orders/", roles.CUSTOMER, "get", "/api/orders/?ordering=-date&pagination=keyset", None
+        yield "orders/", roles.DELIVERY_CREW, "get", "/api/orders/?status=0", None
+        yield "orders/", roles.MANAGER, "get", f"/api/orders/?page={order_page}", None
+        yield "orders/", roles.MANAGER, "get", "/api/orders/?ordering=-total&count=estimate", None
+        yield "orders/", roles.CUSTOMER, "post", "/api/orders/", None
+        yield "orders/export", roles.MANAGER, "get", "/api/orders/export?format=csv", None
+        yield "orders/export", roles.MANAGER, "get", "/api/orders/export?format=ndjson&status=1", None
+        yield "orders/assign", roles.MANAGER, "post", "/api/orders/assign", {"limit": 50}
+        yield "orders/events", roles.CUSTOMER, "get", "/api/orders/events?timeout=0", None
+        yield "orders/<int:pk>", roles.CUSTOMER, "get", f"/api/orders/{order.pk}", None
+        yield "orders/<int:pk>", roles.MANAGER, "get", f"/api/orders/{order.pk}", None
+        yield "orders/<int:pk>", roles.DELIVERY_CREW, "patch", f"/api/orders/{crew_order.pk}", {"status": True}
+
+        yield "reports/daily", roles.MANAGER, "get", "/api/reports/daily?date_from=2000-01-01", None
+        yield "reports/menu-items", roles.MANAGER, "get", "/api/reports/menu-items", None
+        yield "reports/categories", roles.MANAGER, "get", "/api/reports/categories?limit=100", None
+        yield "reports/delivery-crew", roles.MANAGER, "get", "/api/reports/delivery-crew", None
+
+        yield "token/access/", roles.ADMIN, "post", "/api/token/access/", {
+            "username": "bench-admin", "password": "bench-admin",
+        }
+        yield "token/refresh/", roles.CUSTOMER, "post", "/api/token/refresh/", {"refresh": self.refresh_token}
+        yield "token/revoke/", roles.CUSTOMER, "post", "/api/token/revoke/", {"refresh": self.refresh_token}
+
+    def request(self, role, method, path, data, cold_cache):
+        if cold_cache:
+            cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=self.credentials[role])
+        # Each write is rolled back, so every request sees the same data
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(self.client, method)(path, data, format="json")
+                content = b"".join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return elapsed * 1000, len(queries), len(content), response.status_code
+
+    def summarize(self, route, role, method, path, samples):
+        timings = sorted(elapsed for elapsed, *_ in samples)
+        return {
+            "route": route,
+            "role": role,
+            "method": method.upper(),
+            "path": path,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "queries": statistics.median(queries for _, queries, _, _ in samples),
+            "bytes": statistics.median(size for _, _, size, _ in samples),
+            "statuses": dict(Counter(str(status) for *_, status in samples)),
+        }
+
+    def compare(self, path, report):
+        with open(path) as file:
+            previous = {
+                (scenario["role"], scenario["method"], scenario["path"]): scenario
+                for scenario in json.load(file)["scenarios"]
+            }
+        for scenario in report["scenarios"]:
+            before = previous.get((scenario["role"], scenario["method"], scenario["path"]))
+            if before is None:
+                continue
+            self.stderr.write(
+                f"{scenario['method']:>6} {scenario['path'][:60]:<60} ({scenario['role']}): "
+                f"p50 {before['p50_ms']:8.2f} -> {scenario['p50_ms']:8.2f} ms  "
+                f"p95 {before['p95_ms']:8.2f} -> {scenario['p95_ms']:8.2f} ms  "
+                f"queries {before['queries']} -> {scenario['queries']}"
+            )
@@ -0,0 +1,67 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from LittleLemonAPI import mixins, models, projections, renderers, serializers
+
+
+class Command(BaseCommand):
+    help = (
+        "Reads and renders --rows menu items, cart items and orders (as a "
+        "manager, a delivery crew member and a customer see them) with the "
+        "serializers and with their projections (see projections.py), checks "
+        "that the bytes are the same and reports the median time of each. "
+        "Uses the data in the database (see seed_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        if models.Order.objects.count() < rows:
+            raise CommandError(f"Needs {rows} orders: run seed_data first")
+
+        # The serializers render differently for GET requests
+        context = {"request": Request(APIRequestFactory().get("/api/orders/"))}
+        orders = models.Order.objects.order_by("id")[:rows]
+        scenarios = {
+            "menu items": (models.MenuItem.objects.order_by("id")[:rows], serializers.MenuItemSerializer),
+            "cart": (models.Cart.objects.order_by("id")[:rows], serializers.CartSerializer),
+            "orders (manager)": (orders, serializers.SingleOrderSerializerForManager),
+            "orders (crew)": (orders, serializers.SingleOrderSerializerForDeliveryCrew),
+            "orders (customer)": (orders, serializers.SingleOrderSerializerForCustomer),
+        }
+        renderer = renderers.FastJSONRenderer()
+
+        for name, (queryset, serializer_class) in scenarios.items():
+            projection = projections.get_projection(serializer_class)
+            if projection is None:
+                raise CommandError(f"{serializer_class.__name__} has no projection")
+
+            def serialize():
+                instances = mixins.prefetch_for_serializer(queryset, serializer_class)
+                return renderer.render(serializer_class(instances, many=True, context=context).data)
+
+            def project():
+                return renderer.render(projection.serialize(list(projection.apply(queryset))))
+
+            expected = serialize()
+            if project() != expected:
+                raise CommandError(f"The projection renders {name} differently")
+            before = self.time(serialize, options["iterations"])
+            after = self.time(project, options["iterations"])
+            self.stdout.write(
+                f"{name:>18}: {queryset.count()} rows, {len(expected) / 1024:8.1f} KiB  "
+                f"serializer {before:7.2f} ms  projection {after:7.2f} ms  {before / after:5.1f}x"
+            )
+
+    def time(self, render, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
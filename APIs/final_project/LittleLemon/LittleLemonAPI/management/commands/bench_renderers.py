@@ -0,0 +1,57 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from LittleLemonAPI import mixins, models, renderers, serializers
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the orders list of a manager and a list of users, as large as "
+        "--rows, with DRF's JSONRenderer and with renderers.FastJSONRenderer, "
+        "checks that the bytes are the same and reports the median time of "
+        "each. Uses the data in the database (see seed_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError("orjson isn't installed: FastJSONRenderer is JSONRenderer")
+        rows = options["rows"]
+        if models.Order.objects.count() < rows or User.objects.count() < rows:
+            raise CommandError(f"Needs {rows} orders and users: run seed_data first")
+
+        orders = mixins.prefetch_for_serializer(
+            models.Order.objects.order_by("id")[:rows], serializers.SingleOrderSerializerForManager
+        )
+        # The serializer renders differently for GET requests
+        context = {"request": Request(APIRequestFactory().get("/api/orders/"))}
+        payloads = {
+            "orders (manager)": serializers.SingleOrderSerializerForManager(orders, many=True, context=context).data,
+            "users": serializers.UserSerializer(User.objects.order_by("id")[:rows], many=True).data,
+        }
+
+        for name, data in payloads.items():
+            expected = JSONRenderer().render(data)
+            if renderers.FastJSONRenderer().render(data) != expected:
+                raise CommandError(f"FastJSONRenderer renders {name} differently")
+            before = self.time(JSONRenderer(), data, options["iterations"])
+            after = self.time(renderers.FastJSONRenderer(), data, options["iterations"])
+            self.stdout.write(
+                f"{name:>18}: {len(data)} rows, {len(expected) / 1024:8.1f} KiB  "
+                f"JSONRenderer {before:7.2f} ms  FastJSONRenderer {after:7.2f} ms  {before / after:5.1f}x"
+            )
+
+    def time(self, renderer, data, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            renderer.render(data)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from LittleLemonAPI import models, search, views
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "to", "su", "ve", "di", "po", "an", "el"]
+BASE_WORDS = [
+    "lemon", "pasta", "grilled", "fish", "greek", "salad", "bruschetta", "dessert",
+    "chicken", "souvlaki", "feta", "olive", "garlic", "basil", "tomato", "risotto",
+    "lamb", "spinach", "pie", "baklava", "honey", "yogurt", "octopus", "calamari",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares menu item search through the search backends with DRF's "
+        "SearchFilter on synthetic data. Everything runs inside a transaction "
+        "that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--vocabulary", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # A large catalog has a large vocabulary: add made-up dish names
+        self.words = BASE_WORDS + [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+            for _ in range(options["vocabulary"])
+        ]
+        with transaction.atomic():
+            self.create_menu(rng, options["items"])
+            terms = [rng.choice(self.words)[:rng.randint(3, 6)] for _ in range(options["queries"])]
+
+            backends = {"SearchFilter (icontains)": None, "ngram": search.NgramBackend()}
+            if search.SQLiteFTS5Backend.is_available():
+                backends["fts5"] = search.SQLiteFTS5Backend()
+            for name, backend in backends.items():
+                if backend is not None:
+                    backend.clear()
+                    backend.index(models.MenuItem.objects.only("id", "title"))
+                timings = [self.time_search(backend, term) for term in terms]
+                self.report(name, timings)
+
+            transaction.set_rollback(True)
+
+    def create_menu(self, rng, items):
+        category = models.Category.objects.create(slug="bench", title="Bench")
+        models.MenuItem.objects.bulk_create([
+            models.MenuItem(
+                title=" ".join(rng.sample(self.words, 3)).capitalize(),
+                price=rng.randint(100, 5000) / 100,
+                featured=False,
+                category=category,
+            )
+            for _ in range(items)
+        ], batch_size=1000)
+
+    def time_search(self, backend, term):
+        """Filters as MenuItemsView does and fetches a count and the first page."""
+        request = Request(APIRequestFactory().get("/api/menu-items/", {"search": term}))
+        view = views.MenuItemsView(request=request, format_kwarg=None)
+        queryset = models.MenuItem.objects.all()
+
+        start = time.perf_counter()
+        if backend is None:
+            view.search_fields = ["title"]
+            queryset = SearchFilter().filter_queryset(request, queryset, view).order_by("id")
+        else:
+            queryset = backend.search(queryset, search.search_terms(term)).order_by("search_rank", "id")
+        queryset.count()
+        list(queryset[:5])
+        return (time.perf_counter() - start) * 1000
+
+    def report(self, name, timings):
+        timings.sort()
+        self.stdout.write(
+            f"{name:>26}: mean {statistics.mean(timings):7.2f} ms  "
+            f"p50 {timings[len(timings) // 2]:7.2f} ms  "
+            f"p95 {timings[int(len(timings) * 0.95)]:7.2f} ms"
+        )
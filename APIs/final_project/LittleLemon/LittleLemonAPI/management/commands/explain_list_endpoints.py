@@ -0,0 +1,96 @@
+import datetime
+import secrets
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.views import APIView
+from LittleLemonAPI import models, queryplans, roles
+from LittleLemonAPI.management.client import api_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Explains the SQL of every filter, ordering and search combination of "
+        "the list endpoints and proposes composite indexes for the table scans "
+        "and sorts it finds. Creates a few rows of its own, with generated "
+        "names, inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Print every plan, not only the problems")
+        parser.add_argument("--proposals", type=int, default=5, help="How many indexes to propose")
+
+    def handle(self, *args, **options):
+        if not queryplans.supports_explain():
+            self.stdout.write(f"Unsupported: no EXPLAIN support for {connection.vendor}")
+            return
+
+        with transaction.atomic():
+            reports = self.explain()
+            proposals = queryplans.proposed_indexes(reports)
+            transaction.set_rollback(True)
+
+        scans = [report for report in reports if report.table_scans]
+        sorts = [report for report in reports if report.sorts and not report.table_scans]
+        for report in reports if options["all"] else scans + sorts:
+            self.stdout.write(str(report))
+
+        self.stdout.write(
+            f"{len(reports)} statements explained: {len(scans)} table scans, {len(sorts)} temporary sorts"
+        )
+        for table, columns, count in proposals[:options["proposals"]]:
+            self.stdout.write(f"Proposed index on {table} ({', '.join(columns)}): serves {count} statements")
+
+    def create_fixtures(self):
+        """A user of each role and an order, named so they can't clash with real data."""
+        prefix = f"explain-{secrets.token_hex(4)}"
+        manager = User.objects.create_user(username=f"{prefix}-manager")
+        manager.groups.add(Group.objects.get_or_create(name=roles.MANAGER)[0])
+        crew = User.objects.create_user(username=f"{prefix}-crew")
+        crew.groups.add(Group.objects.get_or_create(name=roles.DELIVERY_CREW)[0])
+        customer = User.objects.create_user(username=f"{prefix}-customer")
+
+        category = models.Category.objects.create(slug=prefix, title=f"{prefix} Main")
+        menu_item = models.MenuItem.objects.create(
+            title="Lemon pasta", price=Decimal("9.50"), featured=True, category=category
+        )
+        order = models.Order.objects.create(
+            user=customer, delivery_crew=crew, total=Decimal("9.50"), date=datetime.date.today()
+        )
+        models.OrderItem.objects.create(order=order, menuitem=menu_item, quantity=1, price=Decimal("9.50"))
+        users = {roles.MANAGER: manager, roles.DELIVERY_CREW: crew, roles.CUSTOMER: customer}
+        values = {
+            "customer_id": customer.pk,
+            "customer_username": customer.username,
+            "crew_id": crew.pk,
+            "crew_username": crew.username,
+            "category": category.title,
+        }
+        return users, values
+
+    def explain(self):
+        """
+        Runs every combination and returns a PlanReport for each statement
+        that reads a watched table. Call it inside a transaction that is
+        rolled back.
+        """
+        users, values = self.create_fixtures()
+        client = api_client()
+        reports = []
+
+        # The plans are the point here, not the rate limits
+        with mock.patch.object(APIView, "throttle_classes", []):
+            for role, path, params in queryplans.combinations(values):
+                client.force_authenticate(users[role])
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(path, params)
+                if response.status_code != 200:
+                    raise CommandError(f"{role} GET {path}?{params} returned {response.status_code}")
+                for query in queries.captured_queries:
+                    if queryplans.watched(query["sql"]):
+                        sql = query["sql"]
+                        reports.append(queryplans.PlanReport(role, path, params, sql, queryplans.explain(sql)))
+        return reports
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from LittleLemonAPI import models, search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the menu item search index of the active search backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        batch_size = options["batch_size"]
+        menu_items = models.MenuItem.objects.only("id", "title").order_by("id")
+
+        with transaction.atomic():
+            backend.clear()
+            indexed, last_id = 0, 0
+            while True:
+                batch = list(menu_items.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                backend.index(batch)
+                indexed += len(batch)
+                last_id = batch[-1].id
+
+        self.stdout.write(f"Indexed {indexed} menu items with the {backend.name} backend.")
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from LittleLemonAPI import carts
+
+
+class Command(BaseCommand):
+    help = (
+        "Updates the prices of the cart items whose menu item changed price "
+        "(see carts.reprice_carts). Runs once, or every --interval seconds "
+        "until it's stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=carts.REPRICE_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, help="Seconds between runs")
+
+    def handle(self, *args, **options):
+        while True:
+            repriced = carts.reprice_carts(options["batch_size"])
+            self.stdout.write(f"Repriced the carts of {repriced} price changes.")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,200 @@
+import datetime
+import itertools
+import random
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from LittleLemonAPI import caching, models, roles, search
+
+CATEGORIES = [
+    "Starters", "Salads", "Soups", "Pasta", "Pizza", "Grill", "Seafood", "Vegetarian",
+    "Sides", "Desserts", "Drinks", "Specials",
+]
+ADJECTIVES = [
+    "Lemon", "Grilled", "Roasted", "Greek", "Spicy", "Smoked", "Crispy", "Baked",
+    "Garlic", "Herb", "Honey", "Olive", "Fresh", "Stuffed", "Braised", "Chilled",
+]
+DISHES = [
+    "pasta", "fish", "salad", "bruschetta", "chicken", "souvlaki", "feta", "risotto",
+    "lamb", "spinach pie", "baklava", "yogurt", "octopus", "calamari", "moussaka",
+    "halloumi", "lentil soup", "gyro", "dolmades", "lemonade", "tiramisu", "shrimp",
+]
+FIRST_NAMES = [
+    "Adrian", "Maria", "Tilly", "Mario", "Sofia", "Nikos", "Elena", "Jamal", "Aiko",
+    "Lucia", "Omar", "Priya", "Chen", "Hana", "Diego", "Zoe", "Ivan", "Fatima",
+]
+LAST_NAMES = [
+    "Gomez", "Rossi", "Papadopoulos", "Smith", "Tanaka", "Okafor", "Novak", "Silva",
+    "Kowalski", "Haddad", "Nguyen", "Murphy", "Costa", "Berg", "Khan", "Lopez",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with reproducible synthetic data: categories, menu "
+        "items, customers, managers, delivery crew, carts, and orders with their "
+        "items. Popular customers and menu items get most of the orders. The "
+        "usernames and category slugs start with --prefix, and --clear deletes "
+        "what an earlier run created with it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=len(CATEGORIES))
+        parser.add_argument("--menu-items", type=int, default=1000)
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--managers", type=int, default=3)
+        parser.add_argument("--delivery-crew", type=int, default=20)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--carts", type=int, default=200, help="Customers with items in their cart")
+        parser.add_argument("--days", type=int, default=365, help="Orders are spread over the last DAYS days")
+        parser.add_argument("--password", help="Password of every user. Without it they can't log in")
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--clear", action="store_true", help="Only delete the data of an earlier run")
+
+    def handle(self, *args, **options):
+        self.prefix = options["prefix"]
+        self.batch_size = options["batch_size"]
+        if options["clear"]:
+            return self.clear()
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f"{connection.vendor} doesn't return the ids of bulk inserts")
+        if User.objects.filter(username__startswith=f"{self.prefix}-").exists():
+            raise CommandError(f"There's already data with the prefix {self.prefix}: use --clear first")
+
+        rng = random.Random(options["seed"])
+        # Hashing is slow: every user shares one hash
+        self.password = make_password(options["password"])
+
+        menu_items = self.create_menu(rng, options["categories"], options["menu_items"])
+        customers = self.create_users(rng, "customer", options["customers"])
+        self.create_users(rng, "manager", options["managers"], group=roles.MANAGER)
+        crew = self.create_users(rng, "delivery", options["delivery_crew"], group=roles.DELIVERY_CREW)
+        self.create_carts(rng, customers, menu_items, options["carts"])
+        self.create_orders(rng, customers, crew, menu_items, options["orders"], options["days"])
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def batches(self, objects):
+        iterator = iter(objects)
+        while batch := list(itertools.islice(iterator, self.batch_size)):
+            yield batch
+
+    def popularity(self, count):
+        """Cumulative weights that give the first items most of the picks (Zipf)."""
+        return list(itertools.accumulate(1 / rank for rank in range(1, count + 1)))
+
+    def create_menu(self, rng, category_count, item_count):
+        categories = models.Category.objects.bulk_create([
+            models.Category(
+                slug=f"{self.prefix}-{i}",
+                title=CATEGORIES[i % len(CATEGORIES)] + (f" {i // len(CATEGORIES) + 1}" if i >= len(CATEGORIES) else ""),
+            )
+            for i in range(category_count)
+        ])
+
+        menu_items = []
+        for batch in self.batches(
+            models.MenuItem(
+                title=f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}",
+                price=Decimal(rng.randrange(250, 4000, 25)) / 100,
+                featured=rng.random() < 0.05,
+                category=rng.choice(categories),
+            )
+            for _ in range(item_count)
+        ):
+            with transaction.atomic():
+                batch = models.MenuItem.objects.bulk_create(batch)
+                # bulk_create doesn't send the signals that keep the search
+                # index up to date
+                search.get_backend().index(batch)
+            menu_items.extend(batch)
+        caching.bump_version(caching.MENU)
+        self.log(f"{len(categories)} categories, {len(menu_items)} menu items")
+        return [(menu_item.pk, menu_item.price) for menu_item in menu_items]
+
+    def create_users(self, rng, role, count, group=None):
+        user_ids = []
+        for batch in self.batches(
+            User(
+                username=f"{self.prefix}-{role}-{i}",
+                email=f"{self.prefix}-{role}-{i}@example.com",
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                password=self.password,
+            )
+            for i in range(count)
+        ):
+            with transaction.atomic():
+                batch = User.objects.bulk_create(batch)
+                if group:
+                    group_id = Group.objects.get_or_create(name=group)[0].pk
+                    User.groups.through.objects.bulk_create([
+                        User.groups.through(user_id=user.pk, group_id=group_id) for user in batch
+                    ])
+            user_ids.extend(user.pk for user in batch)
+        self.log(f"{len(user_ids)} users with the role {group or roles.CUSTOMER}")
+        return user_ids
+
+    def create_carts(self, rng, customers, menu_items, count):
+        cart_items = []
+        for customer_id in rng.sample(customers, min(count, len(customers))):
+            for menuitem_id, price in rng.sample(menu_items, min(rng.randint(1, 5), len(menu_items))):
+                quantity = rng.randint(1, 3)
+                cart_items.append(models.Cart(
+                    user_id=customer_id, menuitem_id=menuitem_id, quantity=quantity, price=quantity * price
+                ))
+        for batch in self.batches(cart_items):
+            models.Cart.objects.bulk_create(batch)
+        self.log(f"{len(cart_items)} cart items")
+
+    def create_orders(self, rng, customers, crew, menu_items, count, days):
+        customer_weights = self.popularity(len(customers))
+        menu_item_weights = self.popularity(len(menu_items))
+        today = datetime.date.today()
+        created = 0
+
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            orders, lines = [], []
+            for customer_id in rng.choices(customers, cum_weights=customer_weights, k=size):
+                date = today - datetime.timedelta(days=rng.randrange(days))
+                # Old orders have been delivered, recent ones are on their way
+                delivered = rng.random() < (0.95 if (today - date).days > 2 else 0.3)
+                order_lines = {}
+                for menuitem_id, price in rng.choices(menu_items, cum_weights=menu_item_weights, k=rng.randint(1, 5)):
+                    quantity = rng.randint(1, 3)
+                    order_lines[menuitem_id] = (quantity, quantity * price)
+                orders.append(models.Order(
+                    user_id=customer_id,
+                    delivery_crew_id=rng.choice(crew) if crew and (delivered or rng.random() < 0.7) else None,
+                    status=delivered,
+                    total=sum(price for _, price in order_lines.values()),
+                    date=date,
+                ))
+                lines.append(order_lines)
+
+            with transaction.atomic():
+                orders = models.Order.objects.bulk_create(orders)
+                models.OrderItem.objects.bulk_create([
+                    models.OrderItem(order_id=order.pk, menuitem_id=menuitem_id, quantity=quantity, price=price)
+                    for order, order_lines in zip(orders, lines)
+                    for menuitem_id, (quantity, price) in order_lines.items()
+                ])
+            created += len(orders)
+            self.log(f"{created}/{count} orders")
+
+    def clear(self):
+        users = User.objects.filter(username__startswith=f"{self.prefix}-")
+        with transaction.atomic():
+            models.OrderItem.objects.filter(order__user__in=users).delete()
+            models.Order.objects.filter(user__in=users).delete()
+            deleted, _ = users.delete()
+            # The signals of the deleted menu items update the search index
+            models.MenuItem.objects.filter(category__slug__startswith=f"{self.prefix}-").delete()
+            models.Category.objects.filter(slug__startswith=f"{self.prefix}-").delete()
+        self.log(f"Deleted the data with the prefix {self.prefix} ({deleted} rows with the users)")
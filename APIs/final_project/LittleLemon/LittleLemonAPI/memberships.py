@@ -0,0 +1,69 @@
+"""
+Group memberships, written in bulk.
+
+The users are resolved with one IN query (find_users), then update()
+reads which of them are members already, adds the others with one
+bulk_create(ignore_conflicts=True) of User.groups rows and removes members
+with one DELETE. Those writes don't send m2m_changed, so the cached roles
+and access tokens of the users that changed are invalidated here, as
+signals.py does for user.groups.add/remove: right away and again once
+committed, since other requests may cache the old groups until then.
+"""
+from functools import partial
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from . import signals
+
+Membership = User.groups.through
+
+
+def find_users(entries):
+    """
+    The (id, username) of the user of each entry ({"id"}, {"username"} or
+    both), in one query. None for the entries without a user, or whose id
+    and username belong to different users.
+    """
+    ids = {entry["id"] for entry in entries if entry.get("id")}
+    usernames = {entry["username"] for entry in entries if entry.get("username")}
+    users = list(User.objects.filter(Q(pk__in=ids) | Q(username__in=usernames)).values_list("id", "username"))
+    by_id = {user[0]: user for user in users}
+    by_username = {user[1]: user for user in users}
+
+    found = []
+    for entry in entries:
+        user = by_id.get(entry["id"]) if entry.get("id") else by_username.get(entry.get("username"))
+        if user is not None and entry.get("username") and user[1] != entry["username"]:
+            user = None
+        found.append(user)
+    return found
+
+
+def is_member(group, user_id):
+    return Membership.objects.filter(group_id=group.pk, user_id=user_id).exists()
+
+
+def update(group, add=(), remove=()):
+    """
+    Adds the users with ids in `add` to the group and removes the ones in
+    `remove`. Returns the ids of the users (added, removed): the ones that
+    were members already, or weren't, are left as they were.
+    """
+    with transaction.atomic():
+        members = set(
+            Membership.objects.filter(group_id=group.pk, user_id__in=[*add, *remove])
+            .values_list("user_id", flat=True)
+        )
+        added = [user_id for user_id in add if user_id not in members]
+        removed = [user_id for user_id in remove if user_id in members]
+        if added:
+            # Added meanwhile by another request: nothing to do
+            Membership.objects.bulk_create(
+                [Membership(group_id=group.pk, user_id=user_id) for user_id in added], ignore_conflicts=True
+            )
+        if removed:
+            Membership.objects.filter(group_id=group.pk, user_id__in=removed).delete()
+        if added or removed:
+            signals.roles_changed([*added, *removed])
+            transaction.on_commit(partial(signals.roles_changed, [*added, *removed]))
+    return added, removed
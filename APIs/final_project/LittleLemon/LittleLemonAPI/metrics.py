@@ -0,0 +1,329 @@
+"""
+Request metrics in the Prometheus text format, served at /metrics.
+
+MetricsMiddleware aggregates every request under its resolved URL pattern
+(for example "api/orders/<int:pk>") and method: requests by status code,
+a latency histogram, ORM queries and the time spent in them, and the
+requests refused by the rate limits. The queries are counted by an
+execute wrapper that signals.py adds to every database connection.
+
+Each process aggregates in memory. With the METRICS_DIR setting, it also
+writes its totals to a file of its own in that directory, at most once
+per FLUSH_INTERVAL seconds, and /metrics adds up the files of every
+process: whichever worker answers the scrape reports all of them, the
+others up to FLUSH_INTERVAL seconds late. Like prometheus_client's
+mark_process_dead, the scrapes delete the files of the processes that have
+exited, after adding their totals to those of the answering process, so
+the directory doesn't grow with every restart and the counters never go
+back. The pids are checked on this host: the processes sharing METRICS_DIR
+must run on one. Without METRICS_DIR, /metrics only reports its own
+process.
+
+/metrics requires the METRICS_TOKEN setting, except under DEBUG.
+"""
+import bisect
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.utils.crypto import constant_time_compare
+
+# Upper bounds of the latency histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+FLUSH_INTERVAL = 1
+
+THROTTLED = 429
+
+# Keeps the labels bounded: every unknown method and path shares one
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+UNMATCHED = "<unmatched>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The [queries, seconds] of the request being served. Set by the
+# middleware; sync_to_async copies the context into its threads, so the
+# queries the async views run there are counted too.
+_current_queries = contextvars.ContextVar("current_queries", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper that adds the query to the current request."""
+    current = _current_queries.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current[0] += 1
+        current[1] += time.perf_counter() - start
+
+
+def _pid(path):
+    """The pid of a process's file in METRICS_DIR, or None."""
+    try:
+        return int(path.name.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Another user's process
+        return True
+    return True
+
+
+class RouteStats:
+    __slots__ = ("statuses", "buckets", "duration", "queries", "db_time", "throttled")
+
+    def __init__(self):
+        self.statuses = {}
+        # One count per bucket, then one for the slower requests (+Inf)
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.throttled = 0
+
+    def merge(self, data):
+        for status, count in data["statuses"].items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, data["buckets"])]
+        self.duration += data["duration"]
+        self.queries += data["queries"]
+        self.db_time += data["db_time"]
+        self.throttled += data["throttled"]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Registry:
+    """The metrics of this process, keyed by (route, method)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        # A new pid can reuse the file name of a dead process
+        self.filename = f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.routes = {}
+        self.flushed = 0.0
+
+    def _stats(self, route, method):
+        # Called with the lock held
+        if os.getpid() != self.pid:
+            # Forked from a process that had served requests already
+            self.reset()
+        stats = self.routes.get((route, method))
+        if stats is None:
+            stats = self.routes[(route, method)] = RouteStats()
+        return stats
+
+    def observe(self, route, method, status, duration, queries, db_time):
+        with self.lock:
+            stats = self._stats(route, method)
+            status = str(status)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+            stats.duration += duration
+            stats.queries += queries
+            stats.db_time += db_time
+            if status == str(THROTTLED):
+                stats.throttled += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[route, method, stats.as_dict()] for (route, method), stats in self.routes.items()]
+
+    def flush(self, force=False):
+        """Writes the totals of this process to METRICS_DIR, if it's set."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self.flushed < FLUSH_INTERVAL):
+            return
+        self.flushed = now
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / self.filename
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.snapshot()))
+        # Readers never see a half written file
+        os.replace(temporary, path)
+
+    def adopt_dead(self, directory):
+        """
+        Adds the totals of the processes that have exited to this one's and
+        deletes their files.
+        """
+        for path in directory.glob("*.json"):
+            pid = _pid(path)
+            if path.name == self.filename or pid is None or _alive(pid):
+                continue
+            try:
+                snapshot = json.loads(path.read_text())
+                # Only the process that manages to delete it adopts it
+                path.unlink()
+            except (OSError, ValueError):
+                continue
+            with self.lock:
+                for route, method, data in snapshot:
+                    self._stats(route, method).merge(data)
+
+    def collect(self):
+        """The totals of every process: {(route, method): RouteStats}."""
+        if not settings.METRICS_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.adopt_dead(Path(settings.METRICS_DIR))
+            self.flush(force=True)
+            snapshots = []
+            for path in Path(settings.METRICS_DIR).glob("*.json"):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    # Deleted since the glob
+                    continue
+
+        routes = {}
+        for snapshot in snapshots:
+            for route, method, data in snapshot:
+                routes.setdefault((route, method), RouteStats()).merge(data)
+        return routes
+
+
+registry = Registry()
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or match.route is None:
+        return UNMATCHED
+    return match.route
+
+
+class MetricsMiddleware:
+    """Records every request in the registry. Works under WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current = [0, 0.0]
+        token = _current_queries.set(current)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, current)
+        return response
+
+    async def __acall__(self, request):
+        current = [0, 0.0]
+        token = _current_queries.set(current)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_queries.reset(token)
+        self.record(request, response, time.perf_counter() - start, current)
+        return response
+
+    def record(self, request, response, duration, current):
+        # Streaming responses are timed up to their first byte
+        method = request.method if request.method in METHODS else "other"
+        registry.observe(route_of(request), method, response.status_code, duration, *current)
+        registry.flush()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else "NaN"
+    return str(value)
+
+
+def render(routes):
+    """The metrics in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name, kind, help, samples):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+            lines.append(f"{name}{suffix}{{{label_text}}} {_number(value)}")
+
+    ordered = sorted(routes.items())
+
+    family("littlelemon_http_requests_total", "counter", "Requests by URL pattern, method and status code.", [
+        ("", [("route", route), ("method", method), ("status", status)], count)
+        for (route, method), stats in ordered
+        for status, count in sorted(stats.statuses.items())
+    ])
+
+    duration_samples = []
+    for (route, method), stats in ordered:
+        labels = [("route", route), ("method", method)]
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), stats.buckets):
+            cumulative += count
+            duration_samples.append(("_bucket", labels + [("le", bound)], cumulative))
+        duration_samples.append(("_sum", labels, stats.duration))
+        duration_samples.append(("_count", labels, cumulative))
+    family(
+        "littlelemon_http_request_duration_seconds", "histogram",
+        "Time to the response, by URL pattern and method.", duration_samples,
+    )
+
+    family("littlelemon_db_queries_total", "counter", "ORM queries run by the requests.", [
+        ("", [("route", route), ("method", method)], stats.queries) for (route, method), stats in ordered
+    ])
+    family("littlelemon_db_query_duration_seconds_total", "counter", "Time spent in the ORM queries.", [
+        ("", [("route", route), ("method", method)], stats.db_time) for (route, method), stats in ordered
+    ])
+    family("littlelemon_http_throttled_requests_total", "counter", "Requests refused by the rate limits.", [
+        ("", [("route", route), ("method", method)], stats.throttled) for (route, method), stats in ordered
+    ])
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. A plain Django view: the scraper shouldn't
+    go through the API's authentication and rate limits. It must send
+    "Authorization: Bearer <METRICS_TOKEN>"; without the setting, the
+    endpoint only exists under DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseNotFound()
+    elif not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
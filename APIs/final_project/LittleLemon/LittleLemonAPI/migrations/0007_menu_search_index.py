@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:47
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = "littlelemonapi_menuitem_fts"
+
+# A copy of the tokenizer of LittleLemonAPI/search.py when this migration was
+# written: the migration must keep working when that module changes
+NGRAM_MAX_LENGTH = 10
+
+
+def title_ngrams(title):
+    ngrams = set()
+    for word in re.findall(r"\w+", title.lower()):
+        word = word[:NGRAM_MAX_LENGTH]
+        ngrams.update(word[:length] for length in range(1, len(word) + 1))
+    return ngrams
+
+
+def has_fts5(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def build_search_index(apps, schema_editor):
+    MenuItem = apps.get_model("LittleLemonAPI", "MenuItem")
+    MenuItemNgram = apps.get_model("LittleLemonAPI", "MenuItemNgram")
+    menu_items = list(MenuItem.objects.values_list("id", "title"))
+
+    MenuItemNgram.objects.bulk_create(
+        [
+            MenuItemNgram(menuitem_id=menuitem_id, ngram=ngram)
+            for menuitem_id, title in menu_items
+            for ngram in title_ngrams(title)
+        ],
+        batch_size=1000,
+    )
+
+    if has_fts5(schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+        )
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title) VALUES (%s, %s)", menu_items
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonAPI", "0006_contentversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MenuItemNgram",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("ngram", models.CharField(max_length=10)),
+                (
+                    "menuitem",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ngrams",
+                        to="LittleLemonAPI.menuitem",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("ngram", "menuitem")},
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("LittleLemonAPI", "0007_menu_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=6),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "date"], name="LittleLemon_user_id_65d2ad_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["delivery_crew", "status"],
+                name="LittleLemon_deliver_e1645b_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,158 @@
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import generics, serializers
+from . import asyncviews, caching, projections, renderers
+
+
+class RelatedLookups:
+    """The select_related and prefetch_related lookups a serializer needs."""
+    __slots__ = ("select", "prefetch")
+
+    def __init__(self):
+        self.select = []
+        # (lookup, model, RelatedLookups of the nested serializer)
+        self.prefetch = []
+
+
+def _nested_fields(serializer):
+    """
+    Yields (source, nested field) for the fields of the serializer that
+    follow a relation. Serializers can declare a `nested_on_read` mapping
+    for relations they only nest in their representation.
+    """
+    for field in serializer.fields.values():
+        yield field.source, field
+    for field_name, nested_class in getattr(serializer, "nested_on_read", {}).items():
+        yield field_name, nested_class()
+
+
+def _plan(serializer_class):
+    lookups = RelatedLookups()
+    serializer = serializer_class()
+    model = serializer.Meta.model
+
+    for source, field in _nested_fields(serializer):
+        if "." in source or source == "*":
+            continue
+        try:
+            relation = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            continue
+        if not relation.is_relation:
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        elif isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)):
+            nested = field
+        else:
+            continue
+
+        nested_lookups = (
+            plan_related_lookups(type(nested))
+            if isinstance(nested, serializers.ModelSerializer)
+            else RelatedLookups()
+        )
+        if relation.many_to_many or relation.one_to_many:
+            lookups.prefetch.append((source, relation.related_model, nested_lookups))
+        else:
+            lookups.select.append(source)
+            lookups.select.extend(f"{source}__{lookup}" for lookup in nested_lookups.select)
+            lookups.prefetch.extend(
+                (f"{source}__{lookup}", related_model, related_lookups)
+                for lookup, related_model, related_lookups in nested_lookups.prefetch
+            )
+    return lookups
+
+
+@lru_cache(maxsize=None)
+def plan_related_lookups(serializer_class):
+    """
+    Walks the field tree of a model serializer class and returns the
+    lookups that load every nested relation it renders up front. The plan
+    is computed once per serializer class.
+    """
+    return _plan(serializer_class)
+
+
+def _apply_lookups(queryset, lookups):
+    if lookups.select:
+        queryset = queryset.select_related(*lookups.select)
+    if lookups.prefetch:
+        # Prefetch objects keep state while they're evaluated, so each
+        # queryset gets its own
+        queryset = queryset.prefetch_related(*[
+            Prefetch(lookup, queryset=_apply_lookups(model._default_manager.all(), nested_lookups))
+            for lookup, model, nested_lookups in lookups.prefetch
+        ])
+    return queryset
+
+
+def prefetch_for_serializer(queryset, serializer_class):
+    """Applies the related lookups of the serializer class to the queryset."""
+    if not issubclass(serializer_class, serializers.ModelSerializer):
+        return queryset
+    return _apply_lookups(queryset, plan_related_lookups(serializer_class))
+
+
+class PrefetchRelatedMixin:
+    """
+    For generic views: loads the relations that the view's serializer
+    renders along with the queryset, so the number of queries doesn't grow
+    with the number of rows.
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return prefetch_for_serializer(queryset, self.get_serializer_class())
+
+
+class NestedOnReadMixin:
+    """
+    For model serializers that write relations by id: `nested_on_read`
+    maps the field names to the serializer classes that nest them in the
+    representation of GET requests.
+    """
+    nested_on_read = {}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context["request"].method == "GET":
+            for field_name, serializer_class in self.nested_on_read.items():
+                data[field_name] = serializer_class(getattr(instance, field_name)).data
+        return data
+
+
+class JSONErrorsMixin:
+    """
+    For views that stream a format of their own: errors are rendered as
+    JSON, whatever format was negotiated.
+    """
+    def handle_exception(self, exc):
+        self.request.accepted_renderer = renderers.FastJSONRenderer()
+        self.request.accepted_media_type = self.request.accepted_renderer.media_type
+        return super().handle_exception(exc)
+
+
+class ListView(
+    projections.ProjectedListMixin,
+    asyncviews.AsyncListMixin,
+    PrefetchRelatedMixin,
+    generics.ListCreateAPIView,
+):
+    """
+    Base of the list endpoints: read through the serializer's projection,
+    with an async GET for the async views.
+    """
+
+
+class CachedListView(caching.VersionedCacheMixin, ListView):
+    """ListView whose responses are cached until the table changes."""
+
+
+class DetailView(asyncviews.AsyncRetrieveMixin, PrefetchRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
+    """Base of the endpoints of one row, with an async GET for the async views."""
+
+
+class CachedDetailView(caching.VersionedCacheMixin, DetailView):
+    """DetailView whose responses are cached until the table changes."""
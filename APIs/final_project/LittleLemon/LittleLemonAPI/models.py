@@ -15,6 +15,25 @@ class MenuItem(models.Model):
     featured = models.BooleanField(db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The price as loaded, for signals.remember_price
+        instance._loaded_price = instance.__dict__.get("price")
+        return instance
+
+
+NGRAM_MAX_LENGTH = 10
+
+
+class MenuItemNgram(models.Model):
+    """Inverted index of the menu item titles for search.NgramBackend."""
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name="ngrams")
+    ngram = models.CharField(max_length=NGRAM_MAX_LENGTH)
+
+    class Meta:
+        unique_together = ("ngram", "menuitem")
+
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -28,6 +47,14 @@ class Cart(models.Model):
         unique_together = ("menuitem", "user")
 
 
+class PriceChange(models.Model):
+    """
+    A change of MenuItem.price whose carts haven't been repriced yet (see
+    carts.reprice_carts).
+    """
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name="+")
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(
@@ -38,9 +65,24 @@ class Order(models.Model):
         limit_choices_to={"groups__name":"Delivery crew"}
     )
     status = models.BooleanField(db_index=True, default=0)
-    total = models.DecimalField(max_digits=6, decimal_places=2)
+    total = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
     date = models.DateField(db_index=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The delivery as loaded, for signals.remember_delivery
+        if "delivery_crew_id" in instance.__dict__ and "status" in instance.__dict__:
+            instance._loaded_delivery = (instance.delivery_crew_id, instance.status)
+        return instance
+
+    class Meta:
+        # Composite indexes found by queryplans.py (explain_list_endpoints)
+        indexes = [
+            models.Index(fields=["user", "date"]),
+            models.Index(fields=["delivery_crew", "status"]),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="order_items")
@@ -51,4 +93,69 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        unique_together = ("order", "menuitem")
\ No newline at end of file
+        unique_together = ("order", "menuitem")
+
+class ContentVersion(models.Model):
+    """
+    A counter bumped every time a group of tables changes (for example
+    "menu" for menu items and categories). Caches and ETags are keyed by it,
+    so invalidating them doesn't depend on how many entries there are.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated = models.DateTimeField()
+
+
+class RefreshToken(models.Model):
+    """
+    A long-lived token that gets new access tokens (see tokens.py). Only
+    its hash is stored; each refresh revokes it and issues a new one.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="refresh_tokens")
+    token_hash = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField()
+    expires = models.DateTimeField()
+    revoked = models.BooleanField(default=False)
+
+
+class DailySales(models.Model):
+    """The orders of each day, added up (see reports.py)."""
+    date = models.DateField(primary_key=True)
+    orders = models.IntegerField(default=0)
+    items = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+
+# The rows of deleted menu items, categories and crew members are kept with a
+# NULL key, so the rollups still add up to DailySales
+
+class DailyMenuItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, related_name="+")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "menuitem")
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name="+")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "category")
+
+
+class DailyCrewSales(models.Model):
+    """The orders assigned to each delivery crew member, by order date."""
+    date = models.DateField()
+    delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="+")
+    orders = models.IntegerField(default=0)
+    delivered = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("date", "delivery_crew")
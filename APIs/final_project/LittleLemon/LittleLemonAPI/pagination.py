@@ -0,0 +1,337 @@
+import base64
+import binascii
+import json
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework import exceptions
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+"""
+----------------------KEYSET PAGINATION----------------------
+Instead of an OFFSET, each page starts right after the last row of the
+previous one: WHERE (ordering fields, id) > (values of the last row). The
+cost of a page doesn't depend on how deep it is, and no COUNT(*) is run.
+"""
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, request, queryset, view):
+        """
+        The ordering requested through OrderingFilter (restricted to the
+        view's ordering_fields), followed by the id as a tiebreaker so that
+        every row has a unique position.
+        """
+        ordering = list(OrderingFilter().get_ordering(request, queryset, view) or [])
+        if "id" not in [term.lstrip("-") for term in ordering]:
+            descending = bool(ordering) and ordering[0].startswith("-")
+            ordering.append("-id" if descending else "id")
+        return ordering
+
+    def encode_cursor(self, row, reverse):
+        position = [str(getattr(row, term.lstrip("-"))) for term in self.ordering]
+        payload = json.dumps({"o": self.ordering, "p": position, "r": reverse})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if payload["o"] != self.ordering or len(payload["p"]) != len(self.ordering):
+                raise ValueError
+            model_meta = self.queryset_model._meta
+            position = [
+                model_meta.get_field(term.lstrip("-")).to_python(value)
+                for term, value in zip(self.ordering, payload["p"])
+            ]
+            return position, bool(payload["r"])
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+    def position_filter(self, position, reverse):
+        """Rows strictly after the position (or before it, when reverse)."""
+        condition = Q()
+        equal_so_far = Q()
+        for term, value in zip(self.ordering, position):
+            field_name = term.lstrip("-")
+            after = term.startswith("-") == reverse
+            lookup = "gt" if after else "lt"
+            condition |= equal_so_far & Q(**{f"{field_name}__{lookup}": value})
+            equal_so_far &= Q(**{field_name: value})
+        return condition
+
+    def get_page_queryset(self, queryset, request, view):
+        """The rows of the page, plus one to know whether there are more."""
+        self.request = request
+        self.queryset_model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        if self.reverse:
+            queryset = queryset.order_by(*[
+                term[1:] if term.startswith("-") else f"-{term}" for term in self.ordering
+            ])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.position_filter(self.position, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = rows
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([row async for row in page_queryset])
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+"""
+----------------------ASYNC PAGE NUMBERS----------------------
+For the async views of asyncviews.py: the count and the page are loaded
+with the async ORM, then DRF builds the links and the response as usual.
+"""
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    async def acount(self, queryset):
+        return await queryset.acount()
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count is a cached_property: with it set, page() doesn't query
+        paginator.count = await self.acount(queryset)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = await self.apage(paginator, page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise exceptions.NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    async def apage(self, paginator, number):
+        page = paginator.page(number)
+        page.object_list = [row async for row in page.object_list]
+        return page
+
+
+"""
+----------------------ESTIMATED COUNTS----------------------
+Page numbers for clients that need them, without an exact COUNT(*).
+Unfiltered tables use the row estimate kept by the database; filtered
+querysets are counted up to ESTIMATED_COUNT_LIMIT rows.
+"""
+
+ESTIMATED_COUNT_LIMIT = 1000
+
+
+def _table_row_estimate(queryset):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples FROM pg_class WHERE relname = %s"
+    elif connection.vendor == "mysql":
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+    elif connection.vendor == "sqlite":
+        # Only present after ANALYZE: the first number of stat is the row count
+        sql = "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(sql, [table])
+        except DatabaseError:
+            # sqlite_stat1 doesn't exist until the first ANALYZE
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    return estimate if estimate >= 0 else None
+
+
+def estimate_count(queryset):
+    if not queryset.query.where:
+        estimate = _table_row_estimate(queryset)
+        if estimate is not None:
+            return estimate
+    return queryset.order_by()[:ESTIMATED_COUNT_LIMIT].count()
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator whose count is an estimate. Pages past the estimate are
+    still served: whether there's a next page is decided by fetching one
+    extra row, not by the count.
+    """
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage("That page number is not an integer")
+        if number < 1:
+            raise InvalidPage("That page number is less than 1")
+        return number
+
+    def page_rows(self, number):
+        """The rows of the page, plus one to know whether there's a next one."""
+        bottom = (number - 1) * self.per_page
+        return self.object_list[bottom:bottom + self.per_page + 1]
+
+    def page(self, number):
+        number = self.validate_number(number)
+        rows = list(self.page_rows(number))
+        return EstimatedPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+    async def apage(self, number):
+        number = self.validate_number(number)
+        rows = [row async for row in self.page_rows(number)]
+        return EstimatedPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+class EstimatedCountPagination(AsyncPageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
+    async def acount(self, queryset):
+        # The table estimates are read with a raw cursor, which has no
+        # async API
+        return await sync_to_async(estimate_count)(queryset)
+
+    async def apage(self, paginator, number):
+        return await paginator.apage(number)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.page.paginator.count,
+            "count_is_estimate": True,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+
+"""
+----------------------OPT-IN MODES----------------------
+Page numbers stay the default. Clients opt into the other modes with:
+- ?pagination=keyset (then follow the next/previous links with their cursor)
+- ?count=estimate
+"""
+
+class LargeTablePagination(BasePagination):
+    pagination_query_param = "pagination"
+    count_query_param = "count"
+
+    def get_mode(self, request):
+        if request.query_params.get(self.pagination_query_param) == "keyset":
+            return KeysetPagination()
+        if request.query_params.get(KeysetPagination.cursor_query_param):
+            return KeysetPagination()
+        if request.query_params.get(self.count_query_param) == "estimate":
+            return EstimatedCountPagination()
+        return AsyncPageNumberPagination()
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.mode, "display_page_controls", False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = self.get_mode(request)
+        return self.mode.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.mode = self.get_mode(request)
+        return await self.mode.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.mode.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.mode.to_html()
+
+    def get_results(self, data):
+        return data["results"]
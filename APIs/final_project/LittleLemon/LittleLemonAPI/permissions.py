@@ -1,39 +1,106 @@
+import itertools
+from collections.abc import Mapping
+from functools import lru_cache
 from rest_framework.permissions import BasePermission
-    
-class IsAdminOrManagerPermission(BasePermission):
+from . import roles
+
+
+class RolePermission(BasePermission):
+    """Base of the permissions that depend on the user's roles."""
+
+class IsAdminOrManagerPermission(RolePermission):
     def has_permission(self,request,view):
-        return request.user.is_staff or request.user.groups.filter(name="Manager").exists()
+        return roles.is_admin_or_manager(request.user)
 
-class IsCustomerPermission(BasePermission):
+class IsCustomerPermission(RolePermission):
     def has_permission(self, request, view):
-        return not request.user.groups.exists() and not request.user.is_staff # If it has a group, it is not a customer, admin is not a customer
+        return roles.is_customer(request.user) # If it has a group, it is not a customer, admin is not a customer
 
-class IsDeliveryCrewPermission(BasePermission):
+class IsDeliveryCrewPermission(RolePermission):
     def has_permission(self, request, view):
-        return request.user.groups.filter(name="Delivery crew").exists()
+        return roles.is_delivery_crew(request.user)
 
-class IsAdminManagerOrDeliveryCrew(BasePermission):
+class IsAdminManagerOrDeliveryCrew(RolePermission):
     def has_permission(self, request, view):
-        return request.user.is_staff or request.user.groups.filter(name="Manager").exists() or request.user.groups.filter(name="Delivery crew").exists()
+        return roles.is_admin_or_manager(request.user) or roles.is_delivery_crew(request.user)
     
-class OrderPermissions(BasePermission):
-    def has_object_permission(self, request, view, obj):
-        user = request.user
-
-        # Check if the user is in the "Delivery crew" group
-        if user.groups.filter(name="Delivery crew").exists():
-            restricted_fields = ["id", "user", "delivery_crew", "total", "date", "order_items"]  # Add the field names you want to restrict
-            if request.method in ["PATCH", "PUT"]:
-                for field in restricted_fields:
-                    if field in request.data and request.data[field] != getattr(obj, field):
-                        return False
-                    
-        # Check if the user is in the "Delivery crew" group
-        if user.groups.filter(name="Manager").exists() or user.is_staff:
-            restricted_fields = ["id", "user", "total", "date", "order_items"]  # Add the field names you want to restrict
-            if request.method in ["PATCH", "PUT"]:
-                for field in restricted_fields:
-                    if field in request.data and request.data[field] != getattr(obj, field):
-                        return False
-
-        return True
\ No newline at end of file
+class FieldWritePolicy:
+    """
+    The fields each role may write, declared as {role: fields}. It's
+    compiled once, when the module is imported, into the set of fields of
+    every combination of the declared roles, so checking a request is one
+    lookup and one set difference.
+    """
+    def __init__(self, fields_by_role):
+        fields_by_role = {role: frozenset(fields) for role, fields in fields_by_role.items()}
+        self.roles = frozenset(fields_by_role)
+        self.allowed = {}
+        for size in range(len(fields_by_role) + 1):
+            for combination in itertools.combinations(fields_by_role, size):
+                self.allowed[frozenset(combination)] = frozenset().union(
+                    *(fields_by_role[role] for role in combination)
+                )
+
+    def allowed_fields(self, user):
+        return self.allowed[roles.get_roles(user) & self.roles]
+
+    def denied_fields(self, user, data, fields):
+        """The keys of the payload among `fields` the user may not write."""
+        if not isinstance(data, Mapping):
+            # Lists are validated by the bulk serializers
+            return frozenset()
+        return (data.keys() & fields) - self.allowed_fields(user)
+
+
+@lru_cache(maxsize=None)
+def field_names(serializer_class):
+    """
+    The fields of the serializer and of its model: the keys of a payload a
+    write policy rules on. Others, like the csrfmiddlewaretoken of the
+    browsable API's forms, are left to the serializer, which ignores them.
+    """
+    names = set(serializer_class().fields)
+    model = getattr(getattr(serializer_class, "Meta", None), "model", None)
+    if model is not None:
+        for field in model._meta.concrete_fields:
+            names.update((field.name, field.attname))
+    return frozenset(names)
+
+
+class FieldWritePermission(RolePermission):
+    """
+    Refuses POST, PUT and PATCH requests with fields the view's
+    `write_policy` doesn't allow for the user's roles.
+    """
+    def has_permission(self, request, view):
+        if request.method not in ("POST", "PUT", "PATCH"):
+            return True
+        if hasattr(view, "get_serializer_class"):
+            serializer_class = view.get_serializer_class()
+        else:
+            serializer_class = view.serializer_class
+        denied = view.write_policy.denied_fields(request.user, request.data, field_names(serializer_class))
+        if denied:
+            self.message = f"You can't change {', '.join(sorted(denied))}."
+            return False
+        return True
+
+
+ORDER_WRITE_POLICY = FieldWritePolicy({
+    roles.ADMIN: ["delivery_crew", "status"],
+    roles.MANAGER: ["delivery_crew", "status"],
+    roles.DELIVERY_CREW: ["status"],
+})
+
+MENU_ITEM_WRITE_POLICY = FieldWritePolicy({
+    roles.ADMIN: ["title", "price", "featured", "category_id"],
+    roles.MANAGER: ["title", "price", "featured", "category_id"],
+})
+
+CART_WRITE_POLICY = FieldWritePolicy({
+    roles.CUSTOMER: ["menuitem_id", "quantity"],
+})
+
+CART_ITEM_WRITE_POLICY = FieldWritePolicy({
+    roles.CUSTOMER: ["quantity"],
+})
@@ -0,0 +1,298 @@
+"""
+Read-only fast path for the list endpoints.
+
+Serializing a page the usual way builds a model instance per row (and per
+select_related relation), then has every serializer field read its
+attribute back from it. For the GET lists, where nothing is written, a
+serializer class is compiled once into a Projection instead:
+
+- The columns its fields read become the paths of one values_list query,
+  relations followed with "__" (category__title) instead of a join into
+  related instances. Rows are namedtuples: no __dict__ per row, and the
+  keyset pagination reads the ordering fields from them as attributes.
+- Nested lists over a reverse foreign key (order_items) are loaded with a
+  second values_list query for the whole page, grouped by parent.
+- The rows are mapped to dicts in the order of the serializer's fields,
+  through the fields' own to_representation for the values that need a
+  conversion (decimals, dates), so the rendered bytes are the same.
+
+Serializers with fields it can't compile (method fields, dotted sources,
+custom to_representation...) get no projection: the views keep using the
+serializer for them.
+"""
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ForeignKey
+from django.db.models.query import BaseIterable, NamedValuesListIterable
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Fields whose to_representation returns the database value unchanged
+IDENTITY_FIELDS = (serializers.CharField, serializers.EmailField, serializers.IntegerField)
+
+
+class Column:
+    """A value of the row, converted by the serializer field when needed."""
+    __slots__ = ("name", "index", "convert")
+
+    def __init__(self, name, index, convert):
+        self.name = name
+        self.index = index
+        self.convert = convert
+
+    def value(self, row, children):
+        value = row[self.index]
+        if value is None or self.convert is None:
+            return value
+        return self.convert(value)
+
+
+class Nested:
+    """A forward relation rendered by a nested serializer."""
+    __slots__ = ("name", "index", "nodes", "null")
+
+    def __init__(self, name, index, nodes, null):
+        self.name = name
+        # The foreign key column, to tell a missing relation
+        self.index = index
+        self.nodes = nodes
+        self.null = null
+
+    def value(self, row, children):
+        if row[self.index] is None:
+            return dict(self.null) if self.null is not None else None
+        return {node.name: node.value(row, children) for node in self.nodes}
+
+
+class Children:
+    """A reverse foreign key rendered by a nested list serializer."""
+    __slots__ = ("name", "index", "related_name", "projection")
+
+    def __init__(self, name, index, related_name, projection):
+        self.name = name
+        # The primary key column of the parent
+        self.index = index
+        self.related_name = related_name
+        self.projection = projection
+
+    def value(self, row, children):
+        return children[self].get(row[self.index], [])
+
+    def queryset(self, parent_ids):
+        return self.projection.model._default_manager.filter(
+            **{f"{self.related_name}__in": parent_ids}
+        ).values_list(self.related_name, *self.projection.paths)
+
+    def group(self, rows):
+        """{parent id: [child dicts]}; the parent id comes first in each row."""
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[0], []).append(row[1:])
+        return {parent_id: self.projection.to_data(child_rows, {}) for parent_id, child_rows in grouped.items()}
+
+
+class ProjectedIterable(BaseIterable):
+    """
+    values_list(*paths, named=True), added to the query only when the rows
+    are read: until then it's the model's queryset, so the counts of the
+    paginators don't join the relations of the paths.
+    """
+    paths = ()
+
+    def __iter__(self):
+        queryset = self.queryset.values_list(*self.paths, named=True)
+        return iter(NamedValuesListIterable(queryset, self.chunked_fetch, self.chunk_size))
+
+
+@lru_cache(maxsize=None)
+def _projected_iterable(paths):
+    return type("ProjectedIterable", (ProjectedIterable,), {"paths": paths})
+
+
+class Projection:
+    __slots__ = ("model", "paths", "nodes", "children")
+
+    def __init__(self, model, paths, nodes, children):
+        self.model = model
+        self.paths = paths
+        self.nodes = nodes
+        self.children = children
+
+    def apply(self, queryset, extra_paths=()):
+        """
+        The queryset, returning its rows as namedtuples with the paths of
+        the projection, then the extra paths the view needs (the ordering
+        fields of keyset pagination).
+        """
+        extra_paths = tuple(path for path in extra_paths if path not in self.paths)
+        queryset = queryset.prefetch_related(None)
+        queryset._iterable_class = _projected_iterable(self.paths + extra_paths)
+        return queryset
+
+    def fetch_children(self, rows):
+        return {
+            node: node.group(node.queryset({row[node.index] for row in rows}))
+            for node in self.children
+        } if rows else {}
+
+    async def afetch_children(self, rows):
+        if not rows:
+            return {}
+        return {
+            node: node.group([row async for row in node.queryset({row[node.index] for row in rows})])
+            for node in self.children
+        }
+
+    def to_data(self, rows, children):
+        nodes = self.nodes
+        return [{node.name: node.value(row, children) for node in nodes} for row in rows]
+
+    def serialize(self, rows):
+        """The list serializer's data for the rows of apply()."""
+        return self.to_data(rows, self.fetch_children(rows))
+
+    async def aserialize(self, rows):
+        return self.to_data(rows, await self.afetch_children(rows))
+
+
+class Unsupported(Exception):
+    pass
+
+
+class _Compiler:
+    def __init__(self):
+        self.paths = []
+        self.children = []
+
+    def path(self, path):
+        if path not in self.paths:
+            self.paths.append(path)
+        return self.paths.index(path)
+
+    def serializer_nodes(self, serializer, model, prefix, read):
+        if not isinstance(serializer, serializers.ModelSerializer) or serializer.Meta.model is not model:
+            raise Unsupported(serializer)
+        # Not at the top: mixins.py builds its views on ProjectedListMixin
+        from .mixins import NestedOnReadMixin
+
+        to_representation = type(serializer).to_representation
+        nested_on_read = {}
+        if to_representation is NestedOnReadMixin.to_representation:
+            if read:
+                nested_on_read = serializer.nested_on_read
+        elif to_representation is not serializers.Serializer.to_representation:
+            raise Unsupported(serializer)
+
+        nodes = []
+        for field in serializer._readable_fields:
+            if field.field_name in nested_on_read:
+                nested_class = nested_on_read[field.field_name]
+                nodes.append(self.relation_node(
+                    field.field_name, nested_class(), model, field.source, prefix, null=dict(nested_class(None).data)
+                ))
+            else:
+                nodes.append(self.field_node(field, model, prefix, read))
+        return nodes
+
+    def field_node(self, field, model, prefix, read):
+        source = field.source
+        if "." in source or source == "*":
+            raise Unsupported(field)
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise Unsupported(field)
+
+        if isinstance(field, serializers.ListSerializer):
+            if not model_field.one_to_many or prefix:
+                raise Unsupported(field)
+            child = _Compiler()
+            nodes = child.serializer_nodes(field.child, model_field.related_model, "", read)
+            # Only one level of nested lists
+            if child.children:
+                raise Unsupported(field)
+            node = Children(
+                field.field_name,
+                self.path(model._meta.pk.attname),
+                model_field.field.name,
+                Projection(model_field.related_model, tuple(child.paths), nodes, child.children),
+            )
+            self.children.append(node)
+            return node
+
+        if isinstance(field, serializers.BaseSerializer):
+            return self.relation_node(field.field_name, field, model, source, prefix, null=None)
+
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if not isinstance(model_field, ForeignKey) or field.pk_field is not None:
+                raise Unsupported(field)
+            return Column(field.field_name, self.path(prefix + source), None)
+
+        if model_field.is_relation or isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+            raise Unsupported(field)
+        convert = None if type(field) in IDENTITY_FIELDS else field.to_representation
+        return Column(field.field_name, self.path(prefix + source), convert)
+
+    def relation_node(self, name, serializer, model, source, prefix, null):
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise Unsupported(serializer)
+        if not isinstance(model_field, ForeignKey):
+            raise Unsupported(serializer)
+        index = self.path(prefix + source)
+        nodes = self.serializer_nodes(serializer, model_field.related_model, f"{prefix}{source}__", read=False)
+        return Nested(name, index, nodes, null)
+
+
+@lru_cache(maxsize=None)
+def get_projection(serializer_class):
+    """
+    The Projection of the serializer class as it renders GET responses, or
+    None if it can't be projected. Compiled once per class.
+    """
+    if not issubclass(serializer_class, serializers.ModelSerializer):
+        return None
+    compiler = _Compiler()
+    try:
+        nodes = compiler.serializer_nodes(serializer_class(), serializer_class.Meta.model, "", read=True)
+    except Unsupported:
+        return None
+    return Projection(serializer_class.Meta.model, tuple(compiler.paths), nodes, compiler.children)
+
+
+class ProjectedListMixin:
+    """
+    For list views (with AsyncListMixin, if the view has it): GET lists are
+    read through the projection of the view's serializer class, when it has
+    one, and paginated as the rows of the queryset would be.
+    """
+    def get_projection(self):
+        return get_projection(self.get_serializer_class())
+
+    def get_projected_queryset(self, projection, queryset):
+        return projection.apply(queryset, getattr(self, "ordering_fields", None) or ())
+
+    def list(self, request, *args, **kwargs):
+        projection = self.get_projection()
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.get_projected_queryset(projection, self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.serialize(page))
+        return Response(projection.serialize(list(queryset)))
+
+    async def aget(self, request, *args, **kwargs):
+        projection = self.get_projection()
+        if projection is None:
+            return await super().aget(request, *args, **kwargs)
+        queryset = self.get_projected_queryset(projection, await self.afilter_queryset(self.get_queryset()))
+
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            if page is not None:
+                return self.get_paginated_response(await projection.aserialize(page))
+        return Response(await projection.aserialize([row async for row in queryset]))
+
@@ -0,0 +1,201 @@
+"""
+Query plans of the list endpoints.
+
+The documented filter, ordering and search combinations of the list views
+for each role, and the analysis of the SQL they run, explained with
+EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (MySQL). The explain_list_endpoints
+command requests the combinations and captures the SQL (QueryPlanTest runs
+it too).
+"""
+import re
+from collections import Counter
+from django.db import connection
+from . import models, roles
+
+WATCHED_MODELS = [models.Order, models.OrderItem, models.MenuItem]
+
+# Columns used by each query parameter and by the scope of each role
+FILTER_COLUMNS = {
+    "user_id": "user_id",
+    "user_username": "user_id",
+    "delivery_crew_id": "delivery_crew_id",
+    "delivery_crew_username": "delivery_crew_id",
+    "status": "status",
+    "category": "category_id",
+    "featured": "featured",
+}
+ROLE_SCOPE_COLUMNS = {
+    roles.CUSTOMER: ["user_id"],
+    roles.DELIVERY_CREW: ["delivery_crew_id"],
+    roles.MANAGER: [],
+}
+
+ORDER_FILTERS = [
+    {},
+    {"user_id": "{customer_id}"},
+    {"user_username": "{customer_username}"},
+    {"delivery_crew_id": "{crew_id}"},
+    {"delivery_crew_username": "{crew_username}"},
+    {"status": "0"},
+    {"status": "1"},
+    {"delivery_crew_username": "{crew_username}", "status": "0"},
+    {"delivery_crew_id": "{crew_id}", "status": "1"},
+    {"user_username": "{customer_username}", "status": "0"},
+]
+ORDER_ORDERINGS = [None, "date", "-date", "total", "-total"]
+
+MENU_ITEM_FILTERS = [
+    {},
+    {"category": "{category}"},
+    {"featured": "True"},
+    {"category": "{category}", "featured": "False"},
+    {"search": "lemon"},
+    {"search": "lemon pas", "category": "{category}"},
+]
+MENU_ITEM_ORDERINGS = [None, "price", "-price"]
+
+
+class PlanReport:
+    __slots__ = ("role", "path", "params", "sql", "plan", "table_scans", "sorts")
+
+    def __init__(self, role, path, params, sql, plan):
+        self.role = role
+        self.path = path
+        self.params = params
+        self.sql = sql
+        self.plan = plan
+        self.table_scans = table_scans(sql, plan)
+        self.sorts = temp_sorts(plan)
+
+    def proposed_index(self, table):
+        """
+        The composite index that would serve this combination on the given
+        table: the equality columns of its filters, then the ordering.
+        """
+        model = {model._meta.db_table: model for model in WATCHED_MODELS}[table]
+        column_names = {field.column for field in model._meta.concrete_fields}
+        columns = list(ROLE_SCOPE_COLUMNS.get(self.role, [])) if model is models.Order else []
+        for param in self.params:
+            column = FILTER_COLUMNS.get(param)
+            if column in column_names and column not in columns:
+                columns.append(column)
+        ordering = self.params.get("ordering", "").lstrip("-")
+        if ordering in column_names:
+            columns.append(ordering)
+        return (table, tuple(columns))
+
+    def __str__(self):
+        return f"{self.role} GET {self.path}?{self.params}: {' | '.join(self.plan)}"
+
+
+def supports_explain():
+    return connection.vendor in ("sqlite", "mysql")
+
+
+def explain(sql):
+    """
+    Returns the steps of the plan of the statement, as strings, or None if
+    the database isn't supported (see supports_explain).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == "mysql":
+            cursor.execute(f"EXPLAIN {sql}")
+            columns = [column[0] for column in cursor.description]
+            return [
+                "{table}: type={type} key={key}".format(**dict(zip(columns, row)))
+                for row in cursor.fetchall()
+            ]
+    return None
+
+
+def table_scans(sql, plan):
+    """
+    The watched tables the plan reads in full. A statement without WHERE or
+    ORDER BY (like the first page of an unfiltered list) reads the table
+    anyway and stops at its LIMIT, so it isn't reported.
+    """
+    if " WHERE " not in sql and " ORDER BY " not in sql:
+        return set()
+    watched = {model._meta.db_table for model in WATCHED_MODELS}
+    scans = set()
+    for step in plan:
+        if connection.vendor == "sqlite":
+            match = re.fullmatch(r"SCAN (\w+)", step)
+        else:
+            match = re.fullmatch(r"(\w+): type=ALL key=.*", step)
+        if match and match.group(1) in watched:
+            scans.add(match.group(1))
+    return scans
+
+
+def temp_sorts(plan):
+    return any("TEMP B-TREE FOR ORDER BY" in step or "Using filesort" in step for step in plan)
+
+
+def combinations(values):
+    """
+    Yields (role, path, params) for every combination to explain. `values`
+    fills in the placeholders of the filters: the ids and usernames of the
+    customer and the delivery crew member, and the category title.
+    """
+    for role in (roles.MANAGER, roles.DELIVERY_CREW, roles.CUSTOMER):
+        for filters in ORDER_FILTERS:
+            for ordering in ORDER_ORDERINGS:
+                params = {key: value.format(**values) for key, value in filters.items()}
+                if ordering:
+                    params["ordering"] = ordering
+                yield role, "/api/orders/", params
+
+    for filters in MENU_ITEM_FILTERS:
+        for ordering in MENU_ITEM_ORDERINGS:
+            params = {key: value.format(**values) for key, value in filters.items()}
+            if ordering:
+                params["ordering"] = ordering
+            yield roles.CUSTOMER, "/api/menu-items/", params
+
+
+def watched(sql):
+    """Whether the statement is a read of a watched table."""
+    return sql.startswith("SELECT") and any(f'"{model._meta.db_table}"' in sql for model in WATCHED_MODELS)
+
+
+def proposed_indexes(reports):
+    """
+    Composite indexes that would remove the table scans and sorts found in
+    the reports, leaving out the ones an existing index already covers.
+    Returns (table, columns, number of statements it would serve), the most
+    useful first.
+    """
+    existing = set()
+    for model in WATCHED_MODELS:
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        existing |= {
+            (model._meta.db_table, tuple(constraint["columns"]))
+            for constraint in constraints.values()
+            if constraint["index"] or constraint["unique"]
+        }
+
+    proposals = Counter()
+    for report in reports:
+        if report.table_scans:
+            tables = report.table_scans
+        elif report.sorts:
+            tables = {_list_model(report.path)._meta.db_table}
+        else:
+            continue
+        for table in tables:
+            table, columns = report.proposed_index(table)
+            if columns and not any(
+                index_table == table and index_columns[:len(columns)] == columns
+                for index_table, index_columns in existing
+            ):
+                proposals[(table, columns)] += 1
+    return [(table, columns, count) for (table, columns), count in proposals.most_common()]
+
+
+def _list_model(path):
+    return models.Order if path.startswith("/api/orders/") else models.MenuItem
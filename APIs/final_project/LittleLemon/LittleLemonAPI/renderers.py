@@ -0,0 +1,103 @@
+"""
+Faster JSON responses.
+
+FastJSONRenderer encodes with orjson, when it's installed, and renders the
+same bytes as DRF's JSONRenderer. It falls back to JSONRenderer for what
+orjson can't do the same way:
+
+- Indented output (the browsable API, "application/json; indent=4") and
+  the UNICODE_JSON/COMPACT_JSON settings other than their defaults.
+- Values orjson can't encode, like integers over 64 bits or keys that
+  aren't strings.
+
+Dates, times, lazy strings and the other types orjson doesn't encode like
+DRF go through DRF's JSONEncoder.default. Floats are encoded by orjson,
+which only differs from json in the exponent of very large or very small
+ones (1e+16 and 1e-05 are written 1e16 and 1e-5); the serializers of this
+API have no float fields and render decimals as strings.
+
+stream_json_list renders a list without building it in memory: it reads
+the queryset in chunks and sends each one as it's rendered.
+"""
+import itertools
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_CHUNK_SIZE = 500
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # The same escapes as JSONRenderer
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+
+
+def stream_json_list(request, queryset, serializer_class, chunk_size=None):
+    """
+    A StreamingHttpResponse with the serialized rows of the queryset, the
+    same bytes a Response would render. Returns None when the request
+    didn't negotiate compact JSON (XML, the browsable API, an indent):
+    the view should return a Response then.
+
+    Under ASGI, the rows are read with the async ORM: Django would read a
+    sync iterator whole before sending it.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    renderer = request.accepted_renderer
+    if not isinstance(renderer, JSONRenderer) or renderer.get_indent(request.accepted_media_type, {}) is not None:
+        return None
+
+    def render(rows):
+        # A list of a chunk, without its brackets
+        return renderer.render(serializer_class(rows, many=True).data)[1:-1]
+
+    def chunks():
+        yield b"["
+        separator = b""
+        rows = queryset.iterator(chunk_size=chunk_size)
+        while batch := list(itertools.islice(rows, chunk_size)):
+            yield separator + render(batch)
+            separator = b","
+        yield b"]"
+
+    async def achunks():
+        yield b"["
+        separator = b""
+        batch = []
+        async for row in queryset.aiterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield separator + render(batch)
+                separator, batch = b",", []
+        if batch:
+            yield separator + render(batch)
+        yield b"]"
+
+    content = achunks() if isinstance(request._request, ASGIRequest) else chunks()
+    content_type = renderer.media_type
+    if renderer.charset:
+        content_type += f"; charset={renderer.charset}"
+    return StreamingHttpResponse(content, content_type=content_type)
@@ -0,0 +1,149 @@
+"""
+Daily sales reports, served from rollup tables instead of the orders.
+
+Each order adds to the rollups of its date (models.DailySales and the
+Daily*Sales tables per menu item, category and delivery crew member):
+
+- Checkout adds the order and its items, in the transaction that creates
+  them (checkout.place_order).
+- Assigning an order to a delivery crew member, or changing its status,
+  moves it between the crew rollups (signals.py).
+- Deleting an order takes it out again (signals.py).
+
+Orders written without going through these, like the ones of seed_data,
+aren't in the rollups until `manage.py backfill_reports` rebuilds them
+from the orders.
+
+Writing a Rollup costs two queries per table whatever the number of rows:
+an insert of the missing rows and one UPDATE that adds the deltas with a
+CASE, with a WHEN per distinct delta. Concurrent checkouts of the same day only add to the same rows.
+"""
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from . import models
+
+# The rollup tables and the fields of their keys
+TABLES = {
+    models.DailySales: ("date",),
+    models.DailyMenuItemSales: ("date", "menuitem_id"),
+    models.DailyCategorySales: ("date", "category_id"),
+    models.DailyCrewSales: ("date", "delivery_crew_id"),
+}
+
+
+class Rollup:
+    """Deltas to add to the rollup tables, written by save()."""
+
+    def __init__(self):
+        # {model: {key: {counter: delta}}}
+        self.deltas = {model: defaultdict(lambda: defaultdict(int)) for model in TABLES}
+
+    def add_order(self, order, items, sign=1):
+        """The order and its items. Their menu items must be loaded."""
+        day = self.deltas[models.DailySales][(order.date,)]
+        day["orders"] += sign
+        day["revenue"] += sign * order.total
+        for item in items:
+            day["items"] += sign * item.quantity
+            for model, key in (
+                (models.DailyMenuItemSales, (order.date, item.menuitem_id)),
+                (models.DailyCategorySales, (order.date, item.menuitem.category_id)),
+            ):
+                row = self.deltas[model][key]
+                row["quantity"] += sign * item.quantity
+                row["revenue"] += sign * item.price
+        if order.delivery_crew_id:
+            self.add_delivery(order, order.delivery_crew_id, order.status, sign)
+
+    def add_delivery(self, order, delivery_crew_id, status, sign=1):
+        """The order, assigned to delivery_crew_id with this status."""
+        row = self.deltas[models.DailyCrewSales][(order.date, delivery_crew_id)]
+        row["orders"] += sign
+        row["delivered"] += sign * bool(status)
+        row["revenue"] += sign * order.total
+
+    def save(self):
+        for model, deltas in self.deltas.items():
+            rows = {key: counters for key, counters in deltas.items() if any(counters.values())}
+            if rows:
+                _add(model, TABLES[model], rows)
+
+
+def _condition(key_fields, keys):
+    """
+    A Q that matches the rows with these keys, with one IN per value of
+    the first fields: Q(date=..., menuitem_id__in=[...]) | ...
+    """
+    *first_fields, last_field = key_fields
+    groups = defaultdict(list)
+    for key in keys:
+        groups[key[:-1]].append(key[-1])
+    return reduce(or_, (
+        Q(**dict(zip(first_fields, first)), **{f"{last_field}__in": values})
+        for first, values in groups.items()
+    ))
+
+
+def _add(model, key_fields, rows):
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in rows], ignore_conflicts=True
+    )
+    updates = {}
+    for counter in {counter for deltas in rows.values() for counter in deltas}:
+        # Most rows get the same few deltas: one WHEN per delta
+        keys_by_delta = defaultdict(list)
+        for key, deltas in rows.items():
+            if deltas[counter]:
+                keys_by_delta[deltas[counter]].append(key)
+        updates[counter] = F(counter) + Case(
+            *[When(_condition(key_fields, keys), then=Value(delta)) for delta, keys in keys_by_delta.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(counter),
+        )
+    model.objects.filter(_condition(key_fields, rows)).update(**updates)
+
+
+def aggregate(date_from, date_to):
+    """
+    The rollup rows of the days between date_from and date_to (both
+    included), computed from the orders: {model: [row kwargs]}.
+    """
+    orders = models.Order.objects.filter(date__range=(date_from, date_to)).order_by()
+    items = models.OrderItem.objects.filter(order__date__range=(date_from, date_to)).order_by()
+
+    days = {
+        row["date"]: row
+        for row in orders.values("date").annotate(orders=Count("id"), revenue=Sum("total"))
+    }
+    for row in items.values("order__date").annotate(items=Sum("quantity")):
+        days[row["order__date"]]["items"] = row["items"]
+
+    return {
+        models.DailySales: list(days.values()),
+        models.DailyMenuItemSales: _renamed(
+            items.values("order__date", "menuitem_id").annotate(quantity=Sum("quantity"), revenue=Sum("price")),
+            order__date="date",
+        ),
+        models.DailyCategorySales: _renamed(
+            items.values("order__date", "menuitem__category_id").annotate(quantity=Sum("quantity"), revenue=Sum("price")),
+            order__date="date", menuitem__category_id="category_id",
+        ),
+        models.DailyCrewSales: list(
+            orders.filter(delivery_crew__isnull=False)
+            .values("date", "delivery_crew_id")
+            .annotate(orders=Count("id"), delivered=Count("id", filter=Q(status=True)), revenue=Sum("total"))
+        ),
+    }
+
+
+def _renamed(rows, **names):
+    return [{names.get(name, name): value for name, value in row.items()} for row in rows]
+
+
+def replace(date_from, date_to, rows, batch_size=None):
+    """Replaces the rollups of the days between date_from and date_to with rows."""
+    for model, model_rows in rows.items():
+        model.objects.filter(date__range=(date_from, date_to)).delete()
+        model.objects.bulk_create([model(**row) for row in model_rows], batch_size=batch_size)
@@ -0,0 +1,103 @@
+"""
+Role resolution for permission checks and views.
+
+A user's group names are looked up once per request (memoized on the user
+object, which DRF keeps for the whole request) and once across requests
+(memoized in Django's cache). Django's cache belongs to each process, so
+the entries are keyed by a version of the user's groups kept in the store
+shared by the workers (throttling.get_store): signals.py bumps it whenever
+the user's groups change, which makes the old entries unreachable in
+every process. Only the group ids are read from the memberships: their
+names come from groups.registry.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from . import groups
+from .throttling import get_store
+
+# Group names as they're stored in the database
+MANAGER = "Manager"
+DELIVERY_CREW = "Delivery crew"
+
+# The group of each slug in the /groups/<slug>/ URLs
+GROUP_SLUGS = {
+    "manager": MANAGER,
+    "delivery-crew": DELIVERY_CREW,
+}
+
+# Roles that don't come from a group
+ADMIN = "admin"
+CUSTOMER = "customer"
+
+CACHE_TIMEOUT = 60 * 5
+
+
+def _group_ids(user_id):
+    return User.groups.through.objects.filter(user_id=user_id).values_list("group_id", flat=True)
+
+
+def _version_key(user_id):
+    return f"littlelemon:groups-version:{user_id}"
+
+
+def _cache_key(user_id, version):
+    return f"littlelemon:groups:{user_id}:{version}"
+
+
+def get_group_names(user):
+    """Returns a frozenset with the names of the groups the user belongs to."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    group_names = getattr(user, "_group_names", None)
+    if group_names is not None:
+        return group_names
+
+    key = _cache_key(user.pk, int(get_store().get(_version_key(user.pk)) or 0))
+    group_names = cache.get(key)
+    if group_names is None:
+        group_names = groups.registry.names(list(_group_ids(user.pk)))
+        cache.set(key, group_names, CACHE_TIMEOUT)
+
+    user._group_names = group_names
+    return group_names
+
+
+def get_roles(user):
+    """
+    Returns a frozenset with the roles of the user: "admin" for staff,
+    "Manager" and "Delivery crew" for the members of those groups, and
+    "customer" for authenticated users without a group that aren't staff.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    group_names = get_group_names(user)
+    roles = set(group_names & {MANAGER, DELIVERY_CREW})
+    if user.is_staff:
+        roles.add(ADMIN)
+    elif not group_names:
+        roles.add(CUSTOMER)
+    return frozenset(roles)
+
+
+def is_admin_or_manager(user):
+    roles = get_roles(user)
+    return ADMIN in roles or MANAGER in roles
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def is_customer(user):
+    return CUSTOMER in get_roles(user)
+
+
+def invalidate(user_ids):
+    """Makes the cached group names of the given users stale in every process."""
+    pipeline = get_store().pipeline()
+    for user_id in user_ids:
+        # The version outlives the entries cached under the previous one
+        pipeline.incr(_version_key(user_id)).expire(_version_key(user_id), 2 * CACHE_TIMEOUT)
+    pipeline.execute()
@@ -0,0 +1,169 @@
+"""
+Search backends for the menu items.
+
+Both backends keep an inverted index of the menu item titles that is
+updated from signals.py on every write, and match each search term as a
+word prefix ("pas" finds "Lemon pasta"). Results are ranked unless the
+request asks for an explicit ordering.
+
+- SQLiteFTS5Backend: an FTS5 virtual table, ranked with bm25.
+- NgramBackend: the MenuItemNgram table of word prefixes (edge n-grams),
+  portable to any database.
+
+The backend is picked with the MENU_SEARCH_BACKEND setting ("fts5",
+"ngram" or "auto", the default, which uses FTS5 when it's available).
+"""
+import re
+from functools import lru_cache
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, FloatField, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from rest_framework.filters import BaseFilterBackend
+from . import models
+
+FTS_TABLE = "littlelemonapi_menuitem_fts"
+
+
+def search_terms(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def title_ngrams(title):
+    """
+    The edge n-grams of every word of the title: "pasta" is indexed as
+    "p", "pa", "pas", "past" and "pasta". Longer words are cut at
+    models.NGRAM_MAX_LENGTH characters.
+    """
+    ngrams = set()
+    for word in search_terms(title):
+        word = word[:models.NGRAM_MAX_LENGTH]
+        ngrams.update(word[:length] for length in range(1, len(word) + 1))
+    return ngrams
+
+
+class NgramBackend:
+    name = "ngram"
+
+    def index(self, menu_items):
+        menu_items = list(menu_items)
+        models.MenuItemNgram.objects.filter(menuitem__in=menu_items).delete()
+        models.MenuItemNgram.objects.bulk_create([
+            models.MenuItemNgram(menuitem_id=menu_item.pk, ngram=ngram)
+            for menu_item in menu_items
+            for ngram in title_ngrams(menu_item.title)
+        ], batch_size=1000)
+
+    def remove(self, menuitem_ids):
+        # The n-grams are deleted in cascade with their menu item
+        pass
+
+    def clear(self):
+        models.MenuItemNgram.objects.all().delete()
+
+    def search(self, queryset, terms):
+        ngrams = {term[:models.NGRAM_MAX_LENGTH] for term in terms}
+        candidates = models.MenuItemNgram.objects.filter(ngram__in=ngrams).values("menuitem")
+        if len(ngrams) > 1:
+            candidates = candidates.annotate(hits=Count("ngram")).filter(hits=len(ngrams)).values("menuitem")
+        queryset = queryset.filter(id__in=candidates)
+
+        # Terms longer than the n-grams only matched their beginning
+        for term in terms:
+            if len(term) > models.NGRAM_MAX_LENGTH:
+                queryset = queryset.filter(title__iregex=r"(^|\W)" + re.escape(term))
+
+        # Titles that start with the first term go first, then shorter titles
+        return queryset.annotate(
+            search_rank=Case(
+                When(title__istartswith=terms[0], then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ) * 1000 + Length("title")
+        )
+
+
+class SQLiteFTS5Backend:
+    name = "fts5"
+
+    @staticmethod
+    def is_available():
+        if connection.vendor != "sqlite":
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            return cursor.fetchone() is not None
+
+    def index(self, menu_items):
+        menu_items = list(menu_items)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(menu_item.pk,) for menu_item in menu_items],
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title) VALUES (%s, %s)",
+                [(menu_item.pk, menu_item.title) for menu_item in menu_items],
+            )
+
+    def remove(self, menuitem_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(menuitem_id,) for menuitem_id in menuitem_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    def search(self, queryset, terms):
+        match = " ".join(f'"{term}"*' for term in terms)
+        opts = queryset.model._meta
+        id_column = f"{connection.ops.quote_name(opts.db_table)}.{connection.ops.quote_name(opts.pk.column)}"
+        # The filter runs the MATCH once; the rank is then looked up by
+        # rowid for the matching menu items only
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {id_column}",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    choice = getattr(settings, "MENU_SEARCH_BACKEND", "auto")
+    if choice == "fts5" or (choice == "auto" and SQLiteFTS5Backend.is_available()):
+        return SQLiteFTS5Backend()
+    return NgramBackend()
+
+
+async def aget_backend():
+    """get_backend for async views: only the first call queries the database."""
+    if get_backend.cache_info().currsize:
+        return get_backend()
+    return await sync_to_async(get_backend)()
+
+
+class MenuItemSearchFilter(BaseFilterBackend):
+    """
+    Replaces SearchFilter on MenuItemsView: filters by the `search` query
+    parameter through the search backend and, unless an ordering was
+    requested, sorts the results by rank.
+    """
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        terms = search_terms(request.query_params.get(self.search_param, ""))
+        if not terms:
+            return queryset
+        queryset = get_backend().search(queryset, terms)
+        if not request.query_params.get("ordering"):
+            queryset = queryset.order_by("search_rank", "id")
+        return queryset
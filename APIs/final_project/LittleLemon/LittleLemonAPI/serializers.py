@@ -1,7 +1,9 @@
+import datetime
 from django.contrib.auth.models import User
+from django.db import connection, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers, exceptions
-from . import models, permissions
+from . import models, permissions, mixins, carts, memberships
 
 
 class CategorySerializer (serializers.ModelSerializer):
@@ -47,17 +49,22 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
-class AddUserToGroupSerializer(serializers.Serializer):
+class GroupUserSerializer(serializers.Serializer):
     id = serializers.IntegerField(required=False)
     username = serializers.CharField(required=False)
     # We must either validate by id or by username
     def validate(self, data):
+        if not data.get("id") and not data.get("username"):
+            raise serializers.ValidationError("Either 'id' or 'username' must be provided")
+        return data
+
+
+class AddUserToGroupSerializer(GroupUserSerializer):
+    def validate(self, data):
+        data = super().validate(data)
         id = data.get("id")
         username = data.get("username")
 
-        if not id and not username:
-            raise serializers.ValidationError("Either 'id' or 'username' must be provided")
-        
         # Check that the id and username belong to the same person
         if id and username:
             user_by_id = get_object_or_404(User,pk=id)
@@ -68,6 +75,30 @@ class AddUserToGroupSerializer(serializers.Serializer):
         return data
 
 
+class GroupMembershipSerializer(serializers.Serializer):
+    """Users to add to and remove from a group, by id or username."""
+    add = GroupUserSerializer(many=True, required=False, max_length=1000)
+    remove = GroupUserSerializer(many=True, required=False, max_length=1000)
+
+    def validate(self, data):
+        add = data.get("add", [])
+        remove = data.get("remove", [])
+        if not add and not remove:
+            raise serializers.ValidationError("Either 'add' or 'remove' must be provided")
+
+        # A single query for all the users, kept as {id: username}
+        found = memberships.find_users(add + remove)
+        missing = [entry.get("id") or entry["username"] for entry, user in zip(add + remove, found) if user is None]
+        if missing:
+            raise serializers.ValidationError(f"Users {missing} do not exist, or their id and username don't match.")
+        data["add"] = dict(found[:len(add)])
+        data["remove"] = dict(found[len(add):])
+        both = sorted(data["add"].keys() & data["remove"].keys())
+        if both:
+            raise serializers.ValidationError(f"Users with ids {both} can't be both added and removed.")
+        return data
+
+
 class MenuItemForCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.MenuItem
@@ -78,6 +109,9 @@ class MenuItemForCartSerializer(serializers.ModelSerializer):
         ]
 
 
+PRICE_OUT_OF_RANGE = f"This quantity costs {carts.PRICE_LIMIT} or more."
+
+
 class CartSerializer(serializers.ModelSerializer):
     menuitem = MenuItemForCartSerializer(read_only=True)
     menuitem_id = serializers.IntegerField(write_only=True)
@@ -93,50 +127,105 @@ class CartSerializer(serializers.ModelSerializer):
             "price",
         ]
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # A cart row keeps its menu item: PUT only needs the quantity
+            fields["menuitem_id"].required = False
+        return fields
 
+    # Each write is one statement, see carts.py
     def create(self, validated_data):
         user = self.context["request"].user
 
         # Check if the user is authenticated
         if not user.is_authenticated:
             raise exceptions.PermissionDenied("User must be authenticated")
-        
-
-        
-        menuitem_id = validated_data.get("menuitem_id")
-
-        # Check if a cart item with the same menuitem_id already exists for the user
-        existing_cart_item = models.Cart.objects.filter(user=user, menuitem_id=menuitem_id).first()
 
-        if existing_cart_item:
+        try:
+            cart = carts.add_item(user, validated_data["menuitem_id"], validated_data["quantity"])
+        except carts.AlreadyInCart:
             raise exceptions.ValidationError("This menu item is already in the cart.")
-        
-
-        # Get the menuitem and pass it to the cart
-        menuitem_object = get_object_or_404(models.MenuItem, pk=validated_data.get("menuitem_id"))
-        
-        quantity = validated_data.get("quantity")
-        unit_price = menuitem_object.price
-        price = quantity*unit_price
-        
-        
-        validated_data["user"] = user
-        validated_data["price"] = price
-        cart = models.Cart.objects.create(**validated_data)
-
+        except carts.PriceOutOfRange:
+            raise exceptions.ValidationError(PRICE_OUT_OF_RANGE)
+        if cart is None:
+            raise exceptions.NotFound("No MenuItem matches the given query.")
         return cart
     
     def update(self, instance, validated_data):
-        new_quantity = validated_data.get("quantity", instance.quantity)
-        menuitem_object = get_object_or_404(models.MenuItem, pk=instance.menuitem_id)
-        unit_price = menuitem_object.price
-        new_price = new_quantity * unit_price
+        try:
+            cart = carts.set_quantity(instance, validated_data.get("quantity", instance.quantity))
+        except carts.PriceOutOfRange:
+            raise exceptions.ValidationError(PRICE_OUT_OF_RANGE)
+        if cart is None:
+            raise exceptions.NotFound("No Cart matches the given query.")
+        return cart
 
-        instance.quantity = new_quantity
-        instance.price = new_price
-        instance.save()
 
-        return instance
+class BulkCartListSerializer(serializers.ListSerializer):
+    def validate(self, data):
+        menuitem_ids = [item["menuitem_id"] for item in data]
+        if len(set(menuitem_ids)) != len(menuitem_ids):
+            raise serializers.ValidationError("Each menu item can only appear once.")
+
+        # A single query for all the menu items, kept for create()
+        self.menu_items = models.MenuItem.objects.in_bulk(menuitem_ids)
+        missing_ids = sorted(set(menuitem_ids) - set(self.menu_items))
+        if missing_ids:
+            raise serializers.ValidationError(f"Menu items with ids {missing_ids} do not exist.")
+
+        # The price must fit Cart.price
+        too_expensive = [
+            item["menuitem_id"] for item in data
+            if item["quantity"] * self.menu_items[item["menuitem_id"]].price >= carts.PRICE_LIMIT
+        ]
+        if too_expensive:
+            raise serializers.ValidationError(
+                f"The quantities of menu items with ids {too_expensive} cost {carts.PRICE_LIMIT} or more."
+            )
+        return data
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        cart_items = [
+            models.Cart(
+                user=user,
+                menuitem_id=item["menuitem_id"],
+                quantity=item["quantity"],
+                price=item["quantity"] * self.menu_items[item["menuitem_id"]].price,
+            )
+            for item in validated_data
+        ]
+        # Items already in the cart get the new quantity and price
+        if connection.features.supports_update_conflicts_with_target:
+            return models.Cart.objects.bulk_create(
+                cart_items,
+                update_conflicts=True,
+                unique_fields=["menuitem", "user"],
+                update_fields=["quantity", "price"],
+            )
+
+        # Databases that can't name the conflicting columns (MySQL, MariaDB)
+        # update the rows that exist and insert the others
+        with transaction.atomic():
+            existing = dict(
+                models.Cart.objects.select_for_update()
+                .filter(user=user, menuitem_id__in=self.menu_items)
+                .values_list("menuitem_id", "id")
+            )
+            for cart_item in cart_items:
+                cart_item.pk = existing.get(cart_item.menuitem_id)
+            models.Cart.objects.bulk_update([item for item in cart_items if item.pk], ["quantity", "price"])
+            models.Cart.objects.bulk_create([item for item in cart_items if not item.pk])
+        return cart_items
+
+
+class BulkCartItemSerializer(serializers.Serializer):
+    menuitem_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=32767)
+
+    class Meta:
+        list_serializer_class = BulkCartListSerializer
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -170,7 +259,7 @@ class SingleOrderSerializerForCustomer(serializers.ModelSerializer):
 
 
 # For managers only editing delivery crew and status
-class SingleOrderSerializerForManager(serializers.ModelSerializer):
+class SingleOrderSerializerForManager(mixins.NestedOnReadMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True)
     user = UserSerializer(read_only=True)
     class Meta:
@@ -187,11 +276,7 @@ class SingleOrderSerializerForManager(serializers.ModelSerializer):
         read_only_fields = ["id","user","total","date",]
 
     # Change the reperesentation of delivery crew only in GET method
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if self.context["request"].method == "GET":
-            data["delivery_crew"] = UserSerializer(instance.delivery_crew).data
-        return data
+    nested_on_read = {"delivery_crew": UserSerializer}
 
 
 # For delivery crew only editing status
@@ -212,3 +297,53 @@ class SingleOrderSerializerForDeliveryCrew(serializers.ModelSerializer):
         read_only_fields = ["id","user","total","date","order_items"]
 
     
+
+
+class AssignOrdersSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(required=False, min_value=1)
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
+class ReportParamsSerializer(serializers.Serializer):
+    """The query parameters of the reports: the last 7 days by default."""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+
+    def validate(self, data):
+        data.setdefault("date_to", datetime.date.today())
+        data.setdefault("date_from", data["date_to"] - datetime.timedelta(days=6))
+        if data["date_from"] > data["date_to"]:
+            raise serializers.ValidationError("date_from must be before date_to")
+        return data
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.DailySales
+        fields = ["date", "orders", "items", "revenue"]
+
+
+class MenuItemSalesSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="menuitem_id")
+    title = serializers.CharField(source="menuitem__title")
+    quantity = serializers.IntegerField(source="total_quantity")
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, source="total_revenue")
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="category_id")
+    title = serializers.CharField(source="category__title")
+    quantity = serializers.IntegerField(source="total_quantity")
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, source="total_revenue")
+
+
+class CrewSalesSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="delivery_crew_id")
+    username = serializers.CharField(source="delivery_crew__username")
+    orders = serializers.IntegerField(source="total_orders")
+    delivered = serializers.IntegerField(source="total_delivered")
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, source="total_revenue")
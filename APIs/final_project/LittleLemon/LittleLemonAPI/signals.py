@@ -0,0 +1,143 @@
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from . import caching, events, groups, metrics, models, reports, roles, search, tokens
+
+
+def roles_changed(user_ids):
+    user_ids = list(user_ids)
+    roles.invalidate(user_ids)
+    # The access tokens carry the old roles
+    tokens.revoke_access(user_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # user.groups.add/remove/clear(...): the instance is the user
+        if action in ("post_add", "post_remove", "post_clear"):
+            instance.__dict__.pop("_group_names", None)
+            roles_changed([instance.pk])
+    elif action == "pre_clear":
+        # group.user_set.clear(): the members are only known before clearing
+        roles_changed(instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        roles_changed(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    # Renaming or deleting a group changes the roles of all its members
+    roles_changed(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def reload_groups(sender, **kwargs):
+    groups.registry.clear()
+    # Again once committed: other threads may have reloaded the old rows
+    transaction.on_commit(groups.registry.clear)
+
+
+@receiver(post_save, sender=User)
+def revoke_access_tokens(sender, instance, created=False, update_fields=None, **kwargs):
+    # Staff flags, deactivation or a new password; logging in only saves
+    # last_login
+    if created or (update_fields and set(update_fields) == {"last_login"}):
+        return
+    tokens.revoke_access([instance.pk])
+
+
+@receiver(post_save, sender=models.MenuItem)
+@receiver(post_delete, sender=models.MenuItem)
+@receiver(post_save, sender=models.Category)
+@receiver(post_delete, sender=models.Category)
+def bump_menu_version(sender, **kwargs):
+    caching.bump_version(caching.MENU)
+
+
+@receiver(post_save, sender=models.MenuItem)
+def index_menu_item(sender, instance, **kwargs):
+    search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=models.MenuItem)
+def unindex_menu_item(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+
+@receiver(pre_save, sender=models.MenuItem)
+def remember_price(sender, instance, raw=False, update_fields=None, **kwargs):
+    # New menu items aren't in any cart yet
+    if raw or instance._state.adding or (update_fields is not None and "price" not in update_fields):
+        return
+    previous = instance.__dict__.get("_loaded_price")
+    if previous is None:
+        # Not loaded from the database, or loaded without its price
+        previous = models.MenuItem.objects.filter(pk=instance.pk).values_list("price", flat=True).first()
+    instance._previous_price = previous
+
+
+@receiver(post_save, sender=models.MenuItem)
+def price_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    previous = instance.__dict__.pop("_previous_price", None)
+    if update_fields is None or "price" in update_fields:
+        instance._loaded_price = instance.price
+    if created or previous is None or previous == instance.price:
+        return
+    # The carts are repriced later, by carts.reprice_carts
+    models.PriceChange.objects.create(menuitem=instance)
+
+
+DELIVERY_FIELDS = {"delivery_crew", "delivery_crew_id", "status"}
+
+
+@receiver(pre_save, sender=models.Order)
+def remember_delivery(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Checkout adds new orders to the rollups itself, with their items
+    if raw or instance._state.adding or (update_fields is not None and not DELIVERY_FIELDS & set(update_fields)):
+        return
+    previous = instance.__dict__.get("_loaded_delivery")
+    if previous is None:
+        # Not loaded from the database, or loaded without these fields
+        previous = models.Order.objects.filter(pk=instance.pk).values_list("delivery_crew_id", "status").first()
+    instance._previous_delivery = previous
+
+
+@receiver(post_save, sender=models.Order)
+def delivery_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    previous = instance.__dict__.pop("_previous_delivery", None)
+    if update_fields is None or DELIVERY_FIELDS & set(update_fields):
+        instance._loaded_delivery = (instance.delivery_crew_id, instance.status)
+    if created or previous is None or previous == (instance.delivery_crew_id, instance.status):
+        return
+
+    # Move the order between the crew rollups
+    rollup = reports.Rollup()
+    delivery_crew_id, status = previous
+    if delivery_crew_id:
+        rollup.add_delivery(instance, delivery_crew_id, status, sign=-1)
+    if instance.delivery_crew_id:
+        rollup.add_delivery(instance, instance.delivery_crew_id, instance.status)
+    rollup.save()
+
+    events.publish_orders([instance])
+
+
+@receiver(pre_delete, sender=models.Order)
+def remove_from_rollups(sender, instance, **kwargs):
+    rollup = reports.Rollup()
+    rollup.add_order(instance, instance.order_items.select_related("menuitem"), sign=-1)
+    rollup.save()
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Sent again each time the thread reconnects
+    if metrics.time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.time_query)
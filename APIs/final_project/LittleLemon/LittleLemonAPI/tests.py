@@ -1,3 +1,1582 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.fields import SerializerMethodField
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from .management.commands import explain_list_endpoints
+from . import models, assignment, carts, checkout, events, exports, groups, metrics, mixins, pagination, permissions, projections, renderers, reports, roles, serializers, signals, throttling, tokens, search, views, urls
 
-# Create your tests here.
+
+# The rates of settings.py: the test run has its own, that the other tests don't reach
+PRODUCTION_RATES = mock.patch.dict(throttling.UserRateThrottle.THROTTLE_RATES, {"anon": "5/minute", "user": "10/minute"})
+
+# The tests keep the throttle counters in memory rather than in the file the
+# servers of this host share, with rates they don't reach
+TEST_THROTTLE_STORE = override_settings(THROTTLE_STORE="locmem://")
+TEST_RATES = mock.patch.dict(throttling.UserRateThrottle.THROTTLE_RATES, {"anon": "10000/minute", "user": "10000/minute"})
+
+
+def setUpModule():
+    TEST_THROTTLE_STORE.enable()
+    TEST_RATES.start()
+    throttling.get_store.cache_clear()
+
+
+def tearDownModule():
+    TEST_RATES.stop()
+    TEST_THROTTLE_STORE.disable()
+    throttling.get_store.cache_clear()
+
+
+def _incr_many(path, key, count):
+    store = throttling.SQLiteStore(path)
+    return [store.incr(key) for _ in range(count)]
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="customer1")
+        self.category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("1.50"), featured=False, category=self.category)
+            for i in range(200)
+        ])
+
+    def fill_cart(self, lines):
+        models.Cart.objects.filter(user=self.customer).delete()
+        models.Cart.objects.bulk_create([
+            models.Cart(user=self.customer, menuitem=menu_item, quantity=2, price=Decimal("3.00"))
+            for menu_item in self.menu_items[:lines]
+        ])
+
+    def checkout_query_count(self, lines):
+        self.fill_cart(lines)
+        with CaptureQueriesContext(connection) as queries:
+            order = checkout.place_order(self.customer)
+        self.assertEqual(order.order_items.count(), lines)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        counts = {lines: self.checkout_query_count(lines) for lines in (1, 10, 50, 200)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_order_totals_and_cart_is_emptied(self):
+        self.fill_cart(3)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post("/api/orders/")
+        self.assertEqual(response.status_code, 201)
+        order = models.Order.objects.get(user=self.customer)
+        self.assertEqual(order.total, Decimal("9.00"))
+        self.assertFalse(models.Cart.objects.filter(user=self.customer).exists())
+
+    def test_charges_the_current_prices(self):
+        self.fill_cart(2)
+        # Changed without repricing the carts yet
+        models.MenuItem.objects.filter(pk=self.menu_items[0].pk).update(price=Decimal("2.25"))
+        order = checkout.place_order(self.customer)
+        self.assertEqual(order.total, Decimal("7.50"))
+        self.assertEqual(
+            sorted(order.order_items.values_list("price", flat=True)), [Decimal("3.00"), Decimal("4.50")]
+        )
+
+    def test_empty_cart_creates_no_order(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.post("/api/orders/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(models.Order.objects.exists())
+
+
+class RolesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager_group = Group.objects.create(name=roles.MANAGER)
+        self.crew_group = Group.objects.create(name=roles.DELIVERY_CREW)
+        self.user = User.objects.create_user(username="user1")
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def group_queries(self, queries):
+        return [q for q in queries.captured_queries if "auth_user_groups" in q["sql"]]
+
+    def test_roles_of_each_kind_of_user(self):
+        self.assertEqual(roles.get_roles(self.fresh_user()), {roles.CUSTOMER})
+        self.user.groups.add(self.crew_group)
+        self.assertEqual(roles.get_roles(self.fresh_user()), {roles.DELIVERY_CREW})
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(roles.get_roles(self.fresh_user()), {roles.ADMIN, roles.DELIVERY_CREW})
+
+    def test_groups_are_queried_once_across_requests(self):
+        self.user.groups.add(self.manager_group)
+        self.client.force_authenticate(self.fresh_user())
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/orders/")
+        self.assertEqual(len(self.group_queries(queries)), 1)
+
+        self.client.force_authenticate(self.fresh_user())
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/orders/")
+        self.assertEqual(len(self.group_queries(queries)), 0)
+
+    def test_membership_changes_invalidate_the_cache(self):
+        self.assertTrue(roles.is_customer(self.fresh_user()))
+        self.manager_group.user_set.add(self.user)
+        self.assertTrue(roles.is_admin_or_manager(self.fresh_user()))
+        self.user.groups.remove(self.manager_group)
+        self.assertTrue(roles.is_customer(self.fresh_user()))
+        self.user.groups.add(self.crew_group)
+        self.crew_group.user_set.clear()
+        self.assertTrue(roles.is_customer(self.fresh_user()))
+
+    def test_invalidation_reaches_every_process(self):
+        self.assertTrue(roles.is_customer(self.fresh_user()))
+        # Changed by another worker, with a cache of its own
+        with mock.patch.object(roles, "cache", LocMemCache("other-worker", {})):
+            self.user.groups.add(self.manager_group)
+        self.assertTrue(roles.is_admin_or_manager(self.fresh_user()))
+
+
+class OrderListQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("2.00"), featured=False, category=category)
+            for i in range(3)
+        ])
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.crew = User.objects.create_user(username="delivery1")
+        self.customers = [
+            User.objects.create_user(username=f"customer{i}") for i in range(20)
+        ]
+
+    def create_orders(self, count):
+        for customer in self.customers[:count]:
+            order = models.Order.objects.create(
+                user=customer, delivery_crew=self.crew, total=Decimal("6.00"), date=datetime.date.today()
+            )
+            models.OrderItem.objects.bulk_create([
+                models.OrderItem(order=order, menuitem=menu_item, quantity=1, price=menu_item.price)
+                for menu_item in self.menu_items
+            ])
+
+    def list_query_count(self, page_size):
+        self.client.force_authenticate(self.manager)
+        self.client.get("/api/orders/")  # warm the role cache
+        with mock.patch.object(PageNumberPagination, "page_size", page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/orders/?ordering=date")
+        self.assertEqual(len(response.data["results"]), min(page_size, models.Order.objects.count()))
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.create_orders(20)
+        counts = {page_size: self.list_query_count(page_size) for page_size in (1, 5, 20)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_single_order_nests_delivery_crew_for_managers(self):
+        self.create_orders(1)
+        order = models.Order.objects.get()
+        self.client.force_authenticate(self.manager)
+        response = self.client.get(f"/api/orders/{order.pk}")
+        self.assertEqual(response.data["delivery_crew"]["username"], "delivery1")
+        self.assertEqual(len(response.data["order_items"]), 3)
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="customer1"))
+        category = models.Category.objects.create(slug="main", title="Main")
+        # Only three different prices so that the id has to break the ties
+        models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal(i % 3 + 1), featured=False, category=category)
+            for i in range(23)
+        ])
+
+    def walk(self, url, link="next"):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item["id"] for item in response.data["results"])
+            url = response.data[link]
+        return ids, response
+
+    def test_keyset_pages_follow_the_ordering_without_gaps(self):
+        ids, last_page = self.walk("/api/menu-items/?pagination=keyset&ordering=-price")
+        expected = list(models.MenuItem.objects.order_by("-price", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+        # Walking back from the last page gives the same rows, page by page
+        back_ids = []
+        url = last_page.data["previous"]
+        while url:
+            response = self.client.get(url)
+            back_ids = [item["id"] for item in response.data["results"]] + back_ids
+            url = response.data["previous"]
+        self.assertEqual(back_ids + [item["id"] for item in last_page.data["results"]], expected)
+
+    def test_deep_keyset_pages_cost_the_same_as_the_first(self):
+        first_page = self.client.get("/api/menu-items/?pagination=keyset&ordering=price")
+        url = first_page.data["next"]
+        for _ in range(3):
+            url = self.client.get(url).data["next"]
+        cache.clear()
+        with CaptureQueriesContext(connection) as first_queries:
+            self.client.get("/api/menu-items/?pagination=keyset&ordering=price")
+        cache.clear()
+        with CaptureQueriesContext(connection) as deep_queries:
+            self.client.get(url)
+        self.assertEqual(len(first_queries), len(deep_queries))
+        self.assertFalse(any("COUNT(" in q["sql"] for q in deep_queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/menu-items/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_estimated_count_keeps_page_numbers(self):
+        ids, last_page = self.walk("/api/menu-items/?count=estimate")
+        self.assertEqual(sorted(ids), sorted(models.MenuItem.objects.values_list("id", flat=True)))
+        self.assertEqual(last_page.data["count"], 23)
+        self.assertTrue(last_page.data["count_is_estimate"])
+
+
+class BulkCartTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="customer1")
+        self.client.force_authenticate(self.customer)
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("2.50"), featured=False, category=category)
+            for i in range(15)
+        ])
+
+    def post_items(self, items):
+        return self.client.post("/api/cart/menu-items/bulk", items, format="json")
+
+    def test_adds_and_updates_items_in_one_request(self):
+        models.Cart.objects.create(user=self.customer, menuitem=self.menu_items[0], quantity=1, price=Decimal("2.50"))
+        items = [{"menuitem_id": menu_item.id, "quantity": 2} for menu_item in self.menu_items]
+        self.client.get("/api/cart/menu-items/")  # warm the role cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_items(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 15)
+        self.assertTrue(all(item["quantity"] == 2 and item["price"] == "5.00" for item in response.data))
+        self.assertEqual(models.Cart.objects.filter(user=self.customer).count(), 15)
+
+        with CaptureQueriesContext(connection) as single_item_queries:
+            self.post_items(items[:1])
+        self.assertEqual(len(queries), len(single_item_queries))
+
+    def test_updates_without_naming_the_conflict_target(self):
+        models.Cart.objects.create(user=self.customer, menuitem=self.menu_items[0], quantity=1, price=Decimal("2.50"))
+        items = [{"menuitem_id": menu_item.id, "quantity": 3} for menu_item in self.menu_items[:2]]
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False):
+            response = self.post_items(items)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(models.Cart.objects.filter(user=self.customer).values_list("quantity", "price")),
+            [(3, Decimal("7.50"))] * 2
+        )
+
+    def test_rejects_prices_that_do_not_fit(self):
+        expensive = self.menu_items[0]
+        expensive.price = Decimal("999.99")
+        expensive.save()
+        response = self.post_items([{"menuitem_id": expensive.id, "quantity": 11}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Cart.objects.exists())
+        self.assertEqual(self.post_items([{"menuitem_id": expensive.id, "quantity": 10}]).status_code, 200)
+
+    def test_rejects_missing_and_repeated_menu_items(self):
+        response = self.post_items([{"menuitem_id": 999, "quantity": 1}])
+        self.assertEqual(response.status_code, 400)
+        menuitem_id = self.menu_items[0].id
+        response = self.post_items([{"menuitem_id": menuitem_id, "quantity": 1}] * 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Cart.objects.exists())
+
+
+class CartWriteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="customer1")
+        self.client.force_authenticate(self.customer)
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_item = models.MenuItem.objects.create(title="Dish", price=Decimal("2.50"), featured=False, category=category)
+
+    def cart_queries(self, queries):
+        return [q["sql"] for q in queries.captured_queries if "littlelemonapi_cart" in q["sql"].lower()]
+
+    def test_add_is_one_statement_priced_by_the_database(self):
+        self.client.get("/api/cart/menu-items/")  # warm the role cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/cart/menu-items/", {"menuitem_id": self.menu_item.pk, "quantity": 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["price"], "7.50")
+        self.assertEqual(response.data["menuitem"], {"id": self.menu_item.pk, "title": "Dish", "price": "2.50"})
+        self.assertEqual(len(self.cart_queries(queries)), 1)
+        self.assertEqual(models.Cart.objects.get().price, Decimal("7.50"))
+
+    def test_duplicates_and_missing_menu_items(self):
+        data = {"menuitem_id": self.menu_item.pk, "quantity": 1}
+        self.assertEqual(self.client.post("/api/cart/menu-items/", data).status_code, 201)
+        response = self.client.post("/api/cart/menu-items/", data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, ["This menu item is already in the cart."])
+        response = self.client.post("/api/cart/menu-items/", {"menuitem_id": 999, "quantity": 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_reprices_at_the_current_price(self):
+        cart_item = models.Cart.objects.create(user=self.customer, menuitem=self.menu_item, quantity=1, price=Decimal("2.50"))
+        models.MenuItem.objects.filter(pk=self.menu_item.pk).update(price=Decimal("3.10"))
+        self.client.get("/api/cart/menu-items/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f"/api/cart/menu-items/{cart_item.pk}", {"quantity": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["price"], "9.30")
+        self.assertEqual(response.data["menuitem"]["price"], "3.10")
+        # The lookup of the row, then the update
+        self.assertEqual(len(self.cart_queries(queries)), 2)
+        cart_item.refresh_from_db()
+        self.assertEqual((cart_item.quantity, cart_item.price), (3, Decimal("9.30")))
+
+    def test_put_changes_only_the_quantity(self):
+        cart_item = models.Cart.objects.create(user=self.customer, menuitem=self.menu_item, quantity=1, price=Decimal("2.50"))
+        url = f"/api/cart/menu-items/{cart_item.pk}"
+        response = self.client.put(url, {"quantity": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["price"], "5.00")
+        # The menu item of the row can't change, the policy refuses it
+        response = self.client.put(url, {"menuitem_id": self.menu_item.pk, "quantity": 4})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data["detail"], "You can't change menuitem_id.")
+        cart_item.refresh_from_db()
+        self.assertEqual(cart_item.quantity, 2)
+
+    def test_rejects_prices_that_do_not_fit(self):
+        for returns_rows in (True, False):
+            with self.subTest(returns_rows=returns_rows), mock.patch.object(carts, "_returns_rows", return_value=returns_rows):
+                models.Cart.objects.all().delete()
+                response = self.client.post("/api/cart/menu-items/", {"menuitem_id": self.menu_item.pk, "quantity": 4000})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(models.Cart.objects.exists())
+
+                response = self.client.post("/api/cart/menu-items/", {"menuitem_id": self.menu_item.pk, "quantity": 3999})
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data["price"], "9997.50")
+                url = f"/api/cart/menu-items/{response.data['id']}"
+                self.assertEqual(self.client.patch(url, {"quantity": 4000}).status_code, 400)
+                self.assertEqual(models.Cart.objects.get().quantity, 3999)
+
+
+class CartRepricingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("2.00"), featured=False, category=category)
+            for i in range(3)
+        ])
+        customers = User.objects.bulk_create([User(username=f"customer{i}") for i in range(5)])
+        models.Cart.objects.bulk_create([
+            models.Cart(user=customer, menuitem=menu_item, quantity=i + 1, price=Decimal("2.00") * (i + 1))
+            for i, customer in enumerate(customers)
+            for menu_item in self.menu_items
+        ])
+
+    def prices(self, menu_item):
+        return sorted(models.Cart.objects.filter(menuitem=menu_item).values_list("quantity", "price"))
+
+    def test_price_changes_are_repriced_off_the_request(self):
+        self.client.force_authenticate(self.manager)
+        url = f"/api/menu-items/{self.menu_items[0].pk}"
+        self.assertEqual(self.client.patch(url, {"price": "3.00"}).status_code, 200)
+        self.assertEqual(self.client.patch(url, {"price": "2.75"}).status_code, 200)
+        self.assertEqual(self.client.patch(url, {"title": "Renamed"}).status_code, 200)
+        # The request only records the change
+        self.assertEqual(self.prices(self.menu_items[0])[-1], (5, Decimal("10.00")))
+        self.assertEqual(models.PriceChange.objects.count(), 2)
+
+        out = StringIO()
+        call_command("reprice_carts", stdout=out)
+        self.assertIn("2 price changes", out.getvalue())
+        self.assertEqual(self.prices(self.menu_items[0]), [(q, Decimal("2.75") * q) for q in range(1, 6)])
+        self.assertEqual(self.prices(self.menu_items[1]), [(q, Decimal("2.00") * q) for q in range(1, 6)])
+        self.assertFalse(models.PriceChange.objects.exists())
+
+    def test_saves_compare_with_the_loaded_price(self):
+        menu_item = models.MenuItem.objects.get(pk=self.menu_items[0].pk)
+        with CaptureQueriesContext(connection) as queries:
+            menu_item.title = "Renamed"
+            menu_item.save(update_fields=["title"])
+            menu_item.price = Decimal("2.50")
+            menu_item.save()
+            menu_item.save()
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("SELECT")])
+        self.assertEqual(models.PriceChange.objects.count(), 1)
+
+    def test_one_update_per_changed_menu_item(self):
+        for price in ("1.00", "1.50"):
+            for menu_item in self.menu_items[:2]:
+                menu_item.price = Decimal(price)
+                menu_item.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(carts.reprice_batch(100), 4)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.prices(self.menu_items[1]), [(q, Decimal("1.50") * q) for q in range(1, 6)])
+        self.assertEqual(carts.reprice_batch(100), 0)
+
+
+class ConcurrentCartWriteTest(TransactionTestCase):
+    def test_concurrent_adds_insert_one_row(self):
+        customer = User.objects.create_user(username="customer1")
+        category = models.Category.objects.create(slug="main", title="Main")
+        menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("1.25"), featured=False, category=category)
+            for i in range(3)
+        ])
+        start = threading.Barrier(12)
+
+        def add(menu_item):
+            start.wait()
+            try:
+                return carts.add_item(customer, menu_item.pk, 2).price
+            except carts.AlreadyInCart:
+                return "already in the cart"
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(12) as pool:
+            results = list(pool.map(add, [menu_items[i % 3] for i in range(12)]))
+
+        self.assertEqual(results.count(Decimal("2.50")), 3)
+        self.assertEqual(results.count("already in the cart"), 9)
+        self.assertEqual(
+            sorted(models.Cart.objects.filter(user=customer).values_list("menuitem_id", flat=True)),
+            [menu_item.pk for menu_item in menu_items]
+        )
+
+
+class GroupMembershipTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        manager = User.objects.create_user(username="manager1")
+        manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.client.force_authenticate(manager)
+        self.crew_group = Group.objects.create(name=roles.DELIVERY_CREW)
+        self.users = User.objects.bulk_create([
+            User(username=f"rider{i:02}", email=f"rider{i}@example.com", first_name="Lemon" if i % 2 else "Lime")
+            for i in range(12)
+        ])
+        self.url = "/api/groups/delivery-crew/users/bulk"
+
+    def crew_ids(self):
+        return set(self.crew_group.user_set.values_list("id", flat=True))
+
+    def test_bulk_add_and_remove(self):
+        self.crew_group.user_set.add(self.users[0], self.users[1])
+        response = self.client.post(self.url, {
+            "add": [{"id": self.users[2].pk}, {"username": "rider03"}, {"id": self.users[0].pk}],
+            "remove": [{"username": "rider01"}, {"id": self.users[4].pk}],
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"added": ["rider02", "rider03"], "removed": ["rider01"]})
+        self.assertEqual(self.crew_ids(), {self.users[0].pk, self.users[2].pk, self.users[3].pk})
+
+    def test_query_count_does_not_depend_on_the_number_of_users(self):
+        counts = []
+        for users in (self.users[:2], self.users[2:]):
+            self.client.get("/api/groups/delivery-crew/users/")  # warm the role cache
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {"add": [{"id": user.pk} for user in users]}, format="json")
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(self.crew_ids(), {user.pk for user in self.users})
+
+    def test_changes_invalidate_the_roles(self):
+        user = self.users[0]
+        self.assertEqual(roles.get_roles(User.objects.get(pk=user.pk)), {roles.CUSTOMER})
+        self.client.post(self.url, {"add": [{"id": user.pk}]}, format="json")
+        self.assertEqual(roles.get_roles(User.objects.get(pk=user.pk)), {roles.DELIVERY_CREW})
+        self.client.post(self.url, {"remove": [{"id": user.pk}]}, format="json")
+        self.assertEqual(roles.get_roles(User.objects.get(pk=user.pk)), {roles.CUSTOMER})
+
+    def test_roles_are_invalidated_again_once_committed(self):
+        user = self.users[0]
+        with mock.patch.object(signals, "roles_changed") as roles_changed:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(self.url, {"add": [{"id": user.pk}]}, format="json")
+            roles_changed.assert_called_once_with([user.pk])
+            # Other requests may have cached the old groups until the commit
+            for callback in callbacks:
+                callback()
+            self.assertEqual(roles_changed.call_count, 2)
+
+    def test_rejects_unknown_and_mismatched_users(self):
+        for data in (
+            {"add": [{"id": self.users[0].pk}, {"username": "nobody"}]},
+            {"add": [{"id": self.users[0].pk, "username": "rider05"}]},
+            {"add": [{"id": self.users[0].pk}], "remove": [{"username": "rider00"}]},
+            {"add": [{}]},
+            {},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post(self.url, data, format="json").status_code, 400)
+        self.assertFalse(self.crew_ids())
+
+    def test_single_user_endpoints(self):
+        url = "/api/groups/delivery-crew/users/"
+        self.assertEqual(self.client.post(url, {"username": "rider00"}).status_code, 201)
+        self.assertEqual(self.client.post(url, {"username": "rider00"}).status_code, 200)
+        self.assertEqual(self.client.get(f"{url}{self.users[0].pk}").data["username"], "rider00")
+        self.assertEqual(self.client.delete(f"{url}{self.users[0].pk}").data["message"], "User rider00 removed from group Delivery crew")
+        self.assertIn("doesn't belong", self.client.get(f"{url}{self.users[0].pk}").data["message"])
+
+    def test_keyset_search_of_the_members(self):
+        self.crew_group.user_set.add(*self.users)
+        url = "/api/groups/delivery-crew/users/?pagination=keyset&ordering=-username&search=lemon"
+        usernames = []
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            while url:
+                page = self.client.get(url).data
+                usernames.extend(user["username"] for user in page["results"])
+                url = page["next"]
+        self.assertEqual(usernames, [f"rider{i:02}" for i in range(11, 0, -2)])
+
+
+class GroupRegistryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager_group = Group.objects.create(name=roles.MANAGER)
+        self.manager.groups.add(self.manager_group)
+        self.client.force_authenticate(self.manager)
+
+    def group_table_queries(self, queries):
+        return [q for q in queries.captured_queries if '"auth_group"' in q["sql"]]
+
+    def test_requests_do_not_query_the_groups(self):
+        self.client.get("/api/groups/manager/users/")
+        self.client.force_authenticate(User.objects.get(pk=self.manager.pk))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/groups/manager/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.group_table_queries(queries))
+        self.assertTrue(roles.is_admin_or_manager(User.objects.get(pk=self.manager.pk)))
+
+    def test_reloads_when_groups_change(self):
+        self.assertIsNone(groups.registry.by_slug("delivery-crew"))
+        crew_group = Group.objects.create(name=roles.DELIVERY_CREW)
+        self.assertEqual(groups.registry.by_slug("delivery-crew").pk, crew_group.pk)
+        crew_group.name = "Riders"
+        crew_group.save()
+        self.assertIsNone(groups.registry.by_slug("delivery-crew"))
+        self.assertEqual(self.client.get("/api/groups/delivery-crew/users/").status_code, 404)
+        self.assertEqual(self.client.get("/api/groups/nobody/users/").status_code, 404)
+
+    def test_picks_up_changes_made_by_other_processes(self):
+        groups.registry.load()
+        # Without signals, as another process's changes look to this one
+        Group.objects.bulk_create([Group(name=roles.DELIVERY_CREW)])
+        self.assertIsNotNone(groups.registry.by_slug("delivery-crew"))
+        crew_group = Group.objects.get(name=roles.DELIVERY_CREW)
+        self.assertEqual(groups.registry.names([self.manager_group.pk, crew_group.pk]), {roles.MANAGER, roles.DELIVERY_CREW})
+
+
+class MenuCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="customer1"))
+        self.category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_item = models.MenuItem.objects.create(
+            title="Pasta", price=Decimal("9.50"), featured=True, category=self.category
+        )
+
+    def test_cached_listing_skips_the_queryset(self):
+        url = "/api/menu-items/?ordering=price&category=Main"
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get("/api/menu-items/?category=Main&ordering=price&unrelated=1")
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(any("LittleLemonAPI_menuitem" in q["sql"] for q in queries.captured_queries))
+
+    def test_writes_invalidate_every_variant(self):
+        list_url, detail_url = "/api/menu-items/", f"/api/menu-items/{self.menu_item.pk}"
+        self.client.get(list_url)
+        self.client.get(detail_url)
+        self.client.get("/api/category/")
+
+        self.menu_item.title = "Lemon pasta"
+        self.menu_item.save()
+        self.assertEqual(self.client.get(list_url).data["results"][0]["title"], "Lemon pasta")
+        self.assertEqual(self.client.get(detail_url).data["title"], "Lemon pasta")
+
+        self.category.title = "Mains"
+        self.category.save()
+        self.assertEqual(self.client.get("/api/category/").data["results"][0]["title"], "Mains")
+
+    def test_ordering_is_part_of_the_key(self):
+        models.Category.objects.create(slug="drinks", title="Drinks")
+        self.assertEqual(self.client.get("/api/category/?ordering=-title").data["results"][0]["title"], "Main")
+        self.assertEqual(self.client.get("/api/category/?ordering=title").data["results"][0]["title"], "Drinks")
+        self.assertEqual(
+            views.CategoryView().get_cache_query_params(), {"page", "ordering", "search"}
+        )
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="customer1"))
+        self.category = models.Category.objects.create(slug="main", title="Main")
+        models.MenuItem.objects.create(title="Pasta", price=Decimal("9.50"), featured=True, category=self.category)
+
+    def test_matching_etag_returns_304_without_running_the_queryset(self):
+        response = self.client.get("/api/menu-items/")
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        cache.clear()  # make sure the response cache can't answer either
+        self.client.get("/api/category/")  # warm the role cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/menu-items/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(any("LittleLemonAPI_menuitem" in q["sql"] for q in queries.captured_queries))
+
+    def test_etag_changes_with_the_content_and_the_representation(self):
+        etag = self.client.get("/api/category/")["ETag"]
+        self.assertNotEqual(etag, self.client.get("/api/category/?format=xml")["ETag"])
+        self.assertNotEqual(etag, self.client.get("/api/category/?page=1")["ETag"])
+
+        self.category.title = "Mains"
+        self.category.save()
+        response = self.client.get("/api/category/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_changes_with_the_ordering(self):
+        models.Category.objects.create(slug="drinks", title="Drinks")
+        etag = self.client.get("/api/category/?ordering=title")["ETag"]
+        response = self.client.get("/api/category/?ordering=-title", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["title"], "Main")
+
+
+class MenuSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="customer1"))
+        category = models.Category.objects.create(slug="main", title="Main")
+        for title in ["Lemon pasta", "Pasta", "Espresso", "Grilled fish", "Pastachio cake"]:
+            models.MenuItem.objects.create(title=title, price=Decimal("5.00"), featured=False, category=category)
+
+    def search_titles(self, backend, text):
+        queryset = backend.search(models.MenuItem.objects.all(), search.search_terms(text))
+        return list(queryset.order_by("search_rank", "id").values_list("title", flat=True))
+
+    def test_backends_match_word_prefixes(self):
+        backends = [search.NgramBackend()]
+        if search.SQLiteFTS5Backend.is_available():
+            backends.append(search.SQLiteFTS5Backend())
+        for backend in backends:
+            backend.clear()
+            backend.index(models.MenuItem.objects.all())
+            with self.subTest(backend=backend.name):
+                self.assertEqual(set(self.search_titles(backend, "pas")), {"Lemon pasta", "Pasta", "Pastachio cake"})
+                self.assertEqual(self.search_titles(backend, "pasta lem"), ["Lemon pasta"])
+                self.assertEqual(self.search_titles(backend, "press"), [])
+
+    def test_index_follows_writes(self):
+        menu_item = models.MenuItem.objects.get(title="Espresso")
+        menu_item.title = "Double espresso"
+        menu_item.save()
+        backend = search.get_backend()
+        self.assertEqual(self.search_titles(backend, "doub"), ["Double espresso"])
+        menu_item.delete()
+        self.assertEqual(self.search_titles(backend, "doub"), [])
+
+    def test_search_endpoint_ranks_results(self):
+        response = self.client.get("/api/menu-items/?search=pasta")
+        self.assertEqual([item["title"] for item in response.data["results"]][0], "Pasta")
+        response = self.client.get("/api/menu-items/?search=pas&ordering=-price")
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+class QueryPlanTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_list_endpoints_dont_scan_tables(self):
+        reports = explain_list_endpoints.Command().explain()
+        self.assertTrue(reports)
+        for report in reports:
+            with self.subTest(role=report.role, path=report.path, params=report.params):
+                self.assertFalse(report.table_scans, "\n".join(
+                    [str(report), report.sql]
+                    + [f"Proposed index: {report.proposed_index(table)}" for table in report.table_scans]
+                ))
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username="customer1")
+        category = models.Category.objects.create(slug="main", title="Main")
+        menu_item = models.MenuItem.objects.create(title="Pasta", price=Decimal("5.00"), featured=False, category=category)
+        models.Cart.objects.create(user=self.customer, menuitem=menu_item, quantity=2, price=Decimal("10.00"))
+        self.order = models.Order.objects.create(user=self.customer, total=Decimal("10.00"), date=datetime.date.today())
+        models.OrderItem.objects.create(order=self.order, menuitem=menu_item, quantity=2, price=Decimal("10.00"))
+        self.reads = [
+            (views.CategoryView, "/api/category/", {}),
+            (views.SingleCategoryView, f"/api/category/{category.pk}", {"pk": category.pk}),
+            (views.MenuItemsView, "/api/menu-items/?search=pas", {}),
+            (views.SingleMenuItemView, f"/api/menu-items/{menu_item.pk}", {"pk": menu_item.pk}),
+            (views.CartView, "/api/cart/menu-items/", {}),
+            (views.OrdersView, "/api/orders/?ordering=-date", {}),
+            (views.SingleOrderView, f"/api/orders/{self.order.pk}", {"pk": self.order.pk}),
+            (views.SingleOrderView, "/api/orders/0", {"pk": 0}),
+        ]
+
+    def request(self, view, method, path, **kwargs):
+        request = getattr(APIRequestFactory(), method)(path)
+        force_authenticate(request, user=self.customer)
+        with mock.patch.object(APIView, "throttle_classes", []):
+            if asyncio.iscoroutinefunction(view):
+                return async_to_sync(view)(request, **kwargs).render()
+            return view(request, **kwargs).render()
+
+    def async_view_class(self, view_class):
+        return getattr(views, f"Async{view_class.__name__}")
+
+    def test_async_views_match_sync_views(self):
+        for view_class, path, kwargs in self.reads:
+            with self.subTest(path=path):
+                sync_view = view_class.as_view()
+                async_view = self.async_view_class(view_class).as_view()
+                self.assertFalse(asyncio.iscoroutinefunction(sync_view))
+                self.assertTrue(asyncio.iscoroutinefunction(async_view))
+                sync_response = self.request(sync_view, "get", path, **kwargs)
+                cache.clear()
+                async_response = self.request(async_view, "get", path, **kwargs)
+                self.assertEqual(async_response.status_code, sync_response.status_code)
+                self.assertEqual(async_response.content, sync_response.content)
+
+    def test_every_handler_of_the_async_views_is_async(self):
+        for view_class, _, _ in self.reads:
+            async_view_class = self.async_view_class(view_class)
+            for method in async_view_class.http_method_names:
+                if hasattr(async_view_class, method):
+                    with self.subTest(view=async_view_class.__name__, method=method):
+                        self.assertTrue(asyncio.iscoroutinefunction(getattr(async_view_class, method)))
+
+    def test_async_views_still_write(self):
+        view = views.AsyncCartView.as_view()
+        response = self.request(view, "delete", "/api/cart/menu-items/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(models.Cart.objects.exists())
+
+
+class SeedAndBenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            "seed_data", menu_items=30, customers=20, delivery_crew=3, orders=300, carts=5, batch_size=100,
+            stdout=StringIO()
+        )
+
+    def test_seeded_orders_are_consistent(self):
+        self.assertEqual(models.Order.objects.count(), 300)
+        self.assertFalse(
+            models.Order.objects.annotate(items_total=Sum("order_items__price")).exclude(total=F("items_total"))
+        )
+        self.assertEqual(User.objects.filter(groups__name=roles.DELIVERY_CREW).count(), 3)
+
+    def test_benchmark_covers_every_route(self):
+        out = StringIO()
+        call_command("bench_endpoints", iterations=1, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            {scenario["route"] for scenario in report["scenarios"]},
+            {str(pattern.pattern) for pattern in urls.urlpatterns}
+        )
+        for scenario in report["scenarios"]:
+            with self.subTest(method=scenario["method"], path=scenario["path"]):
+                self.assertTrue(all(status.startswith("2") for status in scenario["statuses"]), scenario)
+        self.assertEqual(report["rows"]["Order"], 300)
+
+    def test_renderer_benchmark(self):
+        out = StringIO()
+        call_command("bench_renderers", rows=20, iterations=1, stdout=out)
+        self.assertIn("FastJSONRenderer", out.getvalue())
+
+    def test_projection_benchmark(self):
+        out = StringIO()
+        call_command("bench_projections", rows=50, iterations=1, stdout=out)
+        self.assertIn("orders (manager)", out.getvalue())
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_store().flushdb()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username="customer1")
+        self.client.force_authenticate(self.customer)
+        category = models.Category.objects.create(slug="main", title="Main")
+        models.MenuItem.objects.create(title="Lemon pasta", price=Decimal("9.50"), featured=False, category=category)
+
+    def stats(self, route, method="GET"):
+        return metrics.registry.collect().get((route, method), metrics.RouteStats())
+
+    def test_requests_are_aggregated_per_route(self):
+        before = self.stats("api/menu-items/<int:pk>")
+        menu_item = models.MenuItem.objects.get()
+        self.client.get(f"/api/menu-items/{menu_item.pk}")
+        self.client.get("/api/menu-items/0")
+        after = self.stats("api/menu-items/<int:pk>")
+
+        self.assertEqual(after.statuses.get("200", 0), before.statuses.get("200", 0) + 1)
+        self.assertEqual(after.statuses.get("404", 0), before.statuses.get("404", 0) + 1)
+        self.assertEqual(sum(after.buckets), sum(before.buckets) + 2)
+        self.assertGreater(after.queries, before.queries)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn(
+            f'littlelemon_http_requests_total{{route="api/menu-items/<int:pk>",method="GET",status="200"}} '
+            f'{after.statuses["200"]}\n',
+            response.content.decode()
+        )
+
+    @PRODUCTION_RATES
+    def test_throttled_requests_are_counted(self):
+        before = self.stats("api/cart/menu-items/").throttled
+        statuses = [self.client.get("/api/cart/menu-items/").status_code for _ in range(11)]
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(self.stats("api/cart/menu-items/").throttled, before + 1)
+
+    def test_totals_of_every_process_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            self.client.get("/api/cart/menu-items/")
+            mine = self.stats("api/cart/menu-items/")
+            other = metrics.RouteStats()
+            other.statuses = {"200": 3}
+            other.buckets[0] = 3
+            other.queries = 6
+            with open(f"{directory}/1-other.json", "w") as file:
+                json.dump([["api/cart/menu-items/", "GET", other.as_dict()]], file)
+
+            total = self.stats("api/cart/menu-items/")
+        self.assertEqual(total.statuses["200"], mine.statuses["200"] + 3)
+        self.assertEqual(total.queries, mine.queries + 6)
+
+    def test_files_of_dead_processes_are_adopted(self):
+        process = multiprocessing.get_context("fork").Process(target=int)
+        process.start()
+        process.join()
+        other = metrics.RouteStats()
+        other.statuses = {"200": 3}
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            before = self.stats("api/cart/menu-items/").statuses.get("200", 0)
+            with open(f"{directory}/{process.pid}-dead.json", "w") as file:
+                json.dump([["api/cart/menu-items/", "GET", other.as_dict()]], file)
+
+            self.assertEqual(self.stats("api/cart/menu-items/").statuses["200"], before + 3)
+            self.assertFalse(os.path.exists(f"{directory}/{process.pid}-dead.json"))
+            # Counted once, by this process
+            self.assertEqual(self.stats("api/cart/menu-items/").statuses["200"], before + 3)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+
+    def test_no_token_only_under_debug(self):
+        with override_settings(METRICS_TOKEN=None, DEBUG=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with override_settings(METRICS_TOKEN=None, DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+@PRODUCTION_RATES
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_store().flushdb()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="customer1"))
+
+    def test_counters_are_atomic_across_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/throttle.sqlite3"
+            with ProcessPoolExecutor(4, mp_context=multiprocessing.get_context("fork")) as pool:
+                results = list(pool.map(_incr_many, [path] * 4, ["key"] * 4, [50] * 4))
+            self.assertEqual(throttling.SQLiteStore(path).get("key"), 200)
+        # Every increment saw a different total
+        self.assertEqual(sorted(value for result in results for value in result), list(range(1, 201)))
+
+    def test_pipelines_run_in_one_transaction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for store in (throttling.LocMemStore(), throttling.SQLiteStore(f"{directory}/throttle.sqlite3")):
+                with self.subTest(store=type(store).__name__):
+                    store.set("previous", 4)
+                    self.assertEqual(store.pipeline().incr("key").expire("key", 60).get("previous").execute(), [1, True, 4])
+                    with mock.patch.object(store, "get", side_effect=RuntimeError):
+                        with self.assertRaises(RuntimeError):
+                            store.pipeline().incr("key").expire("key", 60).get("previous").execute()
+                    # The increment went with the failed pipeline on SQLite
+                    self.assertEqual(store.get("key"), 1 if isinstance(store, throttling.SQLiteStore) else 2)
+
+    def test_refused_requests_do_not_use_up_the_rate(self):
+        timer = mock.patch.object(throttling.UserRateThrottle, "timer", return_value=600.0)
+        with timer:
+            statuses = [self.client.get("/api/cart/menu-items/").status_code for _ in range(15)]
+        self.assertEqual(statuses, [200] * 10 + [429] * 5)
+        self.assertEqual(throttling.get_store().get(f"throttle_user_{User.objects.get().pk}:10"), 10)
+
+    def test_previous_window_slides_out(self):
+        with mock.patch.object(throttling.UserRateThrottle, "timer", return_value=600.0):
+            for _ in range(10):
+                self.client.get("/api/cart/menu-items/")
+        # Three quarters into the next minute, a quarter of those 10 still count
+        with mock.patch.object(throttling.UserRateThrottle, "timer", return_value=705.0):
+            statuses = [self.client.get("/api/cart/menu-items/").status_code for _ in range(8)]
+            response = self.client.get("/api/cart/menu-items/")
+        self.assertEqual(statuses, [200] * 7 + [429])
+        # Room for one more once 80% of the previous minute has slid out, at 708 s
+        self.assertEqual(response["Retry-After"], "3")
+
+
+class AccessTokenTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_store().flushdb()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1", password="lemon-pass")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+
+    def login(self):
+        response = self.client.post("/api/token/access/", {"username": "manager1", "password": "lemon-pass"})
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def get_orders(self, access):
+        return self.client.get("/api/orders/", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_valid_tokens_do_not_query_users_or_groups(self):
+        access = self.login()["access"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_orders(access)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q["sql"] for q in queries.captured_queries if "auth" in q["sql"]])
+
+    def test_tampered_and_expired_tokens(self):
+        access = self.login()["access"]
+        self.assertEqual(self.get_orders(access[:-1] + ("A" if access[-1] != "A" else "B")).status_code, 401)
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            self.assertEqual(self.get_orders(access).status_code, 401)
+
+    def test_logout_revokes_both_tokens(self):
+        pair = self.login()
+        response = self.client.post(
+            "/api/token/revoke/", {"refresh": pair["refresh"]}, HTTP_AUTHORIZATION=f"Bearer {pair['access']}"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_orders(pair["access"]).status_code, 401)
+        self.assertEqual(self.client.post("/api/token/refresh/", {"refresh": pair["refresh"]}).status_code, 401)
+
+    def test_refresh_tokens_work_once(self):
+        pair = self.login()
+        response = self.client.post("/api/token/refresh/", {"refresh": pair["refresh"]})
+        self.assertEqual(response.status_code, 201)
+        # Reusing the old one ends every session of the user
+        self.assertEqual(self.client.post("/api/token/refresh/", {"refresh": pair["refresh"]}).status_code, 401)
+        self.assertEqual(self.client.post("/api/token/refresh/", {"refresh": response.data["refresh"]}).status_code, 401)
+        self.assertEqual(self.get_orders(response.data["access"]).status_code, 401)
+
+    def test_role_changes_revoke_access_tokens(self):
+        pair = self.login()
+        self.manager.groups.clear()
+        self.assertEqual(self.get_orders(pair["access"]).status_code, 401)
+        # The refreshed token carries the new roles: a customer's (empty) orders
+        access = self.client.post("/api/token/refresh/", {"refresh": pair["refresh"]}).data["access"]
+        self.assertEqual(tokens.verify(access)["grp"], [])
+        self.assertEqual(self.get_orders(access).status_code, 200)
+
+
+class FastJSONRendererTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        manager = User.objects.create_user(username="manager1")
+        manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.client.force_authenticate(manager)
+        crew = Group.objects.create(name=roles.DELIVERY_CREW)
+        for i in range(12):
+            User.objects.create_user(username=f"délivery{i} ", email=f"d{i}@example.com").groups.add(crew)
+
+    def assert_same_bytes(self, data, **kwargs):
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(data, **kwargs), JSONRenderer().render(data, **kwargs)
+        )
+
+    def test_same_bytes_as_json_renderer(self):
+        self.assert_same_bytes({
+            "price": Decimal("9.50"),
+            "date": datetime.date(2024, 1, 2),
+            "created": datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            "time": datetime.time(10, 30),
+            "lazy": gettext_lazy("Not found."),
+            "text": "Ελληνικά \u2028 \u2029 \"quoted\"",
+            "nested": [{"id": 1, "ok": True, "none": None}, (1, 2)],
+            "huge": 2 ** 70,
+            3: "int key",
+        })
+        self.assert_same_bytes([{"a": 1}], accepted_media_type="application/json; indent=4")
+        self.assert_same_bytes(None)
+
+    def test_group_members_are_streamed(self):
+        token = Token.objects.create(user=User.objects.get(username="manager1"))
+        users = User.objects.filter(groups__name=roles.DELIVERY_CREW)
+        expected = JSONRenderer().render(serializers.UserSerializer(users, many=True).data)
+        with mock.patch.object(renderers, "STREAM_CHUNK_SIZE", 5):
+            response = self.client.get("/api/groups/delivery-crew/users/")
+            self.assertTrue(response.streaming)
+            self.assertEqual(b"".join(response.streaming_content), expected)
+            self.assertEqual(response["Content-Type"], "application/json")
+
+            # Under ASGI, through the async ORM
+            async def read():
+                response = await AsyncClient().get(
+                    "/api/groups/delivery-crew/users/", headers={"authorization": f"Token {token.key}"}
+                )
+                return response.is_async, b"".join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(async_to_sync(read)(), (True, expected))
+
+        response = self.client.get("/api/groups/delivery-crew/users/", HTTP_ACCEPT="application/xml")
+        self.assertFalse(response.streaming)
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish, {i}", price=Decimal("2.00"), featured=False, category=category)
+            for i in range(2)
+        ])
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.customer = User.objects.create_user(username="customer1")
+        crew = User.objects.create_user(username="delivery1")
+        for day in range(1, 6):
+            order = models.Order.objects.create(
+                user=self.customer, delivery_crew=crew if day % 2 else None, status=day == 5,
+                total=Decimal("4.00"), date=datetime.date(2024, 1, day)
+            )
+            models.OrderItem.objects.bulk_create([
+                models.OrderItem(order=order, menuitem=menu_item, quantity=1, price=menu_item.price)
+                for menu_item in self.menu_items
+            ])
+        self.client.force_authenticate(self.manager)
+
+    def export(self, query):
+        response = self.client.get(f"/api/orders/export?{query}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_item(self):
+        with mock.patch.object(exports, "EXPORT_CHUNK_SIZE", 2):
+            content = self.export("format=csv")
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(list(rows[0]), exports.CSV_HEADER)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(
+            [row["order_id"] for row in rows],
+            [str(order.pk) for order in models.Order.objects.order_by("id") for _ in range(2)]
+        )
+        self.assertEqual(rows[0]["menuitem_title"], "Dish, 0")
+        self.assertEqual(rows[0]["delivery_crew_username"], "delivery1")
+        self.assertEqual(rows[2]["delivery_crew_username"], "")
+
+        # Under ASGI, chunk by chunk from the thread of the request
+        token = Token.objects.create(user=self.manager)
+        async def read():
+            response = await AsyncClient().get(
+                "/api/orders/export?format=csv", headers={"authorization": f"Token {token.key}"}
+            )
+            return response.is_async, b"".join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(async_to_sync(read)(), (True, content))
+
+    def test_ndjson_renders_like_the_orders_list(self):
+        orders = self.client.get("/api/orders/?ordering=date&pagination=keyset&page_size=10").data["results"]
+        lines = self.export("format=ndjson&ordering=date").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(json.dumps(orders)))
+
+    def test_filters(self):
+        lines = self.export("format=ndjson&date_from=2024-01-02&date_to=2024-01-04").splitlines()
+        self.assertEqual([json.loads(line)["date"] for line in lines], ["2024-01-02", "2024-01-03", "2024-01-04"])
+        lines = self.export("format=ndjson&status=1").splitlines()
+        self.assertEqual([json.loads(line)["date"] for line in lines], ["2024-01-05"])
+
+        response = self.client.get("/api/orders/export?format=csv&date_from=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_managers_only(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get("/api/orders/export?format=csv")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+    def test_does_not_place_orders(self):
+        models.Cart.objects.create(user=self.manager, menuitem=self.menu_items[0], quantity=1, price=Decimal("2.00"))
+        response = self.client.post("/api/orders/export?format=csv")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(models.Order.objects.count(), 5)
+
+
+class ReportsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        categories = [models.Category.objects.create(slug=f"c{i}", title=f"Category {i}") for i in range(2)]
+        self.menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Dish {i}", price=Decimal("1.50"), featured=False, category=categories[i % 2])
+            for i in range(3)
+        ])
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.crew = User.objects.create_user(username="delivery1")
+        self.crew.groups.add(Group.objects.create(name=roles.DELIVERY_CREW))
+        self.customers = [User.objects.create_user(username=f"customer{i}") for i in range(3)]
+
+    def checkout(self, customer, quantities):
+        models.Cart.objects.bulk_create([
+            models.Cart(user=customer, menuitem=menu_item, quantity=quantity, price=quantity * menu_item.price)
+            for menu_item, quantity in zip(self.menu_items, quantities)
+        ])
+        return checkout.place_order(customer)
+
+    def rollups(self):
+        rollups = {}
+        for model, keys in reports.TABLES.items():
+            fields = [field.attname for field in model._meta.concrete_fields if field.attname != "id"]
+            # Deleted orders leave rows at zero, the backfill doesn't write them
+            counters = {field: 0 for field in fields if field not in keys}
+            rollups[model] = sorted(model.objects.exclude(**counters).values_list(*fields))
+        return rollups
+
+    def test_incremental_rollups_match_the_backfill(self):
+        orders = [self.checkout(customer, quantities) for customer, quantities in zip(self.customers, [(1, 2, 3), (2,), (1, 1)])]
+        self.client.force_authenticate(self.manager)
+        self.client.patch(f"/api/orders/{orders[0].pk}", {"delivery_crew": self.crew.pk})
+        self.client.patch(f"/api/orders/{orders[1].pk}", {"delivery_crew": self.crew.pk})
+        self.client.force_authenticate(self.crew)
+        self.client.patch(f"/api/orders/{orders[0].pk}", {"status": True})
+        orders[2].delete()
+
+        day = models.DailySales.objects.get()
+        self.assertEqual((day.orders, day.items, day.revenue), (2, 8, Decimal("12.00")))
+        crew = models.DailyCrewSales.objects.get()
+        self.assertEqual((crew.orders, crew.delivered, crew.revenue), (2, 1, Decimal("12.00")))
+
+        incremental = self.rollups()
+        call_command("backfill_reports", workers=0, days_per_task=1, stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_deleting_menu_items_and_crew_keeps_the_totals(self):
+        order = self.checkout(self.customers[0], (1, 2, 3))
+        order.delivery_crew = self.crew
+        order.save()
+        self.menu_items[0].delete()
+        self.crew.delete()
+
+        revenue = models.DailySales.objects.get().revenue
+        for model in (models.DailyMenuItemSales, models.DailyCategorySales, models.DailyCrewSales):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.aggregate(Sum("revenue"))["revenue__sum"], revenue)
+        self.client.force_authenticate(self.manager)
+        response = self.client.get("/api/reports/menu-items")
+        self.assertIn({"id": None, "title": None, "quantity": 1, "revenue": "1.50"}, response.data)
+
+    def test_saves_compare_with_the_loaded_delivery(self):
+        order = models.Order.objects.get(pk=self.checkout(self.customers[0], (1,)).pk)
+        with CaptureQueriesContext(connection) as queries:
+            order.total = Decimal("2.00")
+            order.save(update_fields=["total"])
+            order.delivery_crew = self.crew
+            order.save()
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("SELECT")])
+        self.assertEqual(models.DailyCrewSales.objects.get().orders, 1)
+
+    def test_report_endpoints(self):
+        self.checkout(self.customers[0], (1, 2, 3))
+        self.checkout(self.customers[1], (0, 4))
+        self.client.force_authenticate(self.manager)
+        today = datetime.date.today().isoformat()
+
+        response = self.client.get("/api/reports/daily")
+        self.assertEqual(response.data, [{"date": today, "orders": 2, "items": 10, "revenue": "15.00"}])
+        response = self.client.get("/api/reports/menu-items?limit=2")
+        self.assertEqual(
+            [(row["title"], row["quantity"], row["revenue"]) for row in response.data],
+            [("Dish 1", 6, "9.00"), ("Dish 2", 3, "4.50")]
+        )
+        response = self.client.get("/api/reports/categories")
+        self.assertEqual([(row["title"], row["quantity"]) for row in response.data], [("Category 1", 6), ("Category 0", 4)])
+
+        response = self.client.get("/api/reports/daily?date_to=2000-01-01")
+        self.assertEqual(response.data, [])
+        response = self.client.get("/api/reports/daily?date_from=tomorrow")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.customers[0])
+        self.assertEqual(self.client.get("/api/reports/daily").status_code, 403)
+
+
+class AssignmentTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        group = Group.objects.create(name=roles.DELIVERY_CREW)
+        self.crew = [User.objects.create_user(username=f"delivery{i}") for i in range(3)]
+        group.user_set.add(*self.crew)
+        self.customer = User.objects.create_user(username="customer1")
+
+    def create_orders(self, count, **kwargs):
+        models.Order.objects.bulk_create([
+            models.Order(user=self.customer, total=Decimal("5.00"), date=datetime.date(2024, 1, 1 + i % 3), **kwargs)
+            for i in range(count)
+        ])
+
+    def loads(self):
+        return [
+            models.Order.objects.filter(delivery_crew=member, status=False).count() for member in self.crew
+        ]
+
+    def test_balances_the_open_orders(self):
+        self.create_orders(4, delivery_crew=self.crew[0])
+        self.create_orders(5, delivery_crew=self.crew[1], status=True)
+        self.create_orders(11)
+        self.assertEqual(assignment.assign_orders(batch_size=4), 11)
+        self.assertEqual(self.loads(), [5, 5, 5])
+        self.assertFalse(assignment.open_orders().exists())
+
+        # The crew rollups count them, as if they had been assigned one by one
+        incremental = dict(models.DailyCrewSales.objects.values_list("delivery_crew_id").annotate(Sum("orders")))
+        self.assertEqual(incremental, {self.crew[0].pk: 1, self.crew[1].pk: 5, self.crew[2].pk: 5})
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        counts = []
+        groups.registry.load()
+        for batch_size in (10, 100):
+            self.create_orders(batch_size)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(assignment.assign_orders(batch_size=batch_size), batch_size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_endpoint(self):
+        self.create_orders(7)
+        self.client.force_authenticate(self.manager)
+        response = self.client.post("/api/orders/assign", {"limit": 5})
+        self.assertEqual(response.data, {"assigned": 5})
+        self.assertEqual(assignment.open_orders().count(), 2)
+
+        self.client.force_authenticate(self.crew[0])
+        self.assertEqual(self.client.post("/api/orders/assign").status_code, 403)
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        crew_group = Group.objects.create(name=roles.DELIVERY_CREW)
+        self.crew = [User.objects.create_user(username=f"delivery{i}") for i in range(2)]
+        crew_group.user_set.add(*self.crew)
+        self.customers = [User.objects.create_user(username=f"customer{i}") for i in range(2)]
+        self.order = models.Order.objects.create(
+            user=self.customers[0], total=Decimal("5.00"), date=datetime.date.today()
+        )
+
+    @contextmanager
+    def received(self, users):
+        """Subscribes each user as the stream would; self.messages is what each got."""
+        broker = events.get_broker()
+        subscriptions = {user.username: broker.subscribe(events.channel_for(user)) for user in users}
+        try:
+            yield
+        finally:
+            for subscription in subscriptions.values():
+                subscription.close()
+        self.messages = {
+            name: [json.loads(message) for message in iter(lambda: subscription.get(0.01), None)]
+            for name, subscription in subscriptions.items()
+        }
+
+    def test_events_follow_the_order_visibility(self):
+        users = [self.manager, *self.crew, *self.customers]
+        with self.received(users), self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.manager)
+            self.client.patch(f"/api/orders/{self.order.pk}", {"delivery_crew": self.crew[0].pk})
+            self.client.force_authenticate(self.crew[0])
+            self.client.patch(f"/api/orders/{self.order.pk}", {"status": True})
+
+        assigned = {"id": self.order.pk, "status": False, "delivery_crew": self.crew[0].pk}
+        delivered = {"id": self.order.pk, "status": True, "delivery_crew": self.crew[0].pk}
+        self.assertEqual(self.messages, {
+            "manager1": [assigned, delivered],
+            "delivery0": [assigned, delivered],
+            "delivery1": [],
+            "customer0": [assigned, delivered],
+            "customer1": [],
+        })
+
+    def test_bulk_assignment_publishes(self):
+        with self.received([self.manager]), self.captureOnCommitCallbacks(execute=True):
+            assignment.assign_orders()
+        self.assertEqual(len(self.messages["manager1"]), 1)
+
+    def test_stream_under_asgi(self):
+        token = Token.objects.create(user=self.customers[0])
+        message = json.dumps({"id": self.order.pk, "status": True, "delivery_crew": None})
+
+        async def read():
+            response = await AsyncClient().get(
+                "/api/orders/events?timeout=5", headers={"authorization": f"Token {token.key}"}
+            )
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            await sync_to_async(events.get_broker().publish)(events.customer_channel(self.customers[0].pk), message)
+            return response["Content-Type"], first, await anext(chunks)
+
+        self.assertEqual(async_to_sync(read)(), (
+            "text/event-stream; charset=utf-8", b"retry: 1000\n\n", f"event: order\ndata: {message}\n\n".encode()
+        ))
+
+    def test_timeout(self):
+        self.client.force_authenticate(self.customers[0])
+        response = self.client.get("/api/orders/events?timeout=0")
+        self.assertEqual(b"".join(response.streaming_content), b"retry: 1000\n\n")
+        response = self.client.get("/api/orders/events?timeout=soon")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+
+class FieldWritePolicyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.crew = User.objects.create_user(username="delivery1")
+        self.crew.groups.add(Group.objects.create(name=roles.DELIVERY_CREW))
+        self.customer = User.objects.create_user(username="customer1")
+        self.order = models.Order.objects.create(
+            user=self.customer, delivery_crew=self.crew, total=Decimal("5.00"), date=datetime.date.today()
+        )
+
+    def test_allowed_fields_of_combined_roles(self):
+        policy = permissions.FieldWritePolicy({"a": ["x"], "b": ["y", "z"]})
+        self.assertEqual(policy.allowed[frozenset()], frozenset())
+        self.assertEqual(policy.allowed[frozenset({"a", "b"})], {"x", "y", "z"})
+
+    def test_order_fields_per_role(self):
+        url = f"/api/orders/{self.order.pk}"
+        self.client.force_authenticate(self.crew)
+        self.assertEqual(self.client.patch(url, {"status": True}).status_code, 200)
+        response = self.client.patch(url, {"status": True, "delivery_crew": self.crew.pk})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data["detail"], "You can't change delivery_crew.")
+        # Related and read-only fields are refused too, whatever their value
+        self.assertEqual(self.client.patch(url, {"user": self.customer.pk}).status_code, 403)
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.patch(url, {"delivery_crew": self.crew.pk, "status": False}).status_code, 200)
+        self.assertEqual(self.client.patch(url, {"total": "1.00"}).status_code, 403)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal("5.00"))
+
+    def test_checks_roles_without_queries(self):
+        request = APIRequestFactory().patch("/", {"status": True}, format="json")
+        force_authenticate(request, self.crew)
+        view = views.SingleOrderView()
+        request = view.request = view.initialize_request(request)
+        roles.get_roles(request.user)
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.FieldWritePermission().has_permission(request, view))
+
+    def test_cart_item_quantity_only(self):
+        category = models.Category.objects.create(slug="main", title="Main")
+        menu_item = models.MenuItem.objects.create(title="Dish", price=Decimal("2.00"), featured=False, category=category)
+        cart_item = models.Cart.objects.create(user=self.customer, menuitem=menu_item, quantity=1, price=Decimal("2.00"))
+        self.client.force_authenticate(self.customer)
+        url = f"/api/cart/menu-items/{cart_item.pk}"
+        self.assertEqual(self.client.patch(url, {"menuitem_id": menu_item.pk}).status_code, 403)
+        self.assertEqual(self.client.patch(url, {"quantity": 3}).status_code, 200)
+
+    def test_form_keys_that_are_not_fields(self):
+        category = models.Category.objects.create(slug="main", title="Main")
+        self.client.force_authenticate(self.manager)
+        data = {"title": "Dish", "price": "2.00", "featured": False, "category_id": category.pk, "csrfmiddlewaretoken": "x"}
+        self.assertEqual(self.client.post("/api/menu-items/", data, format="multipart").status_code, 201)
+
+
+class ProjectionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username="manager1", email="manager@example.com")
+        self.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        self.crew = User.objects.create_user(username="delivery1", first_name="Ana")
+        self.crew.groups.add(Group.objects.create(name=roles.DELIVERY_CREW))
+        self.customer = User.objects.create_user(username="customer1")
+        category = models.Category.objects.create(slug="main", title="Main")
+        menu_items = models.MenuItem.objects.bulk_create([
+            models.MenuItem(title=f"Lemon dish {i}", price=Decimal(i % 3) + Decimal("0.50"), featured=i % 2 == 0, category=category)
+            for i in range(7)
+        ])
+        models.Cart.objects.bulk_create([
+            models.Cart(user=self.customer, menuitem=menu_item, quantity=2, price=menu_item.price * 2)
+            for menu_item in menu_items[:3]
+        ])
+        for i in range(4):
+            # One order without a delivery crew member
+            order = models.Order.objects.create(
+                user=self.customer, delivery_crew=self.crew if i else None, total=Decimal("9.50"),
+                date=datetime.date.today() - datetime.timedelta(days=i),
+            )
+            models.OrderItem.objects.bulk_create([
+                models.OrderItem(order=order, menuitem=menu_item, quantity=1, price=menu_item.price)
+                for menu_item in menu_items[i:i + 3]
+            ])
+
+    def assertSameAsSerializer(self, user, url):
+        self.client.force_authenticate(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        cache.clear()
+        with mock.patch.object(views.projections.ProjectedListMixin, "get_projection", return_value=None):
+            expected = self.client.get(url)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_lists_render_the_same_bytes(self):
+        for user, url in (
+            (self.customer, "/api/menu-items/?ordering=-price"),
+            (self.customer, "/api/menu-items/?search=lemon&featured=True"),
+            (self.customer, "/api/menu-items/?pagination=keyset&ordering=price"),
+            (self.customer, "/api/category/"),
+            (self.manager, "/api/orders/?ordering=date"),
+            (self.manager, "/api/orders/?count=estimate"),
+            (self.crew, "/api/orders/"),
+            (self.customer, "/api/orders/?pagination=keyset&ordering=-total"),
+        ):
+            with self.subTest(user=user.username, url=url):
+                self.assertSameAsSerializer(user, url)
+
+    def test_null_delivery_crew_nests_like_the_serializer(self):
+        response = self.assertSameAsSerializer(self.manager, "/api/orders/?ordering=-date")
+        self.assertEqual(response.data["results"][0]["delivery_crew"], serializers.UserSerializer(None).data)
+        self.assertEqual(response.data["results"][-1]["delivery_crew"]["first_name"], "Ana")
+        response = self.assertSameAsSerializer(self.customer, "/api/orders/?ordering=-date")
+        self.assertIsNone(response.data["results"][0]["delivery_crew"])
+
+    def test_keyset_cursor_reads_the_projected_rows(self):
+        self.client.force_authenticate(self.customer)
+        with mock.patch.object(pagination.KeysetPagination, "page_size", 2):
+            url = "/api/menu-items/?pagination=keyset&ordering=price"
+            ids = []
+            while url:
+                page = self.client.get(url).data
+                ids.extend(item["id"] for item in page["results"])
+                url = page["next"]
+        self.assertEqual(ids, list(models.MenuItem.objects.order_by("price", "id").values_list("id", flat=True)))
+
+    def test_cart_renders_the_same_bytes(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get("/api/cart/menu-items/")
+        cart = mixins.prefetch_for_serializer(models.Cart.objects.filter(user=self.customer), serializers.CartSerializer)
+        self.assertEqual(response.content, JSONRenderer().render(serializers.CartSerializer(cart, many=True).data))
+
+    def test_counts_and_children_do_not_join_the_nested_relations(self):
+        self.client.force_authenticate(self.manager)
+        self.client.get("/api/orders/")  # warm the role cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/orders/")
+        count_sql = [q["sql"] for q in queries.captured_queries if "COUNT(" in q["sql"]]
+        self.assertEqual(len(count_sql), 1)
+        self.assertNotIn("auth_user", count_sql[0])
+        self.assertEqual(len([q for q in queries.captured_queries if "orderitem" in q["sql"]]), 1)
+
+    def test_unsupported_serializers_have_no_projection(self):
+        class WithMethodField(serializers.CategorySerializer):
+            slug_length = SerializerMethodField()
+
+            class Meta(serializers.CategorySerializer.Meta):
+                fields = ["id", "slug_length"]
+
+            def get_slug_length(self, obj):
+                return len(obj.slug)
+
+        self.assertIsNone(projections.get_projection(WithMethodField))
+        self.assertIsNone(projections.get_projection(serializers.AddUserToGroupSerializer))
+        self.assertIsNotNone(projections.get_projection(serializers.SingleOrderSerializerForManager))
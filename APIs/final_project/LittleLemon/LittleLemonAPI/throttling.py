@@ -0,0 +1,294 @@
+"""
+Rate limits shared by every worker process.
+
+DRF's throttles keep a list of timestamps per client in Django's cache,
+which is a LocMemCache per process here: with N workers a client got N
+times its rate. These throttles keep their counters in a store shared by
+the processes instead, and only need O(1) work per request.
+
+They count with a sliding window: the requests of the current fixed
+window plus those of the previous one, weighted by how much of it still
+overlaps the last `duration` seconds. The counter is incremented before
+the check, atomically, so concurrent requests can't all slip under the
+limit; refused requests are taken back out.
+
+The store is picked with the THROTTLE_STORE setting:
+
+- "sqlite:///path/to/file": a SQLite file, shared by the processes of one
+  host. The default, in the temporary directory.
+- "redis://host:port/db": a Redis server, shared by several hosts. Needs
+  the redis package.
+- "locmem://": a dict of this process.
+
+The stores implement the few Redis commands the throttles and tokens.py
+use (incr, get, mget, set, expire, delete, flushdb) and pipeline(), so
+redis.Redis works as is. A request's counter is incremented, given its
+expiry and read with the previous window in one pipeline: MULTI/EXEC on
+Redis, so a key can't be left without a TTL between two calls.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import throttling
+
+# Expired keys are deleted once every PURGE_INTERVAL calls of expire()
+PURGE_INTERVAL = 1000
+
+
+class Pipeline:
+    """
+    redis-py's pipeline() for the stores below: the commands are queued,
+    then execute() runs them together, under one lock or transaction of
+    the store, and returns their results.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        with self.store.atomic():
+            return [getattr(self.store, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class LocMemStore:
+    def __init__(self):
+        # Reentrant: the commands of a pipeline run while it's held
+        self.lock = threading.RLock()
+        self.data = {}
+
+    def atomic(self):
+        return self.lock
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def _live(self, name, now):
+        entry = self.data.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self.data[name]
+            return None
+        return entry
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            entry = self._live(name, time.time())
+            if entry is None:
+                entry = self.data[name] = [0, None]
+            entry[0] += amount
+            return entry[0]
+
+    def get(self, name):
+        with self.lock:
+            entry = self._live(name, time.time())
+            return None if entry is None else entry[0]
+
+    def mget(self, names):
+        with self.lock:
+            now = time.time()
+            return [None if (entry := self._live(name, now)) is None else entry[0] for name in names]
+
+    def set(self, name, value, ex=None):
+        with self.lock:
+            self.data[name] = [value, None if ex is None else time.time() + ex]
+        return True
+
+    def expire(self, name, time_):
+        with self.lock:
+            entry = self._live(name, time.time())
+            if entry is None:
+                return False
+            entry[1] = time.time() + time_
+            return True
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+    def flushdb(self):
+        with self.lock:
+            self.data.clear()
+        return True
+
+
+class SQLiteStore:
+    """
+    Counters in a SQLite file. Each thread of each process has its own
+    connection; every command is one IMMEDIATE transaction, which SQLite
+    serializes across processes.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.local = threading.local()
+        self.calls = 0
+
+    @property
+    def connection(self):
+        # A connection can't be used on both sides of a fork
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters "
+                "(key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires REAL)"
+            )
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection
+        if connection.in_transaction:
+            # A command of a pipeline, in its transaction
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def atomic(self):
+        return self.transaction()
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def incr(self, name, amount=1):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM counters WHERE key = ? AND expires <= ?", (name, time.time()))
+            connection.execute(
+                "INSERT INTO counters (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value",
+                (name, amount)
+            )
+            return connection.execute("SELECT value FROM counters WHERE key = ?", (name,)).fetchone()[0]
+
+    def get(self, name):
+        row = self.connection.execute(
+            "SELECT value FROM counters WHERE key = ? AND (expires IS NULL OR expires > ?)", (name, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def mget(self, names):
+        now = time.time()
+        values = dict(self.connection.execute(
+            f"SELECT key, value FROM counters WHERE key IN ({', '.join('?' * len(names))}) "
+            "AND (expires IS NULL OR expires > ?)",
+            [*names, now]
+        ).fetchall())
+        return [values.get(name) for name in names]
+
+    def set(self, name, value, ex=None):
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO counters (key, value, expires) VALUES (?, ?, ?)",
+                (name, value, None if ex is None else time.time() + ex)
+            )
+        return True
+
+    def expire(self, name, time_):
+        now = time.time()
+        self.calls += 1
+        with self.transaction() as connection:
+            if self.calls % PURGE_INTERVAL == 0:
+                connection.execute("DELETE FROM counters WHERE expires <= ?", (now,))
+            updated = connection.execute(
+                "UPDATE counters SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (now + time_, name, now)
+            ).rowcount
+        return bool(updated)
+
+    def delete(self, *names):
+        with self.transaction() as connection:
+            return connection.execute(
+                f"DELETE FROM counters WHERE key IN ({', '.join('?' * len(names))})", names
+            ).rowcount
+
+    def flushdb(self):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM counters")
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    url = settings.THROTTLE_STORE
+    if url.startswith("sqlite://"):
+        return SQLiteStore(url.removeprefix("sqlite://"))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(f"THROTTLE_STORE {url} needs the redis package")
+        return redis.Redis.from_url(url)
+    if url == "locmem://":
+        return LocMemStore()
+    raise ImproperlyConfigured(f"Unknown THROTTLE_STORE {url}")
+
+
+class SlidingWindowThrottleMixin:
+    """Replaces the cache and timestamp list of DRF's SimpleRateThrottle."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        store = get_store()
+        window, self.elapsed = divmod(self.timer(), self.duration)
+        current_key = f"{self.key}:{int(window)}"
+        # One round trip. The expiry keeps the key as the previous window of
+        # the next one
+        count, _, previous = (
+            store.pipeline()
+            .incr(current_key)
+            .expire(current_key, 2 * self.duration)
+            .get(f"{self.key}:{int(window) - 1}")
+            .execute()
+        )
+        self.previous = int(previous or 0)
+
+        if count + self.previous * (1 - self.elapsed / self.duration) <= self.num_requests:
+            return True
+        # Refused requests don't use up the rate
+        self.current = store.incr(current_key, -1)
+        return self.throttle_failure()
+
+    def wait(self):
+        """Seconds until the sliding window has room for one more request."""
+        room = self.num_requests - 1 - self.current
+        if room >= 0:
+            # Once enough of the previous window has slid out
+            return max((1 - room / self.previous) * self.duration - self.elapsed, 0)
+        if not self.current:
+            # A rate of 0 requests
+            return None
+        # In the next window, this one becomes the previous
+        return self.duration - self.elapsed + (1 - (self.num_requests - 1) / self.current) * self.duration
+
+
+class AnonRateThrottle(SlidingWindowThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(SlidingWindowThrottleMixin, throttling.UserRateThrottle):
+    pass
@@ -0,0 +1,186 @@
+"""
+Stateless access tokens, next to djoser's database tokens.
+
+POST api/token/access/ with a username and password returns a pair:
+
+- An access token, valid for ACCESS_TOKEN_LIFETIME seconds and sent as
+  "Authorization: Bearer <token>". It's signed with the SECRET_KEY
+  (django.core.signing, HMAC-SHA256) and carries the user's id, username,
+  staff flags and groups. AccessTokenAuthentication builds request.user
+  from it and memoizes the groups for roles.py, so authentication and the
+  permission checks don't query the database.
+- A refresh token, stored (hashed) in models.RefreshToken. POST it to
+  api/token/refresh/ for a new pair; each refresh token works once.
+
+Revocations are checked in the store shared by the workers that the rate
+limits use (throttling.get_store), with one lookup per request:
+
+- Logging out (api/token/revoke/) revokes the refresh token and the access
+  token of the request, by its id.
+- Changing a user's groups or account revokes every access token issued
+  to them until then (signals.py). Their clients refresh to get the new
+  roles.
+
+A revocation only needs to last as long as the tokens it revokes, so the
+store entries expire after ACCESS_TOKEN_LIFETIME.
+"""
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from . import models, roles
+from .throttling import get_store
+
+SALT = "LittleLemonAPI.tokens"
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+def _revoked_key(token_id):
+    return f"littlelemon:token:revoked:{token_id}"
+
+
+def _not_before_key(user_id):
+    return f"littlelemon:token:not-before:{user_id}"
+
+
+def _hash(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def access_token(user):
+    claims = {
+        "uid": user.pk,
+        "usr": user.username,
+        "stf": user.is_staff,
+        "su": user.is_superuser,
+        "grp": sorted(roles.get_group_names(user)),
+        "jti": secrets.token_hex(8),
+        "iat": _now_us(),
+    }
+    return signing.dumps(claims, salt=SALT)
+
+
+def issue(user):
+    """A new access and refresh token pair for the user, as the API returns it."""
+    refresh_token = secrets.token_urlsafe(32)
+    now = timezone.now()
+    models.RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(refresh_token),
+        created=now,
+        expires=now + timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME),
+    )
+    return {
+        "access": access_token(user),
+        "refresh": refresh_token,
+        "token_type": "Bearer",
+        "expires_in": settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def refresh(refresh_token):
+    """Exchanges a refresh token for a new pair. The old one stops working."""
+    with transaction.atomic():
+        token = (
+            models.RefreshToken.objects.select_for_update().select_related("user")
+            .filter(token_hash=_hash(refresh_token)).first()
+        )
+        if token is None or token.expires <= timezone.now() or not token.user.is_active:
+            raise exceptions.AuthenticationFailed("Invalid refresh token.")
+        if not token.revoked:
+            token.revoked = True
+            token.save(update_fields=["revoked"])
+            return issue(token.user)
+
+    # Used twice: someone else may hold a copy, so end every session
+    models.RefreshToken.objects.filter(user_id=token.user_id).update(revoked=True)
+    revoke_access([token.user_id])
+    raise exceptions.AuthenticationFailed("Invalid refresh token.")
+
+
+def revoke(refresh_token=None, claims=None):
+    """Logout: revokes the refresh token and the access token with these claims."""
+    if refresh_token:
+        models.RefreshToken.objects.filter(token_hash=_hash(refresh_token)).update(revoked=True)
+    if claims:
+        get_store().set(_revoked_key(claims["jti"]), 1, ex=settings.ACCESS_TOKEN_LIFETIME)
+
+
+def revoke_access(user_ids):
+    """Revokes the access tokens issued to the users until now."""
+    store = get_store()
+    now = _now_us()
+    for user_id in user_ids:
+        store.set(_not_before_key(user_id), now, ex=settings.ACCESS_TOKEN_LIFETIME)
+
+
+def verify(token):
+    """The claims of a valid access token. Raises AuthenticationFailed."""
+    try:
+        claims = signing.loads(token, salt=SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed("Token expired.")
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+
+    revoked, not_before = get_store().mget([_revoked_key(claims["jti"]), _not_before_key(claims["uid"])])
+    # A token issued in the same microsecond as a revocation is revoked
+    if revoked or (not_before is not None and claims["iat"] <= int(not_before)):
+        raise exceptions.AuthenticationFailed("Token revoked.")
+    return claims
+
+
+def token_user(claims):
+    """
+    The user of the claims, without a query. The other fields are deferred:
+    they're loaded from the database if something reads them.
+    """
+    values = {
+        "id": claims["uid"],
+        "is_superuser": claims["su"],
+        "username": claims["usr"],
+        "is_staff": claims["stf"],
+        "is_active": True,
+    }
+    user = User.from_db(
+        DEFAULT_DB_ALIAS,
+        list(values),
+        [values[field.attname] for field in User._meta.concrete_fields if field.attname in values],
+    )
+    user._group_names = frozenset(claims["grp"])
+    return user
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates "Authorization: Bearer <access token>". request.auth is
+    the dict of claims.
+    """
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+
+        claims = verify(token)
+        return token_user(claims), claims
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -1,17 +1,36 @@
+from django.conf import settings
 from django.urls import path
 from djoser.views import UserViewSet
 from . import views
 
+
+def read_view(view, async_view):
+    """The async variant of the view with ASYNC_READ_VIEWS (see asyncviews.py)."""
+    return (async_view if settings.ASYNC_READ_VIEWS else view).as_view()
+
+
 # User registration
 urlpatterns = [
-    path("category/", views.CategoryView.as_view()),
-    path("category/<int:pk>", views.SingleCategoryView.as_view(),  name="category-detail"),
-    path("menu-items/", views.MenuItemsView.as_view()),
-    path("menu-items/<int:pk>", views.SingleMenuItemView.as_view()),
+    path("category/", read_view(views.CategoryView, views.AsyncCategoryView)),
+    path("category/<int:pk>", read_view(views.SingleCategoryView, views.AsyncSingleCategoryView),  name="category-detail"),
+    path("menu-items/", read_view(views.MenuItemsView, views.AsyncMenuItemsView)),
+    path("menu-items/<int:pk>", read_view(views.SingleMenuItemView, views.AsyncSingleMenuItemView)),
     path("groups/<str:group_name>/users/", views.UserGroupListView.as_view()),
+    path("groups/<str:group_name>/users/bulk", views.BulkGroupUserView.as_view()),
     path("groups/<str:group_name>/users/<int:pk>", views.SingleGroupUserView.as_view()),
-    path("cart/menu-items/", views.CartView.as_view()),
+    path("cart/menu-items/", read_view(views.CartView, views.AsyncCartView)),
+    path("cart/menu-items/bulk", views.BulkCartView.as_view()),
     path("cart/menu-items/<int:pk>", views.SingleCartItemView.as_view()),
-    path("orders/", views.OrdersView.as_view()),
-    path("orders/<int:pk>", views.SingleOrderView.as_view()),
+    path("orders/", read_view(views.OrdersView, views.AsyncOrdersView)),
+    path("orders/export", views.OrderExportView.as_view()),
+    path("orders/assign", views.AssignOrdersView.as_view()),
+    path("orders/events", read_view(views.OrderEventsView, views.AsyncOrderEventsView)),
+    path("orders/<int:pk>", read_view(views.SingleOrderView, views.AsyncSingleOrderView)),
+    path("token/access/", views.AccessTokenView.as_view()),
+    path("token/refresh/", views.RefreshTokenView.as_view()),
+    path("token/revoke/", views.RevokeTokenView.as_view()),
+    path("reports/daily", views.DailySalesView.as_view()),
+    path("reports/menu-items", views.MenuItemSalesView.as_view()),
+    path("reports/categories", views.CategorySalesView.as_view()),
+    path("reports/delivery-crew", views.CrewSalesView.as_view()),
 ]
\ No newline at end of file
@@ -1,9 +1,9 @@
-from django.contrib.auth.models import Group
 from rest_framework import exceptions
+from . import groups
 
-def get_group_or_404(group_view_name, view2group_name):
-        group_db_name = view2group_name.get(group_view_name)
-        if group_db_name:
-            return Group.objects.get(name=group_db_name)
+def get_group_or_404(group_view_name):
+        group = groups.registry.by_slug(group_view_name)
+        if group is not None:
+            return group
         raise exceptions.NotFound(
             {"error": f"Group {group_view_name} does not exist"})
\ No newline at end of file
@@ -1,11 +1,32 @@
-import datetime
+from datetime import date
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q, Sum
 from django.shortcuts import get_object_or_404
 from rest_framework import generics, status, exceptions
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.filters import OrderingFilter
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from . import models, serializers, permissions, utils
+from . import assignment
+from . import asyncviews
+from . import checkout
+from . import events
+from . import exports
+from . import memberships
+from . import mixins
+from . import models
+from . import pagination
+from . import permissions
+from . import projections
+from . import renderers
+from . import roles
+from . import search
+from . import serializers
+from . import tokens
+from . import utils
 
 
 """
@@ -17,9 +38,11 @@ Permissions:
 - POST, PATCH and DELETE: only the admin
 """
 
-class CategoryView(generics.ListCreateAPIView):
+class CategoryView(mixins.CachedListView):
     queryset = models.Category.objects.all()
     serializer_class = serializers.CategorySerializer
+    pagination_class = pagination.AsyncPageNumberPagination
+    cache_query_params = ("page",)
 
     def get_permissions(self):
         if self.request.method == "POST":
@@ -27,7 +50,7 @@ class CategoryView(generics.ListCreateAPIView):
         return [IsAuthenticated()]
 
 
-class SingleCategoryView(generics.RetrieveUpdateDestroyAPIView):
+class SingleCategoryView(mixins.CachedDetailView):
     queryset = models.Category.objects.all()
     serializer_class = serializers.CategorySerializer
 
@@ -44,35 +67,47 @@ Permissions:
 """
 
 
-class MenuItemsView(generics.ListCreateAPIView):
+class MenuItemsView(mixins.CachedListView):
     serializer_class = serializers.MenuItemSerializer
+    pagination_class = pagination.LargeTablePagination
+    cache_query_params = ("category", "featured", "page", "pagination", "cursor", "count")
     ordering_fields = ["price"]
     filterset_fields = ["category__title","featured"] 
-    search_fields = ["title"]
+    filter_backends = [OrderingFilter, search.MenuItemSearchFilter]
+    write_policy = permissions.MENU_ITEM_WRITE_POLICY
 
     def get_queryset(self):
-        queryset = models.MenuItem.objects.select_related("category").all()
+        queryset = models.MenuItem.objects.all()
         category_title = self.request.query_params.get("category")
         featured = self.request.query_params.get("featured")
         if category_title:
             queryset = queryset.filter(category__title = category_title)
         if featured:
-            queryset = queryset.filter(featured=featured)
+            # featured=... is rendered as a bare boolean column on SQLite,
+            # which can't use the index; IN compares the column with a value
+            queryset = queryset.filter(featured__in=[featured])
         return queryset
+
+    async def afilter_queryset(self, queryset):
+        # Picking the search backend queries the database the first time
+        if self.request.query_params.get("search"):
+            await search.aget_backend()
+        return self.filter_queryset(queryset)
     
     def get_permissions(self):
         if self.request.method == "POST":
-            return [IsAuthenticated(), permissions.IsAdminOrManagerPermission()]
+            return [IsAuthenticated(), permissions.IsAdminOrManagerPermission(), permissions.FieldWritePermission()]
         return [IsAuthenticated()]
     
-class SingleMenuItemView(generics.RetrieveUpdateDestroyAPIView):
+class SingleMenuItemView(mixins.CachedDetailView):
     queryset = models.MenuItem.objects.all()
     serializer_class = serializers.MenuItemSerializer
+    write_policy = permissions.MENU_ITEM_WRITE_POLICY
 
     def get_permissions(self):
         if self.request.method == "GET":
             return [IsAuthenticated()]
-        return [IsAuthenticated(), permissions.IsAdminOrManagerPermission()]
+        return [IsAuthenticated(), permissions.IsAdminOrManagerPermission(), permissions.FieldWritePermission()]
 
 
 """
@@ -83,24 +118,44 @@ registered as managers or delivery crew.
 PERMISSIONS: Only managers and admin for all actions.
 """
 
-# Mapping the group name as specified in views.py 
-# to how it's defined in the database
-VIEW_GROUPNAME2DB_GROUPNAME = {
-    "manager": "Manager",
-    "delivery-crew": "Delivery crew"
-}
 class UserGroupListView(APIView):
+    """
+    GET lists the members of the group, streamed whole. ?search= keeps the
+    ones whose username, name or email contains it; ?pagination=keyset
+    (then the next/previous links) serves them in pages instead, by id or
+    by ?ordering=username.
+    """
     permission_classes = [permissions.IsAdminOrManagerPermission]
     serializer_class = serializers.AddUserToGroupSerializer
+    ordering_fields = ["username"]
     
     def get(self, request, group_name):
-        group = utils.get_group_or_404(group_name, VIEW_GROUPNAME2DB_GROUPNAME)
+        group = utils.get_group_or_404(group_name)
         users = User.objects.filter(groups=group)
+        search_term = request.query_params.get("search", "").strip()
+        if search_term:
+            users = users.filter(
+                Q(username__icontains=search_term)
+                | Q(first_name__icontains=search_term)
+                | Q(last_name__icontains=search_term)
+                | Q(email__icontains=search_term)
+            )
+
+        if request.query_params.get("pagination") == "keyset" or request.query_params.get("cursor"):
+            projection = projections.get_projection(serializers.UserSerializer)
+            paginator = pagination.KeysetPagination()
+            page = paginator.paginate_queryset(projection.apply(users, self.ordering_fields), request, view=self)
+            return paginator.get_paginated_response(projection.serialize(page))
+
+        # Unpaginated: stream it rather than render it all at once
+        response = renderers.stream_json_list(request, users, serializers.UserSerializer)
+        if response is not None:
+            return response
         serialized_users = serializers.UserSerializer(users,many=True)
         return Response(serialized_users.data,status=status.HTTP_200_OK)
 
     def post(self, request, group_name):
-        group = utils.get_group_or_404(group_name, VIEW_GROUPNAME2DB_GROUPNAME)
+        group = utils.get_group_or_404(group_name)
         serialized_data = self.serializer_class(data=request.data)
 
         if not serialized_data.is_valid():
@@ -113,11 +168,9 @@ class UserGroupListView(APIView):
         else:
             user = get_object_or_404(User,username=username)
         
-        if group in user.groups.all(): 
+        added, _ = memberships.update(group, add=[user.pk])
+        if not added:
             return Response({"message": f"User {user.username} already belongs to group {group.name}. No changes."}, status=status.HTTP_200_OK)
-        
-        user.groups.add(group)
-        user.save()
 
         return Response(
             {"message": f"User {user.username} assigned to group {group.name} successfully"},
@@ -125,14 +178,38 @@ class UserGroupListView(APIView):
         )
 
 
+class BulkGroupUserView(APIView):
+    """
+    Adds and removes many users of the group in one request:
+    {"add": [...], "remove": [...]}, lists of {"id"} or {"username"}.
+    Returns the usernames that were added and removed; the users that
+    already were, or weren't, members are left as they were.
+    """
+    permission_classes = [permissions.IsAdminOrManagerPermission]
+    serializer_class = serializers.GroupMembershipSerializer
+
+    def post(self, request, group_name):
+        group = utils.get_group_or_404(group_name)
+        serialized_data = self.serializer_class(data=request.data)
+        serialized_data.is_valid(raise_exception=True)
+        add = serialized_data.validated_data["add"]
+        remove = serialized_data.validated_data["remove"]
+
+        added, removed = memberships.update(group, add=list(add), remove=list(remove))
+        return Response(
+            {"added": [add[user_id] for user_id in added], "removed": [remove[user_id] for user_id in removed]},
+            status=status.HTTP_200_OK
+        )
+
+
 class SingleGroupUserView(APIView):
     permission_classes = [permissions.IsAdminOrManagerPermission]
     serializer_class = serializers.UserSerializer
 
     def get(self, request, group_name, pk):
-        group = utils.get_group_or_404(group_name, VIEW_GROUPNAME2DB_GROUPNAME)
+        group = utils.get_group_or_404(group_name)
         user = get_object_or_404(User, pk=pk)
-        if group not in user.groups.all():
+        if not memberships.is_member(group, user.pk):
             return Response(
                 {"message": f"User {user.username} doesn't belong to group {group.name}"},
                 status=status.HTTP_200_OK
@@ -146,15 +223,14 @@ class SingleGroupUserView(APIView):
 
 
     def delete(self, request, group_name, pk):
-        group = utils.get_group_or_404(group_name, VIEW_GROUPNAME2DB_GROUPNAME)
+        group = utils.get_group_or_404(group_name)
         user = get_object_or_404(User,pk=pk)
-        if group not in user.groups.all():
+        _, removed = memberships.update(group, remove=[user.pk])
+        if not removed:
             return Response(
                 {"message": f"User {user.username} doesn't belong to group {group.name}"},
                 status=status.HTTP_200_OK
             )
-        user.groups.remove(group)
-        user.save()
         return Response(
             {"message": f"User {user.username} removed from group {group.name}"},
             status=status.HTTP_200_OK
@@ -171,14 +247,26 @@ remove "request.user.is_staff" from permissions.IsCustomerPermission
 if you want to use admin for testing
 """
 
-class CartView(APIView):
+class CartView(asyncviews.AsyncReadMixin, APIView):
     serializer_class = serializers.CartSerializer
-    permission_classes = [IsAuthenticated, permissions.IsCustomerPermission]
+    permission_classes = [IsAuthenticated, permissions.IsCustomerPermission, permissions.FieldWritePermission]
+    write_policy = permissions.CART_WRITE_POLICY
+
+    # Read through the projection of the serializer, see projections.py
+    def get_cart(self, request):
+        return projections.get_projection(self.serializer_class).apply(
+            models.Cart.objects.filter(user=request.user.id)
+        )
 
     def get(self, request):
-        cart = models.Cart.objects.filter(user=request.user.id)
-        serialized_cart = serializers.CartSerializer(cart,many=True)
-        return Response(serialized_cart.data, status=status.HTTP_200_OK)
+        cart = list(self.get_cart(request))
+        serialized_cart = projections.get_projection(self.serializer_class).serialize(cart)
+        return Response(serialized_cart, status=status.HTTP_200_OK)
+
+    async def aget(self, request):
+        cart = [item async for item in self.get_cart(request)]
+        serialized_cart = await projections.get_projection(self.serializer_class).aserialize(cart)
+        return Response(serialized_cart, status=status.HTTP_200_OK)
 
     def post(self, request):
         serialized_data = self.serializer_class(
@@ -192,7 +280,6 @@ class CartView(APIView):
     
     def delete(self, request):
         user = request.user
-        print("Hi")
         cart_items = models.Cart.objects.filter(user=user)
         cart_items.delete()
 
@@ -202,29 +289,59 @@ class CartView(APIView):
         )
 
 
-class SingleCartItemView(generics.RetrieveUpdateDestroyAPIView):
-    serializer_class = serializers.CartSerializer
+class BulkCartView(APIView):
+    """
+    Adds or updates many items of the cart in one request. Expects a list
+    of {"menuitem_id", "quantity"}; items already in the cart get the new
+    quantity. Returns the whole cart.
+    """
+    serializer_class = serializers.BulkCartItemSerializer
     permission_classes = [IsAuthenticated, permissions.IsCustomerPermission]
+
+    def post(self, request):
+        serialized_data = self.serializer_class(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            context={"request": request}
+        )
+        if not serialized_data.is_valid():
+            return Response(serialized_data.errors, status=status.HTTP_400_BAD_REQUEST)
+        serialized_data.save()
+
+        cart = mixins.prefetch_for_serializer(
+            models.Cart.objects.filter(user=request.user.id),
+            serializers.CartSerializer
+        )
+        serialized_cart = serializers.CartSerializer(cart, many=True)
+        return Response(serialized_cart.data, status=status.HTTP_200_OK)
+
+
+class SingleCartItemView(mixins.PrefetchRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = serializers.CartSerializer
+    permission_classes = [IsAuthenticated, permissions.IsCustomerPermission, permissions.FieldWritePermission]
+    write_policy = permissions.CART_ITEM_WRITE_POLICY
     def get_queryset(self):
         user = self.request.user
         queryset = models.Cart.objects.filter(user=user)
         return queryset
     
 
-class OrdersView(generics.ListCreateAPIView):
+class OrdersView(mixins.ListView):
     #serializer_class = serializers.OrderSerializer
+    pagination_class = pagination.LargeTablePagination
     ordering_fields = ["total", "date"]
     filterset_fields = ["delivery_crew"]
     def get_queryset(self):
         queryset = models.Order.objects.all()
         # Manager
-        if self.request.user.groups.filter(name="Manager").exists() or self.request.user.is_staff:
+        if roles.is_admin_or_manager(self.request.user):
             pass
         # Customer
-        elif not self.request.user.groups.exists():
+        elif roles.is_customer(self.request.user):
             queryset = queryset.filter(user=self.request.user)
         # Delivery crew
-        elif self.request.user.groups.filter(name="Delivery crew").exists():
+        elif roles.is_delivery_crew(self.request.user):
             queryset = queryset.filter(delivery_crew = self.request.user)
         
         delivery_crew_id = self.request.query_params.get("delivery_crew_id")
@@ -243,7 +360,8 @@ class OrdersView(generics.ListCreateAPIView):
             if order_status not in ["True","1", "False", "0"]:
                 raise exceptions.NotAcceptable("Status value must be either 'True' or '1' for true or 'False' or '0' for false.")
             
-            queryset = queryset.filter(status=order_status)
+            # Same as featured in MenuItemsView: IN lets SQLite use the index
+            queryset = queryset.filter(status__in=[order_status])
 
         if user_id:
             queryset = queryset.filter(user__id = user_id)
@@ -254,36 +372,9 @@ class OrdersView(generics.ListCreateAPIView):
         return queryset
 
     def post(self, request):
-        # Get the items from the user's cart
-        cart_objects = models.Cart.objects.filter(user=self.request.user)
-        if len(cart_objects) == 0: 
+        order = checkout.place_order(self.request.user)
+        if order is None:
             return Response({"message": "Can't create order, no items in cart"}, status=status.HTTP_200_OK)
-
-        # Create the base order object
-        order_data = {
-            "user": self.request.user,
-            "delivery_crew": None,
-            "status": False,
-            "total": 0,
-            "date": datetime.date.today()
-        }
-
-        order_object = models.Order.objects.create(**order_data)
-
-
-        # Pass the cart's items to the order's items
-        for cart_object in cart_objects:
-            order_item_dict = {
-                "order": order_object,
-                "menuitem": cart_object.menuitem,
-                "quantity": cart_object.quantity,
-                "price": cart_object.price,
-            }
-            models.OrderItem.objects.create(**order_item_dict)
-
-        order_object.total = str(sum([obj.price for obj in cart_objects]))
-        order_object.save()
-        cart_objects.delete()
         return Response({"message": "Order created successfully"}, status=status.HTTP_201_CREATED)
 
     def get_permissions(self):
@@ -295,35 +386,277 @@ class OrdersView(generics.ListCreateAPIView):
     
     def get_serializer_class(self):
         # Admin exclusive (can do what the manager, customer and delivery crew can)
-        if self.request.user.groups.filter(name="Manager").exists() or self.request.user.is_staff:
+        if roles.is_admin_or_manager(self.request.user):
             return serializers.SingleOrderSerializerForManager
-        elif self.request.user.groups.filter(name="Delivery crew").exists():
+        elif roles.is_delivery_crew(self.request.user):
             return serializers.SingleOrderSerializerForDeliveryCrew
         
         return serializers.SingleOrderSerializerForCustomer
 
+
+
+
+class OrderExportView(mixins.JSONErrorsMixin, OrdersView):
+    """
+    Streams the orders as CSV or NDJSON (see exports.py): ?format=csv or
+    ?format=ndjson, or the Accept header. Takes the filters of the orders
+    list, plus date_from and date_to (YYYY-MM-DD, both included).
+    Managers only.
+    """
+    renderer_classes = [exports.CSVRenderer, exports.NDJSONRenderer]
+    pagination_class = None
+    # Not OrdersView's POST, which places an order
+    http_method_names = ["get", "head", "options"]
+
+    def get_permissions(self):
+        return [IsAuthenticated(), permissions.IsAdminOrManagerPermission()]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for param, lookup in (("date_from", "date__gte"), ("date_to", "date__lte")):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+            except ValueError:
+                raise exceptions.ValidationError({param: "Date must be in YYYY-MM-DD format."})
+        return queryset
+
+    def get(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.ordered:
+            queryset = queryset.order_by("id")
+        return exports.export_response(
+            request, queryset, self.get_serializer_class(), self.get_serializer_context()
+        )
+
+
+class AssignOrdersView(APIView):
+    """
+    Assigns the open orders without a delivery crew member, at most
+    `limit` of them (all by default). See assignment.py.
+    """
+    permission_classes = [IsAuthenticated, permissions.IsAdminOrManagerPermission]
+    serializer_class = serializers.AssignOrdersSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assigned = assignment.assign_orders(limit=serializer.validated_data.get("limit"))
+        return Response({"assigned": assigned}, status=status.HTTP_200_OK)
+
+
+class OrderEventsView(mixins.JSONErrorsMixin, asyncviews.AsyncReadMixin, APIView):
+    """
+    Server-Sent Events with the changes of the orders the user can see
+    (see events.py). ?timeout= ends the stream sooner, in seconds.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [events.EventStreamRenderer]
+
+    def get_timeout(self):
+        timeout = self.request.query_params.get("timeout", settings.EVENTS_MAX_DURATION)
+        try:
+            return max(float(timeout), 0)
+        except ValueError:
+            raise exceptions.ValidationError({"timeout": "A number of seconds is required."})
+
+    def stream(self, request):
+        # Django reads a sync iterator whole under ASGI, and an async one
+        # whole under WSGI
+        stream = events.astream if isinstance(request._request, ASGIRequest) else events.stream
+        return events.stream_response(stream(events.channel_for(request.user), self.get_timeout()))
+
+    def get(self, request):
+        return self.stream(request)
+
+    async def aget(self, request):
+        return self.stream(request)
+
             
-class SingleOrderView(generics.RetrieveUpdateDestroyAPIView):
+class SingleOrderView(mixins.DetailView):
+    write_policy = permissions.ORDER_WRITE_POLICY
+
     def get_queryset(self):
-        if self.request.user.groups.filter(name="Manager").exists() or self.request.user.is_staff:
+        if roles.is_admin_or_manager(self.request.user):
             return models.Order.objects.all()
-        elif self.request.user.groups.filter(name="Delivery crew").exists():
+        elif roles.is_delivery_crew(self.request.user):
             return models.Order.objects.filter(delivery_crew = self.request.user)
         return models.Order.objects.filter(user=self.request.user)
         
     def get_serializer_class(self):
         # Admin exclusive (can do what the manager, customer and delivery crew can)
-        if self.request.user.groups.filter(name="Manager").exists() or self.request.user.is_staff:
+        if roles.is_admin_or_manager(self.request.user):
             return serializers.SingleOrderSerializerForManager
-        elif self.request.user.groups.filter(name="Delivery crew").exists():
+        elif roles.is_delivery_crew(self.request.user):
             return serializers.SingleOrderSerializerForDeliveryCrew
         
         return serializers.SingleOrderSerializerForCustomer
     
     def get_permissions(self):
         if self.request.method == "DELETE":
-            return [IsAuthenticated(), permissions.IsAdminOrManagerPermission(), permissions.OrderPermissions()]
+            return [IsAuthenticated(), permissions.IsAdminOrManagerPermission()]
         if self.request.method in ["PATCH", "PUT"]:
-            return [IsAuthenticated(), permissions.IsAdminManagerOrDeliveryCrew(), permissions.OrderPermissions()]
+            return [IsAuthenticated(), permissions.IsAdminManagerOrDeliveryCrew(), permissions.FieldWritePermission()]
         
         return [IsAuthenticated()]
+
+
+"""
+----------------------ACCESS TOKENS----------------------
+Stateless alternative to the djoser tokens, see tokens.py.
+
+- token/access/: username and password for an access and refresh token pair
+- token/refresh/: a refresh token for a new pair
+- token/revoke/: logout, revokes the refresh token and, when the request
+  is authenticated with one, the access token
+
+PERMISSIONS: Anyone, the credentials or the refresh token are the proof.
+"""
+
+class AccessTokenView(APIView):
+    permission_classes = [AllowAny]
+    serializer_class = AuthTokenSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.issue(serializer.validated_data["user"]), status=status.HTTP_201_CREATED)
+
+
+class RefreshTokenView(APIView):
+    permission_classes = [AllowAny]
+    serializer_class = serializers.RefreshTokenSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.refresh(serializer.validated_data["refresh"]), status=status.HTTP_201_CREATED)
+
+
+class RevokeTokenView(APIView):
+    permission_classes = [AllowAny]
+    serializer_class = serializers.RefreshTokenSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # request.auth is the claims of an access token, or a djoser Token
+        claims = request.auth if isinstance(request.auth, dict) else None
+        tokens.revoke(serializer.validated_data["refresh"], claims)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+"""
+----------------------REPORTS----------------------
+Sales of the days between date_from and date_to (YYYY-MM-DD, both
+included, the last 7 days by default), read from the daily rollups of
+reports.py: their cost depends on the number of days, not of orders.
+
+- reports/daily: orders, items sold and revenue of each day
+- reports/menu-items, reports/categories: the `limit` (10 by default)
+  best sellers, by quantity
+- reports/delivery-crew: the orders assigned to each delivery crew member
+  and how many were delivered
+
+PERMISSIONS: Managers and admins.
+"""
+
+class DailySalesView(APIView):
+    permission_classes = [IsAuthenticated, permissions.IsAdminOrManagerPermission]
+    serializer_class = serializers.DailySalesSerializer
+
+    def get(self, request):
+        params = serializers.ReportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        days = models.DailySales.objects.filter(
+            date__range=(params.validated_data["date_from"], params.validated_data["date_to"])
+        ).order_by("date")
+        return Response(self.serializer_class(days, many=True).data, status=status.HTTP_200_OK)
+
+
+class TopSalesView(APIView):
+    """
+    Adds up the rollup rows of `model` in the range per `group_by`, into
+    "total_<counter>" for each of `counters`.
+    """
+    permission_classes = [IsAuthenticated, permissions.IsAdminOrManagerPermission]
+    model = None
+    group_by = ()
+    counters = ()
+    ordering = ()
+
+    def get(self, request):
+        params = serializers.ReportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        rows = (
+            self.model.objects
+            .filter(date__range=(params.validated_data["date_from"], params.validated_data["date_to"]))
+            .values(*self.group_by)
+            .annotate(**{f"total_{counter}": Sum(counter) for counter in self.counters})
+            .order_by(*self.ordering)
+        )[:params.validated_data["limit"]]
+        return Response(self.serializer_class(rows, many=True).data, status=status.HTTP_200_OK)
+
+
+class MenuItemSalesView(TopSalesView):
+    serializer_class = serializers.MenuItemSalesSerializer
+    model = models.DailyMenuItemSales
+    group_by = ("menuitem_id", "menuitem__title")
+    counters = ("quantity", "revenue")
+    ordering = ("-total_quantity", "menuitem_id")
+
+
+class CategorySalesView(TopSalesView):
+    serializer_class = serializers.CategorySalesSerializer
+    model = models.DailyCategorySales
+    group_by = ("category_id", "category__title")
+    counters = ("quantity", "revenue")
+    ordering = ("-total_quantity", "category_id")
+
+
+class CrewSalesView(TopSalesView):
+    serializer_class = serializers.CrewSalesSerializer
+    model = models.DailyCrewSales
+    group_by = ("delivery_crew_id", "delivery_crew__username")
+    counters = ("orders", "delivered", "revenue")
+    ordering = ("-total_orders", "delivery_crew_id")
+
+
+"""
+----------------------ASYNC VIEWS----------------------
+The read views above, as async views for ASGI servers (see asyncviews.py).
+urls.py serves them with the ASYNC_READ_VIEWS setting.
+"""
+
+class AsyncCategoryView(asyncviews.AsyncViewMixin, CategoryView):
+    pass
+
+
+class AsyncSingleCategoryView(asyncviews.AsyncViewMixin, SingleCategoryView):
+    pass
+
+
+class AsyncMenuItemsView(asyncviews.AsyncViewMixin, MenuItemsView):
+    pass
+
+
+class AsyncSingleMenuItemView(asyncviews.AsyncViewMixin, SingleMenuItemView):
+    pass
+
+
+class AsyncCartView(asyncviews.AsyncViewMixin, CartView):
+    pass
+
+
+class AsyncOrdersView(asyncviews.AsyncViewMixin, OrdersView):
+    pass
+
+
+class AsyncSingleOrderView(asyncviews.AsyncViewMixin, SingleOrderView):
+    pass
+
+
+class AsyncOrderEventsView(asyncviews.AsyncViewMixin, OrderEventsView):
+    pass